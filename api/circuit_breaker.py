@@ -0,0 +1,378 @@
+"""
+Per-provider circuit breakers.
+
+Each external provider gets a breaker that watches a rolling window of recent
+calls. When too many of them fail or are too slow, the breaker opens and calls
+are rejected immediately with CircuitOpenError, so the agents go straight to
+their fallbacks instead of waiting out a timeout during an outage. After a
+cool-down the breaker lets a single probe call through (half-open): a healthy
+probe closes it again, a failed one re-opens it.
+
+Breaker state is also written to the circuit_breakers table of the application
+database whenever it changes, and every worker picks up changes made by the
+others, so one worker detecting an outage spares the rest. Writes go through a
+background thread and the async path reads in a worker thread, so no caller,
+and in particular no event loop, waits on SQLite.
+
+Settings are read from the environment:
+
+    CIRCUIT_WINDOW_SECONDS     length of the rolling window (60)
+    CIRCUIT_MIN_CALLS          calls in the window before the breaker may open (5)
+    CIRCUIT_ERROR_RATE         failure ratio that opens the breaker (0.5)
+    CIRCUIT_SLOW_CALL_RATE     slow-call ratio that opens the breaker (0.8)
+    CIRCUIT_OPEN_SECONDS       cool-down before a probe is allowed (30)
+    CIRCUIT_SYNC_SECONDS       how often shared state is re-read (2)
+    <PROVIDER>_SLOW_CALL_SECONDS  latency above which a call counts as slow
+"""
+
+import os
+import time
+import queue
+import asyncio
+import sqlite3
+import threading
+from collections import deque
+from api import metrics
+from api.rate_limiter import QueueSaturated, provider_slot, provider_slot_async
+from api.tracing import child_span
+from database import DB_PATH
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Gauge values for each state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+WINDOW_SECONDS = float(os.environ.get("CIRCUIT_WINDOW_SECONDS", "60"))
+MIN_CALLS = int(os.environ.get("CIRCUIT_MIN_CALLS", "5"))
+ERROR_RATE = float(os.environ.get("CIRCUIT_ERROR_RATE", "0.5"))
+SLOW_CALL_RATE = float(os.environ.get("CIRCUIT_SLOW_CALL_RATE", "0.8"))
+OPEN_SECONDS = float(os.environ.get("CIRCUIT_OPEN_SECONDS", "30"))
+SYNC_SECONDS = float(os.environ.get("CIRCUIT_SYNC_SECONDS", "2"))
+
+# Default latency above which a call counts as slow, per provider (seconds)
+SLOW_CALL_DEFAULTS = {
+    "gemini": 20,
+    "replicate": 60,
+    "runway": 240,
+    "elevenlabs": 20,
+}
+
+STATE_GAUGE = metrics.gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state (0 = closed, 1 = half open, 2 = open)",
+    ("provider",),
+)
+TRANSITIONS = metrics.counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state transitions",
+    ("provider", "from_state", "to_state"),
+)
+REJECTIONS = metrics.counter(
+    "circuit_breaker_rejections_total",
+    "Calls rejected because the circuit breaker was open",
+    ("provider",),
+)
+CALLS = metrics.counter(
+    "provider_calls_total",
+    "Calls made to external providers",
+    ("provider", "outcome"),
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+    def __init__(self, provider, retry_after):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(
+            f"{provider} circuit breaker is open, retry after {retry_after} seconds"
+        )
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=5)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS circuit_breakers (
+            provider TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            opened_at REAL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+    return conn
+
+
+# (provider, state, opened_at, updated_at) rows waiting to be written, in order
+_writes = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _write_states():
+    while True:
+        row = _writes.get()
+        try:
+            conn = _connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO circuit_breakers "
+                    "(provider, state, opened_at, updated_at) VALUES (?, ?, ?, ?)",
+                    row,
+                )
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Error saving circuit breaker state for {row[0]}: {e}")
+
+
+def _queue_write(row):
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(
+                target=_write_states, name="circuit-breaker-writer", daemon=True
+            )
+            _writer.start()
+    _writes.put(row)
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker for one provider."""
+
+    def __init__(self, provider, slow_call_seconds):
+        self.provider = provider
+        self.slow_call_seconds = slow_call_seconds
+        # (finished at, succeeded, slow) for calls in the rolling window
+        self.calls = deque()
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.changed_at = 0.0
+        self.probing = False
+        self.synced_at = 0.0
+        self.lock = threading.Lock()
+        STATE_GAUGE.set(STATE_VALUES[CLOSED], provider=provider)
+
+    def _transition(self, state, persist=True):
+        if state == self.state:
+            return
+        print(f"Circuit breaker for {self.provider}: {self.state} -> {state}")
+        TRANSITIONS.inc(provider=self.provider, from_state=self.state, to_state=state)
+        STATE_GAUGE.set(STATE_VALUES[state], provider=self.provider)
+        now = time.time()
+        if state == OPEN:
+            self.opened_at = now
+        if state == CLOSED:
+            self.calls.clear()
+        self.state = state
+        self.changed_at = now
+        self.probing = False
+        if persist:
+            self._save()
+
+    def _save(self):
+        _queue_write((self.provider, self.state, self.opened_at, self.changed_at))
+
+    def _sync_due(self):
+        """Whether shared state should be re-read now; claims the read if so."""
+        now = time.time()
+        if now - self.synced_at < SYNC_SECONDS:
+            return False
+        self.synced_at = now
+        return True
+
+    def _read_shared(self):
+        """The shared state row of this provider, read without holding the lock."""
+        try:
+            conn = _connect()
+            row = conn.execute(
+                "SELECT state, opened_at, updated_at FROM circuit_breakers "
+                "WHERE provider = ?",
+                (self.provider,),
+            ).fetchone()
+            conn.close()
+            return row
+        except sqlite3.Error as e:
+            print(f"Error reading circuit breaker state for {self.provider}: {e}")
+            return None
+
+    def _adopt(self, row):
+        """Adopt a state change made by another worker since our last change."""
+        if row and row[2] > self.changed_at and row[0] in STATE_VALUES:
+            state, opened_at, updated_at = row
+            # A half-open breaker elsewhere means a probe is running there:
+            # wait out a cool-down from its start instead of probing as well
+            if state == HALF_OPEN:
+                state, opened_at = OPEN, updated_at
+            self._transition(state, persist=False)
+            self.opened_at = opened_at or self.opened_at
+            self.changed_at = updated_at
+
+    def retry_after(self):
+        remaining = self.opened_at + OPEN_SECONDS - time.time()
+        return max(1, int(remaining + 0.5))
+
+    def before_call(self):
+        """
+        Reserve a call, or fail fast if the breaker is open.
+
+        Raises:
+            CircuitOpenError: if the provider should not be called right now
+        """
+        with self.lock:
+            sync = self._sync_due()
+        self._reserve(self._read_shared() if sync else None)
+
+    async def before_call_async(self):
+        """Like before_call(), reading shared state off the event loop."""
+        with self.lock:
+            sync = self._sync_due()
+        self._reserve(await asyncio.to_thread(self._read_shared) if sync else None)
+
+    def _reserve(self, row):
+        with self.lock:
+            self._adopt(row)
+            if self.state == OPEN and time.time() - self.opened_at >= OPEN_SECONDS:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self.probing:
+                # Let exactly one probe through
+                self.probing = True
+                return
+            if self.state != CLOSED:
+                REJECTIONS.inc(provider=self.provider)
+                raise CircuitOpenError(self.provider, self.retry_after())
+
+    def cancel_call(self):
+        """Give back a reservation for a call that was never made."""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probing = False
+
+    def record(self, succeeded, latency):
+        """Record the outcome of a call and open or close the breaker as needed."""
+        slow = latency >= self.slow_call_seconds
+        CALLS.inc(
+            provider=self.provider,
+            outcome="success" if succeeded else "failure",
+        )
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED if succeeded and not slow else OPEN)
+                return
+            if self.state == OPEN:
+                # A call that started before another caller opened the breaker
+                return
+
+            now = time.time()
+            self.calls.append((now, succeeded, slow))
+            while self.calls and self.calls[0][0] < now - WINDOW_SECONDS:
+                self.calls.popleft()
+
+            total = len(self.calls)
+            if total < MIN_CALLS:
+                return
+            failures = sum(1 for _, ok, _ in self.calls if not ok)
+            slow_calls = sum(1 for _, _, was_slow in self.calls if was_slow)
+            if failures / total >= ERROR_RATE or slow_calls / total >= SLOW_CALL_RATE:
+                self._transition(OPEN)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "calls_in_window": len(self.calls),
+                "failures_in_window": sum(1 for _, ok, _ in self.calls if not ok),
+                "retry_after": self.retry_after() if self.state == OPEN else 0,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider):
+    """Return the shared circuit breaker for a provider."""
+    with _breakers_lock:
+        if provider not in _breakers:
+            slow = os.environ.get(
+                f"{provider.upper()}_SLOW_CALL_SECONDS",
+                SLOW_CALL_DEFAULTS.get(provider, 30),
+            )
+            _breakers[provider] = CircuitBreaker(provider, float(slow))
+        return _breakers[provider]
+
+
+def call_provider(provider, fn, *args, **kwargs):
+    """
+    Call a provider through its circuit breaker and rate limiter.
+
+    Time spent queueing for a rate-limit slot does not count towards the call's
+    latency, and a call rejected by the limiter is not held against the provider.
+
+    Usage:
+        response = call_provider("gemini", chat.send_message, prompt)
+
+    Raises:
+        CircuitOpenError: if the provider's breaker is open
+        QueueSaturated: if the provider's queue is full
+    """
+    breaker = get_breaker(provider)
+    breaker.before_call()
+    try:
+        with child_span(f"call {provider}", provider=provider) as call_span:
+            queued = time.monotonic()
+            with provider_slot(provider):
+                started = time.monotonic()
+                if call_span:
+                    call_span.set_attribute("queued_seconds", round(started - queued, 3))
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception:
+                    breaker.record(False, time.monotonic() - started)
+                    raise
+                breaker.record(True, time.monotonic() - started)
+                return result
+    except QueueSaturated:
+        breaker.cancel_call()
+        raise
+
+
+async def call_provider_async(provider, fn, *args, **kwargs):
+    """
+    Like call_provider(), awaiting a coroutine function of the provider.
+
+    A call cancelled while queued or in flight (e.g. the losing request of a
+    hedge) is not held against the provider either.
+
+    Usage:
+        reply = await call_provider_async("gemini", provider.generate_async, ...)
+    """
+    breaker = get_breaker(provider)
+    await breaker.before_call_async()
+    try:
+        with child_span(f"call {provider}", provider=provider) as call_span:
+            queued = time.monotonic()
+            async with provider_slot_async(provider):
+                started = time.monotonic()
+                if call_span:
+                    call_span.set_attribute("queued_seconds", round(started - queued, 3))
+                try:
+                    result = await fn(*args, **kwargs)
+                except Exception:
+                    breaker.record(False, time.monotonic() - started)
+                    raise
+                breaker.record(True, time.monotonic() - started)
+                return result
+    except (QueueSaturated, asyncio.CancelledError):
+        breaker.cancel_call()
+        raise
+
+
+def breaker_states():
+    """Current state of every breaker that has been used in this process."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.provider: breaker.snapshot() for breaker in breakers}
@@ -0,0 +1,265 @@
+"""
+Bounded pool of FFmpeg processes.
+
+All media transformations (concatenation, pan/zoom renders, muxing, ...) run
+their FFmpeg commands through this pool, so the host never runs more FFmpeg
+processes than it has CPU cores, no matter how many requests or background
+jobs ask for one. Extra jobs wait in a bounded queue.
+
+Left alone, every FFmpeg process would also start about one and a half
+threads per core for its decoders, filters and libx264 encoders. The pool
+caps each process at FFMPEG_THREADS, so the pool as a whole keeps to the
+host's cores.
+
+Jobs run in one of two lanes, each a pool of its own. Interactive work
+(pan/zoom fallbacks, concatenation, frames) has the "interactive" lane; long
+background transcodes (renditions) get the small "background" lane, so a
+burst of them never queues ahead of a render a student is waiting for.
+
+Every job has a timeout counted from submission, so time spent queueing counts
+against it. A job still running when its time is up is killed together with
+any child processes.
+
+Settings are read from the environment:
+
+    FFMPEG_BACKGROUND_WORKERS  concurrent FFmpeg processes of the background lane (1)
+    FFMPEG_WORKERS          concurrent FFmpeg processes of the interactive lane
+                            (CPU cores minus the background lane)
+    FFMPEG_THREADS          threads per FFmpeg process (CPU cores / all workers)
+    FFMPEG_MAX_QUEUE        jobs allowed to wait for a worker (64)
+    FFMPEG_TIMEOUT_SECONDS  default timeout per job (300)
+"""
+
+import os
+import time
+import signal
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from api import metrics
+from api.tracing import child_span, current_context, use_context
+
+CPU_CORES = os.cpu_count() or 2
+FFMPEG_BACKGROUND_WORKERS = int(os.environ.get("FFMPEG_BACKGROUND_WORKERS", "1"))
+FFMPEG_WORKERS = int(
+    os.environ.get(
+        "FFMPEG_WORKERS", str(max(1, CPU_CORES - FFMPEG_BACKGROUND_WORKERS))
+    )
+)
+FFMPEG_THREADS = int(
+    os.environ.get(
+        "FFMPEG_THREADS",
+        str(max(1, CPU_CORES // (FFMPEG_WORKERS + FFMPEG_BACKGROUND_WORKERS))),
+    )
+)
+
+LANE_INTERACTIVE = "interactive"
+LANE_BACKGROUND = "background"
+FFMPEG_MAX_QUEUE = int(os.environ.get("FFMPEG_MAX_QUEUE", "64"))
+FFMPEG_TIMEOUT_SECONDS = float(os.environ.get("FFMPEG_TIMEOUT_SECONDS", "300"))
+
+JOBS = metrics.counter(
+    "ffmpeg_jobs_total",
+    "FFmpeg jobs by outcome (ok, failed, timeout, rejected)",
+    ("job", "outcome"),
+)
+JOB_SECONDS = metrics.counter(
+    "ffmpeg_job_seconds_total", "Seconds FFmpeg processes ran", ("job",)
+)
+STDERR_BYTES = metrics.counter(
+    "ffmpeg_stderr_bytes_total", "Bytes FFmpeg wrote to stderr", ("job",)
+)
+STDERR_ERRORS = metrics.counter(
+    "ffmpeg_stderr_error_lines_total",
+    "Lines mentioning an error in FFmpeg's stderr",
+    ("job",),
+)
+QUEUED = metrics.gauge(
+    "ffmpeg_queued_jobs", "FFmpeg jobs waiting for a worker", ("lane",)
+)
+RUNNING = metrics.gauge(
+    "ffmpeg_running_jobs", "FFmpeg processes currently running", ("lane",)
+)
+
+
+class FFmpegError(Exception):
+    """Base class for jobs the pool could not run to completion."""
+
+
+class FFmpegQueueFull(FFmpegError):
+    """Raised when too many FFmpeg jobs are already waiting."""
+
+
+class FFmpegTimeout(FFmpegError):
+    """Raised when a job did not finish within its timeout; the process was killed."""
+
+
+class FFmpegResult:
+    def __init__(self, returncode, stderr, seconds):
+        self.returncode = returncode
+        self.stderr = stderr
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+
+def limit_threads(cmd, threads=None):
+    """
+    Cap the threads of an FFmpeg command with a single output (its last argument).
+
+    Every input's decoder, the filter graphs and the output's encoders get
+    `threads` threads. Commands that set -threads themselves are left alone.
+    """
+    threads = str(FFMPEG_THREADS if threads is None else threads)
+    if "-threads" in cmd:
+        return list(cmd)
+    limited = [cmd[0], "-filter_threads", threads, "-filter_complex_threads", threads]
+    for arg in cmd[1:-1]:
+        if arg == "-i":
+            limited += ["-threads", threads]
+        limited.append(arg)
+    return limited + ["-threads", threads, cmd[-1]]
+
+
+class FFmpegPool:
+    """Runs FFmpeg commands on a fixed number of worker threads, one process each."""
+
+    def __init__(self, workers, max_queue, lane=LANE_INTERACTIVE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.lane = lane
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=f"ffmpeg-{lane}"
+        )
+        self.queued = 0
+        self.running = 0
+        self.lock = threading.Lock()
+
+    def _update_gauges(self):
+        QUEUED.set(self.queued, lane=self.lane)
+        RUNNING.set(self.running, lane=self.lane)
+
+    def submit(self, cmd, job="ffmpeg", timeout=None):
+        """
+        Queue an FFmpeg command.
+
+        Args:
+            cmd: The full command, e.g. ["ffmpeg", "-i", ...], ending with its
+                output; the pool caps its threads (see limit_threads())
+            job: Name used in logs and metrics (e.g. "concat")
+            timeout: Seconds from now until the job is abandoned
+                (default FFMPEG_TIMEOUT_SECONDS)
+
+        Returns:
+            Future resolving to an FFmpegResult
+
+        Raises:
+            FFmpegQueueFull: if FFMPEG_MAX_QUEUE jobs are already waiting
+        """
+        timeout = FFMPEG_TIMEOUT_SECONDS if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            if self.queued >= self.max_queue:
+                JOBS.inc(job=job, outcome="rejected")
+                raise FFmpegQueueFull(f"{self.queued} FFmpeg jobs already queued")
+            self.queued += 1
+            self._update_gauges()
+        context = current_context()
+        return self.executor.submit(
+            self._run, limit_threads(cmd), job, deadline, context
+        )
+
+    def run(self, cmd, job="ffmpeg", timeout=None):
+        """Run an FFmpeg command on the pool and wait for its FFmpegResult."""
+        return self.submit(cmd, job, timeout).result()
+
+    def _run(self, cmd, job, deadline, context=None):
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+            self._update_gauges()
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                JOBS.inc(job=job, outcome="timeout")
+                raise FFmpegTimeout(f"FFmpeg {job} job timed out while queued")
+            with use_context(context), child_span(f"ffmpeg {job}", provider="ffmpeg"):
+                return self._execute(cmd, job, remaining)
+        finally:
+            with self.lock:
+                self.running -= 1
+                self._update_gauges()
+
+    def _execute(self, cmd, job, timeout):
+        started = time.monotonic()
+        # Own process group, so a timeout also kills anything FFmpeg spawned
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors="replace",
+            start_new_session=True,
+        )
+        try:
+            _, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            _, stderr = process.communicate()
+            self._record(job, "timeout", started, stderr)
+            raise FFmpegTimeout(f"FFmpeg {job} job killed after {timeout:.1f}s")
+
+        result = FFmpegResult(process.returncode, stderr, time.monotonic() - started)
+        self._record(job, "ok" if result.ok else "failed", started, stderr)
+        return result
+
+    def _record(self, job, outcome, started, stderr):
+        JOBS.inc(job=job, outcome=outcome)
+        JOB_SECONDS.inc(time.monotonic() - started, job=job)
+        stderr = stderr or ""
+        STDERR_BYTES.inc(len(stderr), job=job)
+        error_lines = sum(1 for line in stderr.splitlines() if "error" in line.lower())
+        if error_lines:
+            STDERR_ERRORS.inc(error_lines, job=job)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(lane=LANE_INTERACTIVE):
+    """Return the process-wide FFmpeg pool of a lane."""
+    with _pools_lock:
+        if lane not in _pools:
+            workers = (
+                FFMPEG_BACKGROUND_WORKERS if lane == LANE_BACKGROUND else FFMPEG_WORKERS
+            )
+            _pools[lane] = FFmpegPool(workers, FFMPEG_MAX_QUEUE, lane)
+        return _pools[lane]
+
+
+def run_ffmpeg(cmd, job="ffmpeg", timeout=None, lane=LANE_INTERACTIVE):
+    """
+    Run an FFmpeg command on a shared pool and wait for it.
+
+    Usage:
+        result = run_ffmpeg(["ffmpeg", "-i", src, dst], job="transcode")
+        if not result.ok:
+            print(result.stderr)
+
+    Raises:
+        FFmpegQueueFull: if the queue is full
+        FFmpegTimeout: if the job did not finish in time (it was killed)
+    """
+    return get_pool(lane).run(cmd, job, timeout)
+
+
+def submit_ffmpeg(cmd, job="ffmpeg", timeout=None, lane=LANE_INTERACTIVE):
+    """Queue an FFmpeg command on a shared pool; returns a Future of FFmpegResult."""
+    return get_pool(lane).submit(cmd, job, timeout)
@@ -0,0 +1,299 @@
+"""
+Cost and latency ledger of scene generation.
+
+Every paid provider call writes one row to the generation_costs table. A row
+holds the provider, the model, the billed units (Gemini tokens, Flux images,
+Runway seconds, ElevenLabs characters), the estimated cost, the wall time,
+the retries, and whether the call succeeded. Stages whose output came from a
+fallback (a canned narrative, a pan/zoom clip instead of the video, ...)
+get a row too.
+
+Rows are attributed to the work running in the thread: the assignment (set
+by the routes and warm-up jobs) and the generation, i.e. the scene being
+generated, whose ID is stored on the SceneCache row. Threads that work on a
+scene carry the attribution with them:
+
+    attribution = current_attribution()
+
+    def run():
+        with use_attribution(attribution):
+            ...
+
+Provider calls are metered like stages are timed:
+
+    with metered("flux", "replicate", image_model, "images") as usage:
+        output = call_provider("replicate", ...)
+        usage["units"] = 1
+
+Rows are written by a background thread with plain sqlite3, so metering never
+waits on the database and works in threads without an application context.
+scripts/cost_report.py aggregates the ledger (cost per assignment, latency
+percentiles per stage).
+
+Settings are read from the environment:
+
+    COST_LEDGER              whether rows are recorded (true)
+    COST_LEDGER_PRICES       JSON object of USD per unit by model, merged
+                             over UNIT_PRICES_USD
+"""
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from uuid import uuid4
+from api import metrics
+from api.rate_limiter import current_priority
+from api.timing import current_scenario
+from database import DB_PATH
+
+COST_LEDGER = os.environ.get("COST_LEDGER", "true").lower() == "true"
+
+# Estimated USD per billed unit, by model (list prices; override with
+# COST_LEDGER_PRICES when they change)
+UNIT_PRICES_USD = {
+    "gemini-2.0-flash": 0.0000004,  # per token, input and output blended
+    "black-forest-labs/flux-schnell": 0.003,  # per image
+    "black-forest-labs/flux-1.1-pro": 0.04,  # per image
+    "gen3a_turbo": 0.05,  # per second of video
+    "eleven_flash_v2_5": 0.00015,  # per character
+    "eleven_monolingual_v1": 0.0003,  # per character
+}
+UNIT_PRICES_USD.update(json.loads(os.environ.get("COST_LEDGER_PRICES", "{}")))
+
+# Rows waiting for the writer; more than this are dropped, not buffered
+WRITE_QUEUE_SIZE = 10000
+WRITE_BATCH_SIZE = 200
+WRITE_INTERVAL_SECONDS = 2
+
+COLUMNS = (
+    "generation_id",
+    "assignment_id",
+    "scenario",
+    "stage",
+    "provider",
+    "model",
+    "units",
+    "unit",
+    "cost_usd",
+    "wall_seconds",
+    "retries",
+    "fallback",
+    "succeeded",
+    "priority",
+    "created_at",
+)
+
+PROVIDER_COST = metrics.counter(
+    "provider_cost_usd_total",
+    "Estimated USD spent on provider calls",
+    ("provider", "stage"),
+)
+LEDGER_ROWS = metrics.counter(
+    "cost_ledger_rows_total", "Cost ledger rows by write outcome", ("outcome",)
+)
+
+_attribution = ContextVar("attribution", default=(None, None))
+_write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+_writer_lock = threading.Lock()
+_writer_thread = None
+
+
+def current_attribution():
+    """(generation ID, assignment ID) of the work running in this context."""
+    return _attribution.get()
+
+
+@contextmanager
+def use_attribution(attribution):
+    """Attribute the enclosed provider calls of this context, e.g. in a worker thread."""
+    token = _attribution.set(attribution)
+    try:
+        yield
+    finally:
+        _attribution.reset(token)
+
+
+def assignment_context(assignment_id):
+    """Attribute the enclosed provider calls to an assignment (None for none)."""
+    generation_id, _ = current_attribution()
+    return use_attribution((generation_id, assignment_id))
+
+
+def current_generation_id():
+    """ID of the generation running in this thread, or None."""
+    return current_attribution()[0]
+
+
+@contextmanager
+def generation_context(generation_id=None):
+    """
+    Attribute the enclosed provider calls to one scene's generation.
+
+    Yields the generation ID (a new one unless given, e.g. to add the cost of
+    re-rendering a cached scene to the scene's generation).
+    """
+    generation_id = generation_id or uuid4().hex
+    _, assignment_id = current_attribution()
+    with use_attribution((generation_id, assignment_id)):
+        yield generation_id
+
+
+def unit_cost(model, units):
+    """Estimated USD for a number of billed units of a model (0 if unpriced)."""
+    return UNIT_PRICES_USD.get(model, 0) * units
+
+
+def record_usage(
+    stage,
+    provider,
+    model="",
+    units=0,
+    unit="",
+    wall_seconds=0.0,
+    retries=0,
+    fallback=False,
+    succeeded=True,
+):
+    """Add a row to the ledger for the work running in this thread."""
+    if not COST_LEDGER:
+        return
+    cost = unit_cost(model, units)
+    if cost:
+        PROVIDER_COST.inc(cost, provider=provider, stage=stage)
+    generation_id, assignment_id = current_attribution()
+    row = (
+        generation_id,
+        assignment_id,
+        current_scenario() or None,
+        stage,
+        provider,
+        model,
+        units,
+        unit,
+        cost,
+        round(wall_seconds, 3),
+        retries,
+        fallback,
+        succeeded,
+        current_priority(),
+        datetime.utcnow().isoformat(" "),
+    )
+    _start_writer()
+    try:
+        _write_queue.put_nowait(row)
+    except queue.Full:
+        LEDGER_ROWS.inc(outcome="dropped")
+
+
+def record_fallback(stage, provider, model=""):
+    """Record that a stage's output came from a fallback instead of the provider."""
+    record_usage(stage, provider, model, fallback=True, succeeded=False)
+
+
+@contextmanager
+def metered(stage, provider, model="", unit=""):
+    """
+    Record the enclosed provider call in the ledger, timing it.
+
+    Yields a dictionary; set its "units" (billed quantity) once known, and
+    "retries" if the call was retried. A block that raises is recorded as a
+    failed call.
+    """
+    usage = {"units": 0, "retries": 0}
+    started = time.monotonic()
+    succeeded = False
+    try:
+        yield usage
+        succeeded = True
+    finally:
+        record_usage(
+            stage,
+            provider,
+            model,
+            usage["units"],
+            unit,
+            time.monotonic() - started,
+            usage["retries"],
+            succeeded=succeeded,
+        )
+
+
+def _start_writer():
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(
+                target=_write_loop, name="cost-ledger", daemon=True
+            )
+            _writer_thread.start()
+
+
+def _write_loop():
+    while True:
+        batch = [_write_queue.get()]
+        deadline = time.monotonic() + WRITE_INTERVAL_SECONDS
+        while len(batch) < WRITE_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_write_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        try:
+            write_rows(batch)
+            LEDGER_ROWS.inc(len(batch), outcome="written")
+        except sqlite3.Error as e:
+            print(f"Error writing {len(batch)} cost ledger rows: {e}")
+            LEDGER_ROWS.inc(len(batch), outcome="failed")
+
+
+def write_rows(rows):
+    """Insert ledger rows (tuples in COLUMNS order) into generation_costs."""
+    conn = sqlite3.connect(DB_PATH, timeout=5)
+    try:
+        with conn:
+            conn.executemany(
+                f"INSERT INTO generation_costs ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                rows,
+            )
+    finally:
+        conn.close()
+
+
+def scene_cost_estimate(scenario=None, priority=None):
+    """
+    Average USD spent per generated scene, from the ledger.
+
+    Args:
+        scenario: Only count scenes of this scenario (falls back to all
+            scenarios if it has no recorded generations)
+        priority: Only count calls made at this rate limiter priority
+
+    Returns:
+        Average cost per generation, or None if nothing was recorded
+    """
+    from sqlalchemy import func
+    from database.models import GenerationCost
+
+    def average(scenario):
+        query = GenerationCost.query.filter(GenerationCost.generation_id.isnot(None))
+        if scenario:
+            query = query.filter(GenerationCost.scenario == scenario)
+        if priority is not None:
+            query = query.filter(GenerationCost.priority == priority)
+        total, generations = query.with_entities(
+            func.sum(GenerationCost.cost_usd),
+            func.count(func.distinct(GenerationCost.generation_id)),
+        ).one()
+        return total / generations if generations else None
+
+    estimate = average(scenario) if scenario else None
+    return estimate if estimate is not None else average(None)
@@ -0,0 +1,333 @@
+"""
+Shared call layer for the Gemini-backed agents (writer, producer, quiz).
+
+send_prompt() sends one prompt in a fresh chat through the text provider (see
+api/providers), parses the reply and returns the parsed data. Callers can opt
+in to request hedging: if the reply has not arrived by a percentile of the
+latencies recorded for that operation, a duplicate request is sent and the
+first valid reply wins. The other attempt is abandoned: if it has not reached
+Gemini yet it is never sent, otherwise its reply is discarded.
+send_prompt_async() is the same for coroutines; there the losing attempt is
+cancelled outright, in flight or not.
+
+Hedges are paid for out of a budget that grows with the number of calls
+(LLM_HEDGE_BUDGET hedges per call), so at most that fraction of extra
+requests is ever sent. Hedging is skipped for background work, and whenever
+Gemini is already queueing or its circuit breaker is not closed, since extra
+load would only make things worse.
+
+Settings are read from the environment:
+
+    LLM_HEDGING              enable hedging for callers that opt in (true)
+    LLM_HEDGE_PERCENTILE     latency percentile after which to hedge (95)
+    LLM_HEDGE_MIN_SAMPLES    recorded calls needed before hedging starts (20)
+    LLM_HEDGE_BUDGET         extra requests allowed per call (0.1)
+"""
+
+import os
+import json
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dotenv import load_dotenv
+from api import metrics
+from api.circuit_breaker import CLOSED, call_provider, call_provider_async, get_breaker
+from api.ledger import current_attribution, metered, use_attribution
+from api.providers import get_provider
+from api.rate_limiter import (
+    PRIORITY_INTERACTIVE,
+    current_priority,
+    get_limiter,
+    request_priority,
+)
+from api.tracing import current_context, use_context
+
+# Load environment variables
+load_dotenv()
+
+GEMINI_MODEL = "gemini-2.0-flash"
+
+LLM_HEDGING = os.environ.get("LLM_HEDGING", "true").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_BUDGET = float(os.environ.get("LLM_HEDGE_BUDGET", "0.1"))
+
+# Recent latencies kept per operation
+LATENCY_SAMPLES = 500
+
+HEDGES = metrics.counter(
+    "llm_hedges_total",
+    "Hedged LLM requests by outcome (sent, won, over_budget)",
+    ("operation", "outcome"),
+)
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm")
+
+
+class HedgeCancelled(Exception):
+    """Raised by an attempt that lost the race before it reached Gemini."""
+
+
+class LatencyTracker:
+    """Rolling sample of successful call latencies for one operation."""
+
+    def __init__(self, size=LATENCY_SAMPLES):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, percent):
+        """The given latency percentile, or None until enough calls were recorded."""
+        with self.lock:
+            if len(self.samples) < LLM_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+        return ordered[index]
+
+
+class HedgeBudget:
+    """Allows at most `ratio` hedged requests per call, with a small burst."""
+
+    def __init__(self, ratio, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = 0.0
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+_budget = HedgeBudget(LLM_HEDGE_BUDGET)
+
+
+def get_tracker(operation):
+    with _trackers_lock:
+        if operation not in _trackers:
+            _trackers[operation] = LatencyTracker()
+        return _trackers[operation]
+
+
+def extract_json(text):
+    """Strip the markdown code fences Gemini sometimes wraps JSON replies in."""
+    if "```json" in text:
+        return text.split("```json")[1].split("```")[0].strip()
+    if "```" in text:
+        return text.split("```")[1].split("```")[0].strip()
+    return text
+
+
+def parse_json(text):
+    """Default parser: the reply's JSON payload."""
+    return json.loads(extract_json(text))
+
+
+def _attempt(
+    system_prompt, prompt, parse, operation, model, cancelled=None, hedged=False
+):
+    """Send the prompt once and return the parsed reply."""
+    if cancelled is not None and cancelled.is_set():
+        raise HedgeCancelled()
+
+    started = time.monotonic()
+    with metered(operation, "gemini", model, "tokens") as usage:
+        # A hedge is an extra attempt at the same call
+        usage["retries"] = int(hedged)
+        reply = call_provider(
+            "gemini",
+            get_provider("text").generate,
+            system_prompt,
+            prompt,
+            model,
+            operation,
+        )
+        usage["units"] = reply.tokens
+    try:
+        result = parse(reply.text)
+    except (ValueError, AssertionError, KeyError, TypeError) as e:
+        print(f"Invalid {operation} response from Gemini: {e}")
+        print(f"Raw response: {reply.text}")
+        raise
+    get_tracker(operation).record(time.monotonic() - started)
+    return result
+
+
+async def _attempt_async(system_prompt, prompt, parse, operation, model, hedged=False):
+    """Like _attempt(), awaiting the text provider."""
+    started = time.monotonic()
+    with metered(operation, "gemini", model, "tokens") as usage:
+        usage["retries"] = int(hedged)
+        reply = await call_provider_async(
+            "gemini",
+            get_provider("text").generate_async,
+            system_prompt,
+            prompt,
+            model,
+            operation,
+        )
+        usage["units"] = reply.tokens
+    try:
+        result = parse(reply.text)
+    except (ValueError, AssertionError, KeyError, TypeError) as e:
+        print(f"Invalid {operation} response from Gemini: {e}")
+        print(f"Raw response: {reply.text}")
+        raise
+    get_tracker(operation).record(time.monotonic() - started)
+    return result
+
+
+def _run_attempt(priority, context, attribution, *args):
+    with request_priority(priority), use_context(context), use_attribution(
+        attribution
+    ):
+        return _attempt(*args)
+
+
+def hedge_delay(operation):
+    """
+    Seconds to wait before hedging a call, or None if it should not be hedged.
+    """
+    if not LLM_HEDGING or current_priority() > PRIORITY_INTERACTIVE:
+        return None
+    return get_tracker(operation).percentile(LLM_HEDGE_PERCENTILE)
+
+
+def _can_hedge(operation):
+    if get_breaker("gemini").state != CLOSED or get_limiter("gemini").queue_depth():
+        return False
+    if not _budget.withdraw():
+        HEDGES.inc(operation=operation, outcome="over_budget")
+        return False
+    return True
+
+
+def send_prompt(
+    system_prompt, prompt, parse=parse_json, operation="llm", hedge=False, model=GEMINI_MODEL
+):
+    """
+    Send a prompt to Gemini in a new chat and return the parsed reply.
+
+    Args:
+        system_prompt: System instruction for the chat
+        prompt: The user prompt
+        parse: Turns the reply text into the result; raising ValueError,
+            AssertionError, KeyError or TypeError marks the reply as invalid
+        operation: Name under which latencies are recorded (e.g. "narrative")
+        hedge: Send a duplicate request if the reply is slow
+        model: Gemini model to use
+
+    Returns:
+        The parsed reply
+
+    Raises:
+        The error of the first attempt if no attempt produced a valid reply,
+        e.g. CircuitOpenError, QueueSaturated or the parser's error
+    """
+    _budget.deposit()
+    args = (system_prompt, prompt, parse, operation, model)
+
+    delay = hedge_delay(operation) if hedge else None
+    if delay is None:
+        return _attempt(*args)
+
+    cancelled = threading.Event()
+    priority = current_priority()
+    context = current_context()
+    attribution = current_attribution()
+    primary = _executor.submit(
+        _run_attempt, priority, context, attribution, *args, cancelled
+    )
+    attempts = [primary]
+
+    done, _ = wait(attempts, timeout=delay)
+    if not done and _can_hedge(operation):
+        print(f"Gemini {operation} call slower than {delay:.1f}s, sending a hedge")
+        HEDGES.inc(operation=operation, outcome="sent")
+        attempts.append(
+            _executor.submit(
+                _run_attempt, priority, context, attribution, *args, cancelled, True
+            )
+        )
+
+    errors = {}
+    pending = set(attempts)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for attempt in done:
+            try:
+                result = attempt.result()
+            except Exception as e:
+                errors[attempt] = e
+                continue
+            # First valid reply wins; stop the other attempt if it has not started
+            cancelled.set()
+            for other in pending:
+                other.cancel()
+            if attempt is not primary:
+                HEDGES.inc(operation=operation, outcome="won")
+            return result
+
+    raise errors.get(primary) or next(iter(errors.values()))
+
+
+async def send_prompt_async(
+    system_prompt, prompt, parse=parse_json, operation="llm", hedge=False, model=GEMINI_MODEL
+):
+    """
+    Like send_prompt(), for coroutines: waits for Gemini without holding a thread.
+
+    Attempts are tasks of the running event loop, which inherit the priority,
+    trace and attribution of the caller; the attempt that loses a hedge is
+    cancelled.
+    """
+    _budget.deposit()
+    args = (system_prompt, prompt, parse, operation, model)
+
+    delay = hedge_delay(operation) if hedge else None
+    if delay is None:
+        return await _attempt_async(*args)
+
+    primary = asyncio.create_task(_attempt_async(*args))
+    attempts = [primary]
+
+    done, _ = await asyncio.wait(attempts, timeout=delay)
+    if not done and _can_hedge(operation):
+        print(f"Gemini {operation} call slower than {delay:.1f}s, sending a hedge")
+        HEDGES.inc(operation=operation, outcome="sent")
+        attempts.append(asyncio.create_task(_attempt_async(*args, True)))
+
+    errors = {}
+    pending = set(attempts)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is not None:
+                    errors[attempt] = attempt.exception()
+                    continue
+                if attempt is not primary:
+                    HEDGES.inc(operation=operation, outcome="won")
+                return attempt.result()
+    finally:
+        # First valid reply wins (or the caller gave up): stop the other attempt
+        for other in pending:
+            other.cancel()
+
+    raise errors.get(primary) or next(iter(errors.values()))
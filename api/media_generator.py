@@ -1,67 +1,297 @@
 import os
 import time
+import asyncio
 import base64
+import mimetypes
 import uuid
-import subprocess
-import replicate
-import requests
-from runwayml import RunwayML
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dotenv import load_dotenv
+from api.circuit_breaker import CircuitOpenError, call_provider, call_provider_async
+from api.ffmpeg_pool import run_ffmpeg
+from api.ledger import metered
+from api.providers import (
+    TASK_CANCELLED,
+    TASK_FAILED,
+    TASK_SUCCEEDED,
+    ProviderRateLimited,
+    get_provider,
+)
+from api.rate_limiter import PRIORITY_INTERACTIVE, current_priority
+from api.timing import record_cache_lookup, timed
+from database import run_in_thread
+from database.image_cache import ImageCache
 from database.models import db
 from database.video_cache import VideoCache
 
 # Load environment variables
 load_dotenv()
 
-# Configure Runway
-client = RunwayML()
+# Seconds to wait for a Runway task to finish before giving up on it
+RUNWAY_TASK_TIMEOUT_SECONDS = float(os.environ.get("RUNWAY_TASK_TIMEOUT_SECONDS", "300"))
+
+# Project root; media URLs like /static/... are relative to it
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Returned when generation fails
+PLACEHOLDER_IMAGE = "/static/images/placeholder.jpg"
+PLACEHOLDER_VIDEO = "/static/videos/placeholder.mp4"
+
+# Output size of Runway gen3a_turbo clips; locally rendered clips match it
+VIDEO_WIDTH = 1280
+VIDEO_HEIGHT = 768
+
+# Quality profiles: which models render a scene. Speculative work (warm-up,
+# background jobs) renders drafts; a draft scene is re-rendered with the
+# premium profile once a student reaches it. Image model and parameters are
+# part of the image cache key, the TTS model part of the narration cache key.
+PROFILE_DRAFT = "draft"
+PROFILE_PREMIUM = "premium"
+QUALITY_PROFILES = {
+    PROFILE_DRAFT: {
+        "image_model": "black-forest-labs/flux-schnell",
+        "image_params": {"output_format": "webp"},
+        "video_model": "gen3a_turbo",
+        "clip_seconds": 5,
+        "tts_model": "eleven_flash_v2_5",
+    },
+    PROFILE_PREMIUM: {
+        "image_model": "black-forest-labs/flux-1.1-pro",
+        "image_params": {"prompt_upsampling": True, "output_format": "webp"},
+        "video_model": "gen3a_turbo",
+        "clip_seconds": 5,
+        "tts_model": "eleven_monolingual_v1",
+    },
+}
+
+# Model name under which frames extracted from earlier videos are cached
+LAST_FRAME_MODEL = "ffmpeg-last-frame"
+
+# Model name under which first frames resized for Runway are cached
+PROMPT_IMAGE_MODEL = "runway-prompt-image"
+PROMPT_IMAGE_QUALITY = 3  # FFmpeg JPEG quality scale, 2 (best) to 31
+
+# Public origin of this app (e.g. https://rewritten.example.com). When set,
+# Runway fetches first frames by URL instead of receiving them inline.
+PUBLIC_MEDIA_BASE_URL = os.environ.get("PUBLIC_MEDIA_BASE_URL", "").rstrip("/")
+
+# How often to re-submit a Runway task rejected with HTTP 429
+RUNWAY_SUBMIT_RETRIES = int(os.environ.get("RUNWAY_SUBMIT_RETRIES", "3"))
+
+
+_profile = ContextVar("quality_profile", default=None)
+
+
+def current_profile_name():
+    """
+    Quality profile of the work running in this context.
+
+    Unless set with quality_profile(), background work renders drafts and
+    students get the premium profile.
+    """
+    profile = _profile.get()
+    if profile:
+        return profile
+    if current_priority() > PRIORITY_INTERACTIVE:
+        return PROFILE_DRAFT
+    return PROFILE_PREMIUM
+
+
+def current_profile():
+    """Settings of the quality profile of the work running in this context."""
+    return QUALITY_PROFILES[current_profile_name()]
+
+
+@contextmanager
+def quality_profile(name):
+    """Render the enclosed media of this context with the given quality profile."""
+    token = _profile.set(name)
+    try:
+        yield
+    finally:
+        _profile.reset(token)
+
+
+def video_cache_prompt(video_prompt):
+    """
+    Key under which a video is cached. Premium videos keep the bare prompt,
+    so videos cached before profiles existed are still found.
+    """
+    profile_name = current_profile_name()
+    if profile_name == PROFILE_PREMIUM:
+        return video_prompt
+    return f"[{profile_name}] {video_prompt}"
 
 
-def generate_first_frame(first_frame_prompt):
+def generate_first_frame(first_frame_prompt, pin=False):
     """
     Generate the first frame image using Replicate.
 
+    Images are cached by model, prompt and parameters, so a prompt that was
+    rendered before (e.g. a retried scene) skips Flux entirely.
+
     Args:
         first_frame_prompt: The prompt to generate the image
+        pin: Pin the image in the cache until ImageCache.release() is called,
+            so it is not evicted while videos are still being made from it
 
     Returns:
         URL to the generated image
     """
 
     try:
-        # Generate image using Replicate's Flux model
-        output = replicate.run(
-            "black-forest-labs/flux-1.1-pro",  # try flux-1.1-pro
-            input={
-                "prompt": first_frame_prompt,
-                "prompt_upsampling": True,
-                "output_format": "webp",
-            },
-        )
-
-        # Save the generated image to a temporary file
-        static_dir = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)), "static", "images"
-        )
-        os.makedirs(static_dir, exist_ok=True)
-
-        image_filename = f"{uuid.uuid4()}.webp"
-        image_path = os.path.join(static_dir, image_filename)
-
-        # Replicate returns an iterator, save the first item
-        # Add for loop for flux-schnell, not for flux-1.1-pro
-        with open(image_path, "wb") as file:
-            file.write(output.read())
+        with timed("flux", provider="replicate") as stage:
+            profile = current_profile()
+            image_model, image_params = profile["image_model"], profile["image_params"]
+            cache_key = ImageCache.make_key(image_model, first_frame_prompt, image_params)
+            cached_image = ImageCache.get_image(cache_key, pin=pin)
+            stage["cache"] = record_cache_lookup("image", cached_image)
+            if cached_image:
+                print(f"Using cached first frame for prompt: {first_frame_prompt[:50]}...")
+                return cached_image.url_path
+
+            # Generate image using Replicate's Flux model
+            with metered("flux", "replicate", image_model, "images") as usage:
+                image_data = call_provider(
+                    "replicate",
+                    get_provider("image").generate,
+                    image_model,
+                    first_frame_prompt,
+                    image_params,
+                )
+                usage["units"] = 1
+
+            image = ImageCache.save_image(
+                cache_key,
+                image_data,
+                image_model,
+                first_frame_prompt,
+                image_params,
+                pin=pin,
+            )
 
         print("First frame generated")
 
         # Return the URL to the image
-        return f"/static/images/{image_filename}"
+        return image.url_path
 
     except Exception as e:
         print(f"Error generating first frame: {e}")
         # Return placeholder if generation fails
-        return "/static/images/placeholder.jpg"
+        return PLACEHOLDER_IMAGE
+
+
+async def generate_first_frame_async(first_frame_prompt, pin=False):
+    """
+    Like generate_first_frame(), awaiting Replicate instead of blocking a
+    thread; the image cache is read and written in a worker thread.
+    """
+    try:
+        with timed("flux", provider="replicate") as stage:
+            profile = current_profile()
+            image_model, image_params = profile["image_model"], profile["image_params"]
+            cache_key = ImageCache.make_key(image_model, first_frame_prompt, image_params)
+            cached_url = await run_in_thread(cached_image_url, cache_key, pin)
+            stage["cache"] = record_cache_lookup("image", cached_url)
+            if cached_url:
+                print(f"Using cached first frame for prompt: {first_frame_prompt[:50]}...")
+                return cached_url
+
+            with metered("flux", "replicate", image_model, "images") as usage:
+                image_data = await call_provider_async(
+                    "replicate",
+                    get_provider("image").generate_async,
+                    image_model,
+                    first_frame_prompt,
+                    image_params,
+                )
+                usage["units"] = 1
+
+            image_url = await run_in_thread(
+                lambda: ImageCache.save_image(
+                    cache_key,
+                    image_data,
+                    image_model,
+                    first_frame_prompt,
+                    image_params,
+                    pin=pin,
+                ).url_path
+            )
+
+        print("First frame generated")
+        return image_url
+
+    except Exception as e:
+        print(f"Error generating first frame: {e}")
+        return PLACEHOLDER_IMAGE
+
+
+def cached_image_url(cache_key, pin=False):
+    """URL of a cached image, or None."""
+    cached_image = ImageCache.get_image(cache_key, pin=pin)
+    return cached_image.url_path if cached_image else None
+
+
+def extract_last_frame(video_url, pin=False):
+    """
+    Extract the last frame of a video with FFmpeg.
+
+    Used to start a scene where the previous one ended instead of generating
+    its first frame with Flux. Frames are stored in the image cache, keyed by
+    the video they come from.
+
+    Args:
+        video_url: URL of the video
+        pin: Pin the image in the cache (see generate_first_frame())
+
+    Returns:
+        URL to the extracted frame, or None if extraction failed
+    """
+    try:
+        cache_key = ImageCache.make_key(LAST_FRAME_MODEL, video_url)
+        cached_image = ImageCache.get_image(cache_key, pin=pin)
+        if cached_image:
+            print(f"Using cached last frame of {video_url}")
+            return cached_image.url_path
+
+        frame_path = os.path.join(
+            ImageCache.get_static_image_dir(), f"lastframe_{uuid.uuid4()}.jpg"
+        )
+        # Every decoded frame overwrites the file, so the last one remains.
+        # Seeking from the end is unreliable when muxed narration outlasts the clips.
+        ffmpeg_cmd = [
+            "ffmpeg",
+            "-y",
+            "-i",
+            os.path.join(ROOT_DIR, video_url.lstrip("/")),
+            "-map",
+            "0:v:0",
+            "-update",
+            "1",
+            "-q:v",
+            "2",
+            frame_path,
+        ]
+        try:
+            result = run_ffmpeg(ffmpeg_cmd, job="last_frame")
+            if not result.ok or not os.path.exists(frame_path):
+                print(f"FFmpeg error: {result.stderr}")
+                return None
+            with open(frame_path, "rb") as frame_file:
+                data = frame_file.read()
+        finally:
+            if os.path.exists(frame_path):
+                os.remove(frame_path)
+
+        image = ImageCache.save_image(
+            cache_key, data, LAST_FRAME_MODEL, video_url, extension=".jpg", pin=pin
+        )
+        print("Last frame extracted")
+        return image.url_path
+
+    except Exception as e:
+        print(f"Error extracting last frame: {e}")
+        return None
 
 
 def image_to_data_uri(image_path):
@@ -74,9 +304,190 @@ def image_to_data_uri(image_path):
     Returns:
         Data URI string
     """
+    mime_type = mimetypes.guess_type(image_path)[0] or "image/webp"
     with open(image_path, "rb") as img_file:
         base64_data = base64.b64encode(img_file.read()).decode("utf-8")
-    return f"data:image/webp;base64,{base64_data}"
+    return f"data:{mime_type};base64,{base64_data}"
+
+
+def prepare_prompt_image(image_url):
+    """
+    Resize and re-encode a first frame to exactly what Runway consumes.
+
+    Flux frames are larger than Runway's output and WebP-encoded; a JPEG at
+    VIDEO_WIDTH x VIDEO_HEIGHT is a fraction of the size. The image is scaled
+    to cover the frame and centre-cropped, as Runway would do itself.
+
+    Args:
+        image_url: URL of the first frame
+
+    Returns:
+        URL of the resized image, or image_url if resizing failed
+    """
+    try:
+        cache_key = ImageCache.make_key(
+            PROMPT_IMAGE_MODEL,
+            image_url,
+            {"size": f"{VIDEO_WIDTH}x{VIDEO_HEIGHT}", "q": PROMPT_IMAGE_QUALITY},
+        )
+        cached_image = ImageCache.get_image(cache_key)
+        if cached_image:
+            return cached_image.url_path
+
+        resized_path = os.path.join(
+            ImageCache.get_static_image_dir(), f"prompt_{uuid.uuid4()}.jpg"
+        )
+        ffmpeg_cmd = [
+            "ffmpeg",
+            "-y",
+            "-i",
+            os.path.join(ROOT_DIR, image_url.lstrip("/")),
+            "-vf",
+            f"scale={VIDEO_WIDTH}:{VIDEO_HEIGHT}:force_original_aspect_ratio=increase,"
+            f"crop={VIDEO_WIDTH}:{VIDEO_HEIGHT}",
+            "-frames:v",
+            "1",
+            "-q:v",
+            str(PROMPT_IMAGE_QUALITY),
+            resized_path,
+        ]
+        try:
+            result = run_ffmpeg(ffmpeg_cmd, job="prompt_image")
+            if not result.ok or not os.path.exists(resized_path):
+                print(f"FFmpeg error: {result.stderr}")
+                return image_url
+            with open(resized_path, "rb") as resized_file:
+                data = resized_file.read()
+        finally:
+            if os.path.exists(resized_path):
+                os.remove(resized_path)
+
+        image = ImageCache.save_image(
+            cache_key, data, PROMPT_IMAGE_MODEL, image_url, extension=".jpg"
+        )
+        return image.url_path
+
+    except Exception as e:
+        print(f"Error resizing first frame: {e}")
+        return image_url
+
+
+def runway_prompt_image(first_frame_url):
+    """
+    The first frame as Runway's prompt_image: by URL if this app is publicly
+    reachable, otherwise as a data URI of the resized image.
+    """
+    image_url = prepare_prompt_image(first_frame_url)
+    if PUBLIC_MEDIA_BASE_URL:
+        return f"{PUBLIC_MEDIA_BASE_URL}{image_url}"
+    return image_to_data_uri(os.path.join(ROOT_DIR, image_url.lstrip("/")))
+
+
+def run_runway_task(prompt_image, video_prompt, model="gen3a_turbo", duration=5):
+    """
+    Submit an image-to-video task to Runway and wait for it to finish.
+
+    Submissions rejected with HTTP 429 are retried with exponential backoff.
+    THROTTLED is not a failure: Runway has queued the task behind our other
+    running tasks, so we keep polling until it starts.
+
+    Args:
+        prompt_image: The first frame as an HTTPS URL or a data URI
+        video_prompt: The prompt to generate the video
+        model: The Runway model
+        duration: Clip length in seconds
+
+    Returns:
+        The succeeded VideoTask, with its output_url
+
+    Raises:
+        RuntimeError: if the task failed or was cancelled
+        TimeoutError: if the task did not finish within RUNWAY_TASK_TIMEOUT_SECONDS
+    """
+    # Runway bills the seconds of video of succeeded tasks
+    with metered("runway", "runway", model, "seconds") as usage:
+        output = _run_runway_task(prompt_image, video_prompt, model, duration, usage)
+        usage["units"] = duration
+        return output
+
+
+def _run_runway_task(prompt_image, video_prompt, model, duration, usage):
+    provider = get_provider("video")
+    with timed("runway_submit", provider="runway"):
+        for attempt in range(RUNWAY_SUBMIT_RETRIES + 1):
+            usage["retries"] = attempt
+            try:
+                task_id = provider.submit(model, prompt_image, video_prompt, duration)
+                break
+            except ProviderRateLimited:
+                if attempt == RUNWAY_SUBMIT_RETRIES:
+                    raise
+                delay = 2**attempt
+                print(f"Runway rate limited, retrying in {delay}s")
+                time.sleep(delay)
+
+    # Wait for the video generation to complete
+    with timed("runway_poll", provider="runway"):
+        deadline = time.monotonic() + RUNWAY_TASK_TIMEOUT_SECONDS
+        while True:
+            task = provider.retrieve(task_id)
+            if task.status == TASK_SUCCEEDED:
+                return task
+            if task.status in {TASK_FAILED, TASK_CANCELLED}:
+                raise RuntimeError(f"Runway task {task.status.lower()}: {task}")
+            if time.monotonic() > deadline:
+                try:
+                    provider.cancel(task_id)
+                except Exception as e:
+                    print(f"Error cancelling Runway task {task_id}: {e}")
+                raise TimeoutError(f"Runway task {task_id} timed out")
+            time.sleep(0.5)
+
+
+async def run_runway_task_async(prompt_image, video_prompt, model="gen3a_turbo", duration=5):
+    """Like run_runway_task(), polling Runway without holding a thread."""
+    with metered("runway", "runway", model, "seconds") as usage:
+        output = await _run_runway_task_async(prompt_image, video_prompt, model, duration, usage)
+        usage["units"] = duration
+        return output
+
+
+async def _run_runway_task_async(prompt_image, video_prompt, model, duration, usage):
+    provider = get_provider("video")
+    with timed("runway_submit", provider="runway"):
+        for attempt in range(RUNWAY_SUBMIT_RETRIES + 1):
+            usage["retries"] = attempt
+            try:
+                task_id = await provider.submit_async(
+                    model, prompt_image, video_prompt, duration
+                )
+                break
+            except ProviderRateLimited:
+                if attempt == RUNWAY_SUBMIT_RETRIES:
+                    raise
+                delay = 2**attempt
+                print(f"Runway rate limited, retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+    with timed("runway_poll", provider="runway"):
+        deadline = time.monotonic() + RUNWAY_TASK_TIMEOUT_SECONDS
+        try:
+            while True:
+                task = await provider.retrieve_async(task_id)
+                if task.status == TASK_SUCCEEDED:
+                    return task
+                if task.status in {TASK_FAILED, TASK_CANCELLED}:
+                    raise RuntimeError(f"Runway task {task.status.lower()}: {task}")
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Runway task {task_id} timed out")
+                await asyncio.sleep(0.5)
+        except (TimeoutError, asyncio.CancelledError):
+            # Nobody will download the clip: stop paying for it
+            try:
+                await asyncio.shield(provider.cancel_async(task_id))
+            except Exception as e:
+                print(f"Error cancelling Runway task {task_id}: {e}")
+            raise
 
 
 def generate_video(first_frame_url, video_prompt):
@@ -93,88 +504,133 @@ def generate_video(first_frame_url, video_prompt):
 
     try:
         # Check if we already have a video with this prompt
-        cached_video = VideoCache.get_video_by_prompt(video_prompt)
-        if cached_video:
+        profile = current_profile()
+        cache_prompt = video_cache_prompt(video_prompt)
+        cached_video = VideoCache.get_video_by_prompt(cache_prompt)
+        if record_cache_lookup("video", cached_video) == "hit":
             print(f"Using cached video for prompt: {video_prompt[:50]}...")
             return cached_video.url_path
 
-        # Get the absolute path to the first frame image
-        image_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)), first_frame_url.lstrip("/")
-        )
-
-        # Convert the image to a data URI
-        image_data_uri = image_to_data_uri(image_path)
+        # The first frame at Runway's resolution, by URL or inline
+        prompt_image = runway_prompt_image(first_frame_url)
 
         print("Generating video...")
 
-        # Generate video using Runway
-        task = client.image_to_video.create(
-            model="gen3a_turbo",
-            prompt_image=image_data_uri,
-            prompt_text=video_prompt,
-            duration=5,  # 5 seconds for each clip
-        )
+        # The Runway slot is held for the whole task: the concurrency limit applies
+        # to running tasks, not just to submissions
+        try:
+            task = call_provider(
+                "runway",
+                run_runway_task,
+                prompt_image,
+                video_prompt,
+                profile["video_model"],
+                profile["clip_seconds"],
+            )
+        except (CircuitOpenError, RuntimeError, TimeoutError) as e:
+            print(f"Video generation failed: {e}")
+            return PLACEHOLDER_VIDEO
 
-        # Wait for the video generation to complete
-        while True:
-            output = client.tasks.retrieve(id=task.id)
-            if output.status in {"SUCCEEDED", "FAILED", "CANCELLED", "THROTTLED"}:
-                break
-            time.sleep(0.5)
-            print(".", end="", flush=True)
+        print("Video generated")
 
-        print("\nVideo generated")
+        # Save the video to a local file
+        video_dir = VideoCache.get_static_video_dir()
+        video_filename = VideoCache.generate_unique_filename()
+        video_path = os.path.join(video_dir, video_filename)
 
-        if output.status == "SUCCEEDED":
-            # Save the video to a local file
-            video_dir = VideoCache.get_static_video_dir()
-            video_filename = VideoCache.generate_unique_filename()
-            video_path = os.path.join(video_dir, video_filename)
+        output_url = task.output_url
+        if not output_url:
+            print("No valid URL returned from Runway API")
+            return PLACEHOLDER_VIDEO
 
-            # Format handling for the output URL
-            output_url = output.output
-            if isinstance(output_url, list):
-                output_url = output_url[0] if output_url else None
+        # Download and save the video
+        try:
+            with timed("runway_download", provider="runway"):
+                get_provider("video").download(output_url, video_path)
+            print(f"Video saved to {video_path}")
 
-            if not output_url:
-                print("No valid URL returned from Runway API")
-                return "/static/videos/placeholder.mp4"
+            # Register the video in our cache
+            video_obj = VideoCache.save_video(
+                f"/static/videos/{video_filename}",
+                is_combined=False,
+                original_prompt=cache_prompt,
+            )
 
-            # Download and save the video
-            try:
-                response = requests.get(output_url, stream=True)
-                with open(video_path, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                print(f"Video saved to {video_path}")
+            return video_obj.url_path
+        except Exception as download_error:
+            print(f"Error downloading video: {download_error}")
+            return PLACEHOLDER_VIDEO
 
-                # Delete the first frame image after successful video generation
-                try:
-                    if os.path.exists(image_path):
-                        os.remove(image_path)
-                        print(f"Deleted first frame image: {image_path}")
-                except Exception as del_err:
-                    print(f"Error deleting first frame image {image_path}: {del_err}")
+    except Exception as e:
+        print(f"Error generating video: {e}")
+        return PLACEHOLDER_VIDEO
 
-                # Register the video in our cache
-                video_obj = VideoCache.save_video(
+
+async def generate_video_async(first_frame_url, video_prompt):
+    """
+    Like generate_video(), awaiting Runway instead of blocking a thread; the
+    cache lookups, prompt image (FFmpeg) and registration run in worker threads.
+    """
+    try:
+        profile = current_profile()
+        cache_prompt = video_cache_prompt(video_prompt)
+        cached_url = await run_in_thread(cached_video_url, cache_prompt)
+        if record_cache_lookup("video", cached_url) == "hit":
+            print(f"Using cached video for prompt: {video_prompt[:50]}...")
+            return cached_url
+
+        prompt_image = await run_in_thread(runway_prompt_image, first_frame_url)
+
+        print("Generating video...")
+
+        # The Runway slot is held for the whole task, as in generate_video()
+        try:
+            task = await call_provider_async(
+                "runway",
+                run_runway_task_async,
+                prompt_image,
+                video_prompt,
+                profile["video_model"],
+                profile["clip_seconds"],
+            )
+        except (CircuitOpenError, RuntimeError, TimeoutError) as e:
+            print(f"Video generation failed: {e}")
+            return PLACEHOLDER_VIDEO
+
+        print("Video generated")
+
+        output_url = task.output_url
+        if not output_url:
+            print("No valid URL returned from Runway API")
+            return PLACEHOLDER_VIDEO
+
+        video_filename = VideoCache.generate_unique_filename()
+        video_path = os.path.join(VideoCache.get_static_video_dir(), video_filename)
+        try:
+            with timed("runway_download", provider="runway"):
+                await get_provider("video").download_async(output_url, video_path)
+            print(f"Video saved to {video_path}")
+
+            return await run_in_thread(
+                lambda: VideoCache.save_video(
                     f"/static/videos/{video_filename}",
                     is_combined=False,
-                    original_prompt=video_prompt,
-                )
-
-                return video_obj.url_path
-            except Exception as download_error:
-                print(f"Error downloading video: {download_error}")
-                return "/static/videos/placeholder.mp4"
-        else:
-            print(f"Video generation failed: {output}")
-            return "/static/videos/placeholder.mp4"
+                    original_prompt=cache_prompt,
+                ).url_path
+            )
+        except Exception as download_error:
+            print(f"Error downloading video: {download_error}")
+            return PLACEHOLDER_VIDEO
 
     except Exception as e:
         print(f"Error generating video: {e}")
-        return "/static/videos/placeholder.mp4"
+        return PLACEHOLDER_VIDEO
+
+
+def cached_video_url(cache_prompt):
+    """URL of the cached video for a cache prompt, or None."""
+    cached_video = VideoCache.get_video_by_prompt(cache_prompt)
+    return cached_video.url_path if cached_video else None
 
 
 def generate_scene_videos(scene_prompts):
@@ -201,26 +657,33 @@ def generate_scene_videos(scene_prompts):
     return video_urls
 
 
-def concatenate_videos(video_urls):
+def concatenate_videos(video_urls, audio_url=None):
     """
     Concatenate multiple videos into a single video file.
 
+    If an audio URL is given, the narration is muxed into the result in the
+    same FFmpeg pass (the video streams are copied, not re-encoded), so the
+    client downloads a single file per scene.
+
     Args:
         video_urls: List of dictionaries containing scene_id and video_url
+        audio_url: Optional URL of the narration to add as the audio track
 
     Returns:
         URL to the concatenated video
     """
     if not video_urls:
-        return "/static/videos/placeholder.mp4"
+        return PLACEHOLDER_VIDEO
 
-    # If there's only one video, just return it
-    if len(video_urls) == 1:
+    # If there's only one video and nothing to add, just return it
+    if len(video_urls) == 1 and not audio_url:
         return video_urls[0]["video_url"]
 
     # Create a unique concatenation signature based on sorted video URLs
     sorted_urls = sorted([v["video_url"] for v in video_urls])
     concat_signature = f"concat:{'|'.join(sorted_urls)}"
+    if audio_url:
+        concat_signature += f"+audio:{audio_url}"
 
     # Check if we've already concatenated these exact videos
     from database.models import Video
@@ -229,7 +692,7 @@ def concatenate_videos(video_urls):
         is_combined=True, original_prompt=concat_signature
     ).first()
 
-    if existing_videos:
+    if record_cache_lookup("combined_video", existing_videos) == "hit":
         print("Using cached concatenated video")
         return existing_videos.url_path
 
@@ -273,21 +736,41 @@ def concatenate_videos(video_urls):
                 "0",
                 "-i",
                 file_list_path,
-                "-c",
-                "copy",
-                output_path,
             ]
-            result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
-
-            if result.returncode != 0:
+            if audio_url:
+                # Copy the video, encode the narration to AAC for MP4
+                ffmpeg_cmd += [
+                    "-i",
+                    os.path.join(ROOT_DIR, audio_url.lstrip("/")),
+                    "-map",
+                    "0:v",
+                    "-map",
+                    "1:a",
+                    "-c:v",
+                    "copy",
+                    "-c:a",
+                    "aac",
+                    "-b:a",
+                    "128k",
+                    "-movflags",
+                    "+faststart",
+                ]
+            else:
+                ffmpeg_cmd += ["-c", "copy"]
+            ffmpeg_cmd.append(output_path)
+            with timed("ffmpeg_concat", provider="ffmpeg"):
+                result = run_ffmpeg(ffmpeg_cmd, job="concat")
+
+            if not result.ok:
                 print(f"FFmpeg error: {result.stderr}")
                 # If FFmpeg fails, fall back to the first video
                 return video_urls[0]["video_url"]
 
             print(f"Videos concatenated successfully to {output_path}")
 
-            # Delete individual videos after successful concatenation
-            for video_path in video_paths:
+            # Delete individual videos after successful concatenation; a lone
+            # clip that only had narration added is still served on its own
+            for video_path in video_paths if len(video_paths) > 1 else []:
                 try:
                     if os.path.exists(video_path):
                         os.remove(video_path)
@@ -303,6 +786,7 @@ def concatenate_videos(video_urls):
                 f"/static/videos/{output_filename}",
                 is_combined=True,
                 original_prompt=concat_signature,
+                has_audio=bool(audio_url),
             )
 
             return video_obj.url_path
@@ -316,3 +800,88 @@ def concatenate_videos(video_urls):
         print(f"Error in concatenate_videos: {e}")
         # Fall back to the first video
         return video_urls[0]["video_url"]
+
+
+def render_pan_zoom_video(image_urls, seconds_per_image=5, timeout=None):
+    """
+    Render a slow pan/zoom clip from still images with FFmpeg.
+
+    Used as a stand-in when the Runway video for a scene cannot be ready in
+    time: it only needs the first-frame images and takes a few seconds locally.
+
+    Args:
+        image_urls: URLs of the images to animate, in scene order
+        seconds_per_image: Duration of each image's segment
+        timeout: Maximum seconds to wait for FFmpeg, including time queued
+
+    Returns:
+        URL to the rendered video, or None if rendering failed
+    """
+    if not image_urls:
+        return None
+
+    signature = f"panzoom:{'|'.join(image_urls)}"
+    from database.models import Video
+
+    existing_video = Video.query.filter_by(
+        is_combined=True, original_prompt=signature
+    ).first()
+    if existing_video:
+        print("Using cached pan/zoom video")
+        return existing_video.url_path
+
+    fps = 25
+    frames = seconds_per_image * fps
+
+    ffmpeg_cmd = ["ffmpeg", "-y"]
+    filters = []
+    for index, image_url in enumerate(image_urls):
+        ffmpeg_cmd += ["-i", os.path.join(ROOT_DIR, image_url.lstrip("/"))]
+        # Upscale first so the zoom doesn't jitter, then zoom in slowly on the centre
+        filters.append(
+            f"[{index}:v]scale={VIDEO_WIDTH * 2}:-2,"
+            f"zoompan=z='min(zoom+0.0015,1.25)':d={frames}:"
+            f"x='iw/2-(iw/zoom/2)':y='ih/2-(ih/zoom/2)':"
+            f"s={VIDEO_WIDTH}x{VIDEO_HEIGHT}:fps={fps},setsar=1[v{index}]"
+        )
+    segments = "".join(f"[v{index}]" for index in range(len(image_urls)))
+    filters.append(f"{segments}concat=n={len(image_urls)}:v=1:a=0[out]")
+
+    output_filename = VideoCache.generate_unique_filename()
+    output_path = os.path.join(VideoCache.get_static_video_dir(), output_filename)
+    ffmpeg_cmd += [
+        "-filter_complex",
+        ";".join(filters),
+        "-map",
+        "[out]",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-pix_fmt",
+        "yuv420p",
+        "-movflags",
+        "+faststart",
+        output_path,
+    ]
+
+    try:
+        print("Rendering pan/zoom video with FFmpeg...")
+        result = run_ffmpeg(ffmpeg_cmd, job="pan_zoom", timeout=timeout)
+        if not result.ok:
+            print(f"FFmpeg error: {result.stderr}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return None
+    except Exception as e:
+        print(f"Error rendering pan/zoom video: {e}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return None
+
+    video_obj = VideoCache.save_video(
+        f"/static/videos/{output_filename}",
+        is_combined=True,
+        original_prompt=signature,
+    )
+    return video_obj.url_path
@@ -0,0 +1,496 @@
+"""
+Latency SLOs and graceful degradation for scene media.
+
+A scene's full video (Flux first frames -> Runway clips -> FFmpeg concat) can
+take well over a minute, and longer when Runway is slow or failing. Instead of
+blocking the student, the full pipeline runs in a background thread and the
+request waits only until the scene's deadline. The best tier that can be
+delivered in time is returned:
+
+    video     - the full Runway video
+    pan_zoom  - a pan/zoom clip rendered locally from the first-frame images
+    image     - the first-frame image shown with the narration
+    text      - narration only
+
+If a lower tier was delivered, the cached scene is upgraded in the background
+once the full video is ready, so later students get the full video. Should
+that pipeline fail, the scene records when to try again (upgrade_retry_at),
+and the first cache hit after that reruns it (see api/scene_builder.py).
+
+With CONTINUITY_FRAMES, a scene continuing a full video starts from that
+video's last frame instead of a Flux image, which skips one Replicate call per
+decision and keeps the picture continuous. Flux remains the fallback.
+
+With MUX_NARRATION, the narration is muxed into the full video while the clips
+are concatenated, so the client downloads one file per scene instead of a
+video and a separate MP3.
+
+Background work (e.g. assignment warm-up) has no deadline and waits for the
+full video.
+
+generate_scene_media_async() is the same for the ASGI app (see asgi.py): the
+pipeline is a task of the event loop instead of a thread, so a scene waiting on
+Runway holds no thread. Database and FFmpeg work still runs in worker threads.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from flask import current_app
+from api.ledger import current_attribution, record_fallback, use_attribution
+from api.media_generator import (
+    PLACEHOLDER_IMAGE,
+    PLACEHOLDER_VIDEO,
+    concatenate_videos,
+    current_profile_name,
+    extract_last_frame,
+    generate_first_frame,
+    generate_first_frame_async,
+    generate_video,
+    generate_video_async,
+    quality_profile,
+    render_pan_zoom_video,
+)
+from api.rate_limiter import PRIORITY_INTERACTIVE, current_priority, request_priority
+from api.renditions import schedule_renditions
+from api.timing import current_scenario, scenario_context
+from api.tracing import current_context, span, use_context
+from api.tts_agent import (
+    STREAMING_TTS,
+    cached_speech_url,
+    generate_speech,
+    generate_speech_async,
+)
+from database import run_in_thread
+from database.image_cache import ImageCache
+from database.video_cache import VideoCache
+
+TIER_VIDEO = "video"
+TIER_PAN_ZOOM = "pan_zoom"
+TIER_IMAGE = "image"
+TIER_TEXT = "text"
+
+# Seconds a student may wait for a new scene, from the decision to the response
+SCENE_LATENCY_SLO_SECONDS = float(os.environ.get("SCENE_LATENCY_SLO_SECONDS", "45"))
+
+# Seconds reserved at the end of the SLO to render the pan/zoom fallback
+PAN_ZOOM_RENDER_SECONDS = float(os.environ.get("PAN_ZOOM_RENDER_SECONDS", "8"))
+
+# Seconds after a lower tier was delivered before a cache hit may retry the
+# full video; long enough for the first pipeline to finish, and the spacing of
+# retries while a provider is down
+MEDIA_UPGRADE_RETRY_SECONDS = float(
+    os.environ.get("MEDIA_UPGRADE_RETRY_SECONDS", "600")
+)
+
+# Whether a scene's first frame is taken from the end of the previous scene's video
+CONTINUITY_FRAMES = os.environ.get("CONTINUITY_FRAMES", "false").lower() == "true"
+
+# Whether the narration is muxed into the full video instead of sent separately
+MUX_NARRATION = os.environ.get("MUX_NARRATION", "true").lower() == "true"
+
+# Pipelines running as tasks; the event loop only keeps weak references to them
+_tasks = set()
+
+
+def scene_deadline():
+    """
+    Monotonic deadline for a scene requested now, or None for background work.
+    """
+    if current_priority() > PRIORITY_INTERACTIVE:
+        return None
+    return time.monotonic() + SCENE_LATENCY_SLO_SECONDS
+
+
+def media_upgrade_due(media_data):
+    """
+    Whether a cached scene's media is below the full video and due for another
+    attempt at it. Scenes cached without a retry time are due right away.
+    """
+    if not media_data or media_data.get("tier", TIER_VIDEO) == TIER_VIDEO:
+        return False
+    return time.time() >= media_data.get("upgrade_retry_at", 0)
+
+
+def continuity_video(previous_media):
+    """
+    Video whose last frame starts the next scene, or None to use Flux.
+
+    Only full videos qualify: a pan/zoom clip ends zoomed in on a still image.
+    """
+    if not CONTINUITY_FRAMES or not previous_media:
+        return None
+    if previous_media.get("tier", TIER_VIDEO) != TIER_VIDEO:
+        return None
+    video_url = previous_media.get("combined_video")
+    if not video_url or video_url == PLACEHOLDER_VIDEO:
+        return None
+    return video_url
+
+
+class SceneMediaJob:
+    """Runs the full video pipeline for one scene in a background thread."""
+
+    def __init__(
+        self, scene_prompts, narrative_text, on_upgrade=None, previous_video=None
+    ):
+        self.scene_prompts = scene_prompts
+        self.narrative_text = narrative_text
+        self.on_upgrade = on_upgrade
+        # Video whose last frame replaces the Flux image of the first sub-scene
+        self.previous_video = previous_video
+        # Quality profile of the caller; the pipeline thread renders with it
+        self.profile = current_profile_name()
+        self.scenario = current_scenario()
+        # The pipeline's spans belong to the trace of the request that started
+        # it, and its provider calls to the same generation in the cost ledger
+        self.trace_context = current_context()
+        self.attribution = current_attribution()
+        self.first_frames = []
+        self.video_urls = []
+        self.combined_video = None
+        self.failed = False
+        self.audio_url = None
+        # Set once the caller has settled on the narration for the scene
+        self.audio_ready = threading.Event()
+        # Whether combined_video carries the narration as its audio track
+        self.narration_in_video = False
+        # Tier handed to the caller when it stopped waiting, None until then
+        self.delivered_tier = None
+        # The pipeline thread and the caller of result() both use the first
+        # frames; they stay pinned in the image cache until both are finished
+        self.frame_users = 2
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self):
+        app = current_app._get_current_object()
+        priority = current_priority()
+        thread = threading.Thread(
+            target=self._run, args=(app, priority), name="scene-media", daemon=True
+        )
+        thread.start()
+        return self
+
+    def _run(self, app, priority):
+        with app.app_context(), request_priority(priority), quality_profile(
+            self.profile
+        ), scenario_context(self.scenario), use_attribution(
+            self.attribution
+        ), use_context(self.trace_context), span("scene_media_job"):
+            try:
+                scenes = self.scene_prompts["scenes"]
+
+                # All first frames first, so the image tiers become available early
+                for index, scene in enumerate(scenes):
+                    first_frame_url = None
+                    if index == 0 and self.previous_video:
+                        first_frame_url = extract_last_frame(
+                            self.previous_video, pin=True
+                        )
+                    if not first_frame_url:
+                        first_frame_url = generate_first_frame(
+                            scene["first_frame_prompt"], pin=True
+                        )
+                    if first_frame_url == PLACEHOLDER_IMAGE:
+                        raise RuntimeError("First frame generation failed")
+                    self.first_frames.append(first_frame_url)
+
+                video_urls = []
+                for scene, first_frame_url in zip(scenes, self.first_frames):
+                    video_url = generate_video(first_frame_url, scene["video_prompt"])
+                    if video_url == PLACEHOLDER_VIDEO:
+                        raise RuntimeError("Video generation failed")
+                    video_urls.append(
+                        {"scene_id": scene["scene_id"], "video_url": video_url}
+                    )
+
+                self.video_urls = video_urls
+                narration_url = self._narration_to_mux()
+                self.combined_video = concatenate_videos(video_urls, narration_url)
+                if narration_url:
+                    self.narration_in_video = video_has_audio(self.combined_video)
+                schedule_renditions(self.combined_video)
+            except Exception as e:
+                print(f"Full video pipeline failed: {e}")
+                self.failed = True
+
+            if self._mark_done():
+                print("Full video ready, upgrading cached scene")
+                if not self.audio_url:
+                    # Narration streamed to the student has been cached by now
+                    self.audio_url = cached_speech_url(self.narrative_text)
+                try:
+                    self.on_upgrade(self.media_data(TIER_VIDEO))
+                except Exception as e:
+                    print(f"Error upgrading cached scene: {e}")
+
+            self._release_first_frames()
+
+    def _mark_done(self):
+        """Flag the pipeline as finished; True if the cached scene needs an upgrade."""
+        with self.lock:
+            self.done.set()
+            return bool(
+                self.delivered_tier not in (None, TIER_VIDEO)
+                and not self.failed
+                and self.on_upgrade
+            )
+
+    def _narration_to_mux(self):
+        """URL of the narration to mux into the full video, or None."""
+        if not MUX_NARRATION:
+            return None
+        # The clips take far longer than the narration, so this rarely waits
+        self.audio_ready.wait()
+        # Narration streamed to the student is cached once the stream finishes
+        return self.audio_url or cached_speech_url(self.narrative_text)
+
+    def _release_first_frames(self):
+        """Unpin the first frames once neither the pipeline nor the caller needs them."""
+        with self.lock:
+            self.frame_users -= 1
+            if self.frame_users:
+                return
+            first_frames = list(self.first_frames)
+        for first_frame_url in first_frames:
+            try:
+                ImageCache.release(first_frame_url)
+            except Exception as e:
+                print(f"Error releasing first frame {first_frame_url}: {e}")
+
+    def media_data(self, tier, media_url=None):
+        if tier == TIER_VIDEO:
+            media_url = self.combined_video
+        full_video = tier == TIER_VIDEO
+        narration_in_video = full_video and self.narration_in_video
+        return {
+            "tier": tier,
+            "individual_videos": self.video_urls if full_video else [],
+            "combined_video": media_url,
+            "first_frames": [] if full_video else list(self.first_frames),
+            "audio": None if narration_in_video else self.audio_url,
+            "narration_in_video": narration_in_video,
+            "profile": self.profile,
+        }
+
+    def result(self, deadline):
+        """
+        Wait for the full video until the deadline, then settle on the best tier.
+
+        Args:
+            deadline: Monotonic deadline, or None to wait for the full video
+
+        Returns:
+            Media data dictionary including the delivered "tier"
+        """
+        if deadline is None:
+            self.done.wait()
+        else:
+            wait = deadline - PAN_ZOOM_RENDER_SECONDS - time.monotonic()
+            self.done.wait(max(0, wait))
+
+        try:
+            return self._settle(deadline)
+        finally:
+            self._release_first_frames()
+
+    def _settle(self, deadline):
+        with self.lock:
+            if self.done.is_set() and not self.failed:
+                self.delivered_tier = TIER_VIDEO
+                return self.media_data(TIER_VIDEO)
+            # From here on the background thread upgrades the cache when it finishes
+            self.delivered_tier = TIER_TEXT
+            first_frames = list(self.first_frames)
+
+        tier, media_url = TIER_TEXT, None
+        if first_frames:
+            tier = TIER_IMAGE
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is None or remaining > 0:
+                pan_zoom_url = render_pan_zoom_video(first_frames, timeout=remaining)
+                if pan_zoom_url:
+                    tier, media_url = TIER_PAN_ZOOM, pan_zoom_url
+
+        with self.lock:
+            self.delivered_tier = tier
+        record_fallback("media", "local", tier)
+        print(f"Delivering scene media at tier '{tier}'")
+        media_data = self.media_data(tier, media_url)
+        # The pipeline may still deliver; if it does not, retry after this
+        media_data["upgrade_retry_at"] = time.time() + MEDIA_UPGRADE_RETRY_SECONDS
+        return media_data
+
+
+class AsyncSceneMediaJob(SceneMediaJob):
+    """
+    Runs the full video pipeline for one scene as a task of the running event
+    loop. The task inherits the caller's priority, profile, scenario, trace and
+    attribution; it gets an application context (and so a database session)
+    of its own.
+    """
+
+    def __init__(
+        self, scene_prompts, narrative_text, on_upgrade=None, previous_video=None
+    ):
+        super().__init__(scene_prompts, narrative_text, on_upgrade, previous_video)
+        self.audio_ready = asyncio.Event()
+        self.done = asyncio.Event()
+
+    def start(self):
+        app = current_app._get_current_object()
+        task = asyncio.create_task(self._run_async(app), name="scene-media")
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+        return self
+
+    async def _run_async(self, app):
+        with app.app_context(), span("scene_media_job"):
+            try:
+                scenes = self.scene_prompts["scenes"]
+
+                for index, scene in enumerate(scenes):
+                    first_frame_url = None
+                    if index == 0 and self.previous_video:
+                        first_frame_url = await run_in_thread(
+                            extract_last_frame, self.previous_video, pin=True
+                        )
+                    if not first_frame_url:
+                        first_frame_url = await generate_first_frame_async(
+                            scene["first_frame_prompt"], pin=True
+                        )
+                    if first_frame_url == PLACEHOLDER_IMAGE:
+                        raise RuntimeError("First frame generation failed")
+                    self.first_frames.append(first_frame_url)
+
+                video_urls = []
+                for scene, first_frame_url in zip(scenes, self.first_frames):
+                    video_url = await generate_video_async(
+                        first_frame_url, scene["video_prompt"]
+                    )
+                    if video_url == PLACEHOLDER_VIDEO:
+                        raise RuntimeError("Video generation failed")
+                    video_urls.append(
+                        {"scene_id": scene["scene_id"], "video_url": video_url}
+                    )
+
+                self.video_urls = video_urls
+                narration_url = await self._narration_to_mux_async()
+                self.combined_video = await run_in_thread(
+                    concatenate_videos, video_urls, narration_url
+                )
+                if narration_url:
+                    self.narration_in_video = await run_in_thread(
+                        video_has_audio, self.combined_video
+                    )
+                await run_in_thread(schedule_renditions, self.combined_video)
+            except Exception as e:
+                print(f"Full video pipeline failed: {e}")
+                self.failed = True
+
+            if self._mark_done():
+                print("Full video ready, upgrading cached scene")
+                if not self.audio_url:
+                    self.audio_url = await run_in_thread(
+                        cached_speech_url, self.narrative_text
+                    )
+                try:
+                    await run_in_thread(
+                        self.on_upgrade, self.media_data(TIER_VIDEO)
+                    )
+                except Exception as e:
+                    print(f"Error upgrading cached scene: {e}")
+
+            await run_in_thread(self._release_first_frames)
+
+    async def _narration_to_mux_async(self):
+        if not MUX_NARRATION:
+            return None
+        await self.audio_ready.wait()
+        if self.audio_url:
+            return self.audio_url
+        return await run_in_thread(cached_speech_url, self.narrative_text)
+
+    async def result_async(self, deadline):
+        """Like result(), waiting in the event loop; the fallback tiers render in a thread."""
+        if deadline is None:
+            await self.done.wait()
+        else:
+            wait = deadline - PAN_ZOOM_RENDER_SECONDS - time.monotonic()
+            try:
+                await asyncio.wait_for(self.done.wait(), max(0, wait))
+            except asyncio.TimeoutError:
+                pass
+
+        try:
+            return await run_in_thread(self._settle, deadline)
+        finally:
+            await run_in_thread(self._release_first_frames)
+
+
+def video_has_audio(video_url):
+    """Whether a cached video has an audio track; FFmpeg failures fall back to a silent clip."""
+    video = VideoCache.get_video_by_url(video_url)
+    return bool(video and video.has_audio)
+
+
+def generate_scene_media(
+    scene_prompts, narrative_text, deadline, on_upgrade=None, previous_media=None
+):
+    """
+    Generate a scene's media, degrading to a cheaper tier to meet the deadline.
+
+    Args:
+        scene_prompts: Scene prompts from the Producer Agent
+        narrative_text: The narrative to narrate
+        deadline: Monotonic deadline from scene_deadline(), or None to wait
+        on_upgrade: Called with the full-video media data if a lower tier was
+            delivered and the full video finishes later
+        previous_media: Media data of the scene being continued, if any
+
+    Returns:
+        Media data dictionary including the delivered "tier"; "audio" is None
+        when the narration is left to the streaming endpoint
+    """
+    job = SceneMediaJob(
+        scene_prompts, narrative_text, on_upgrade, continuity_video(previous_media)
+    ).start()
+
+    try:
+        if STREAMING_TTS and deadline is not None:
+            # Students get narration streamed from /api/narration as it is
+            # synthesized, so only reuse narration that already exists
+            job.audio_url = cached_speech_url(narrative_text)
+        else:
+            # Narration runs alongside the video pipeline; every tier uses it
+            job.audio_url = generate_speech(narrative_text)
+    finally:
+        job.audio_ready.set()
+
+    return job.result(deadline)
+
+
+async def generate_scene_media_async(
+    scene_prompts, narrative_text, deadline, on_upgrade=None, previous_media=None
+):
+    """
+    Like generate_scene_media(), for coroutines: the pipeline runs as a task
+    and the caller waits for it without holding a thread.
+
+    on_upgrade is still a plain function; it is called in a worker thread.
+    """
+    job = AsyncSceneMediaJob(
+        scene_prompts, narrative_text, on_upgrade, continuity_video(previous_media)
+    ).start()
+
+    try:
+        if STREAMING_TTS and deadline is not None:
+            job.audio_url = await run_in_thread(cached_speech_url, narrative_text)
+        else:
+            job.audio_url = await generate_speech_async(narrative_text)
+    finally:
+        job.audio_ready.set()
+
+    return await job.result_async(deadline)
@@ -0,0 +1,210 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Usage:
+    CALLS = counter("provider_calls_total", "Provider calls", ("provider", "outcome"))
+    CALLS.inc(provider="gemini", outcome="success")
+
+    LATENCY = histogram("call_seconds", "Call latency", ("provider",))
+    LATENCY.observe(1.7, provider="gemini")
+
+Values that are cheaper to read than to track (e.g. queue depths) can be set
+by a collector registered with on_render(), which runs before every render.
+
+The app serves render() at /metrics. Metrics are kept per worker process;
+process_resident_memory_bytes is labeled with the worker's PID so scrapes of
+several workers can be told apart.
+"""
+
+import os
+import resource
+import threading
+
+_registry = []
+_registry_lock = threading.Lock()
+_collectors = []
+
+# Latency buckets in seconds, from a cache hit to a full Runway render
+DEFAULT_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    """A named family of samples, one per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def value(self, **labels):
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        """List of (sample name, label text, value) tuples."""
+        with self.lock:
+            items = sorted(self.values.items())
+        return [
+            (self.name, _format_labels(self.labelnames, key), value)
+            for key, value in items
+        ]
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            bucket_counts, total = self.values.get(key, (None, 0.0))
+            if bucket_counts is None:
+                bucket_counts = [0] * len(self.buckets)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    bucket_counts[index] += 1
+            self.values[key] = (bucket_counts, total + value)
+
+    def value(self, **labels):
+        """Number of observations with these labels."""
+        with self.lock:
+            bucket_counts, _ = self.values.get(self._key(labels), (None, 0.0))
+        return bucket_counts[-1] if bucket_counts else 0
+
+    def samples(self):
+        with self.lock:
+            items = sorted(
+                (key, list(bucket_counts), total)
+                for key, (bucket_counts, total) in self.values.items()
+            )
+        samples = []
+        for key, bucket_counts, total in items:
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                labels = _format_labels(
+                    self.labelnames + ("le",), key + (_format_bound(bound),)
+                )
+                samples.append((f"{self.name}_bucket", labels, bucket_count))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, bucket_counts[-1]))
+        return samples
+
+
+def _register(metric):
+    with _registry_lock:
+        for existing in _registry:
+            if existing.name == metric.name:
+                return existing
+        _registry.append(metric)
+    return metric
+
+
+def counter(name, documentation, labelnames=()):
+    """Register (or return the already registered) counter with this name."""
+    return _register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    """Register (or return the already registered) gauge with this name."""
+    return _register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Register (or return the already registered) histogram with this name."""
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+def on_render(collector):
+    """Call collector() before every render, e.g. to refresh gauges."""
+    with _registry_lock:
+        if collector not in _collectors:
+            _collectors.append(collector)
+    return collector
+
+
+def render():
+    """All registered metrics in the Prometheus text format."""
+    with _registry_lock:
+        collectors = list(_collectors)
+    for collector in collectors:
+        try:
+            collector()
+        except Exception as e:
+            print(f"Error collecting metrics: {e}")
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+def resident_memory_bytes():
+    """Resident memory of this process (the peak where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+PROCESS_MEMORY = gauge(
+    "process_resident_memory_bytes", "Resident memory of the worker process", ("pid",)
+)
+
+
+@on_render
+def _collect_process_memory():
+    with PROCESS_MEMORY.lock:
+        # A forked worker inherits its parent's sample
+        PROCESS_MEMORY.values.clear()
+    PROCESS_MEMORY.set(resident_memory_bytes(), pid=os.getpid())
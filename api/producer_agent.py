@@ -1,14 +1,6 @@
-import os
-import json
-import google.genai as genai
-from dotenv import load_dotenv
-from google.genai import types
-
-# Load environment variables
-load_dotenv()
-
-# Configure Gemini API
-client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+from api.ledger import record_fallback
+from api.llm import GEMINI_MODEL, parse_json, send_prompt, send_prompt_async
+from api.rate_limiter import QueueSaturated
 
 # Producer Agent (Scene Prompt Generator) system prompt
 PRODUCER_SYSTEM_PROMPT = """
@@ -44,6 +36,17 @@ IMPORTANT GUIDELINES:
 """
 
 
+def scene_prompts_prompt(narrative_text):
+    """Prompt asking for the scene prompts of a narrative."""
+    return f"""
+    Narrative: {narrative_text}
+    
+    Convert this narrative into two distinct scene prompts for image and video generation.
+    Each scene should have a first_frame_prompt and a video_prompt as specified.
+    Remember that the first scene should establish context, the second scene should relate to the decision, and both video prompts must describe ONE CLEAR ACTION.
+    """
+
+
 def generate_scene_prompts(narrative_text):
     """
     Convert a narrative text into scene prompts for image and video generation.
@@ -52,67 +55,87 @@ def generate_scene_prompts(narrative_text):
         narrative_text: The narrative text to convert
 
     Returns:
-        JSON object with scene prompts
+        Tuple of (scene prompts, whether they are the fallback prompts)
     """
-    # Create a new chat with system instruction
-    chat = client.chats.create(
-        model="gemini-2.0-flash",
-        config=types.GenerateContentConfig(system_instruction=PRODUCER_SYSTEM_PROMPT),
-    )
-
-    prompt = f"""
-    Narrative: {narrative_text}
-    
-    Convert this narrative into two distinct scene prompts for image and video generation.
-    Each scene should have a first_frame_prompt and a video_prompt as specified.
-    Remember that the first scene should establish context, the second scene should relate to the decision, and both video prompts must describe ONE CLEAR ACTION.
-    """
-
-    # Get response from Gemini
-    response = chat.send_message(prompt)
-
+    # Get response from Gemini, falling back right away if it is unavailable or
+    # invalid. This call is on the decision path too, so slow replies are hedged.
     try:
-        # Parse the response
-        # Gemini might wrap the JSON in markdown code blocks, so we need to extract it
-        content = response.text
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
-
-        scene_data = json.loads(content)
-
-        # Print generated prompts
-        print("\n=== GENERATED SCENE PROMPTS ===")
-        for scene in scene_data["scenes"]:
-            print(f"Scene {scene['scene_id']}:")
-            print(f"  Image: {scene['first_frame_prompt']}")
-            print(f"  Video: {scene['video_prompt']}")
-        print("==============================\n")
-
-        # Validate the response format
-        assert "scenes" in scene_data
-        assert len(scene_data["scenes"]) == 2
-        for scene in scene_data["scenes"]:
-            assert "scene_id" in scene
-            assert "first_frame_prompt" in scene
-            assert "video_prompt" in scene
-
-        return scene_data
-
-    except (json.JSONDecodeError, AssertionError) as e:
-        # Fallback to a default response if the AI response is not valid
-        return {
-            "scenes": [
-                {
-                    "scene_id": 1,
-                    "first_frame_prompt": f"Historical scene depicting {narrative_text}",
-                    "video_prompt": f"Short video clip showing {narrative_text}",
-                },
-                {
-                    "scene_id": 2,
-                    "first_frame_prompt": f"Close-up of key figures involved in {narrative_text}",
-                    "video_prompt": f"A dramatic moment showing a critical choice being made related to {narrative_text}",
-                },
-            ]
-        }
+        scene_data = send_prompt(
+            PRODUCER_SYSTEM_PROMPT,
+            scene_prompts_prompt(narrative_text),
+            parse_scene_prompts,
+            operation="scene_prompts",
+            hedge=True,
+        )
+    except QueueSaturated:
+        raise
+    except Exception as e:
+        print(f"Error generating scene prompts: {e}")
+        record_fallback("scene_prompts", "gemini", GEMINI_MODEL)
+        return fallback_scene_prompts(narrative_text), True
+
+    print_scene_prompts(scene_data)
+    return scene_data, False
+
+
+async def generate_scene_prompts_async(narrative_text):
+    """Like generate_scene_prompts(), awaiting Gemini instead of blocking a thread."""
+    try:
+        scene_data = await send_prompt_async(
+            PRODUCER_SYSTEM_PROMPT,
+            scene_prompts_prompt(narrative_text),
+            parse_scene_prompts,
+            operation="scene_prompts",
+            hedge=True,
+        )
+    except QueueSaturated:
+        raise
+    except Exception as e:
+        print(f"Error generating scene prompts: {e}")
+        record_fallback("scene_prompts", "gemini", GEMINI_MODEL)
+        return fallback_scene_prompts(narrative_text), True
+
+    print_scene_prompts(scene_data)
+    return scene_data, False
+
+
+def print_scene_prompts(scene_data):
+    print("\n=== GENERATED SCENE PROMPTS ===")
+    for scene in scene_data["scenes"]:
+        print(f"Scene {scene['scene_id']}:")
+        print(f"  Image: {scene['first_frame_prompt']}")
+        print(f"  Video: {scene['video_prompt']}")
+    print("==============================\n")
+
+
+def parse_scene_prompts(text):
+    """Parse and validate a scene prompts reply from Gemini."""
+    scene_data = parse_json(text)
+
+    # Validate the response format
+    assert "scenes" in scene_data
+    assert len(scene_data["scenes"]) == 2
+    for scene in scene_data["scenes"]:
+        assert "scene_id" in scene
+        assert "first_frame_prompt" in scene
+        assert "video_prompt" in scene
+
+    return scene_data
+
+
+def fallback_scene_prompts(narrative_text):
+    """Default scene prompts used when Gemini is unavailable or returns invalid JSON."""
+    return {
+        "scenes": [
+            {
+                "scene_id": 1,
+                "first_frame_prompt": f"Historical scene depicting {narrative_text}",
+                "video_prompt": f"Short video clip showing {narrative_text}",
+            },
+            {
+                "scene_id": 2,
+                "first_frame_prompt": f"Close-up of key figures involved in {narrative_text}",
+                "video_prompt": f"A dramatic moment showing a critical choice being made related to {narrative_text}",
+            },
+        ]
+    }
@@ -0,0 +1,83 @@
+"""
+Registry of the external providers.
+
+The agents reach the external services only through four interfaces (see
+api/providers/base.py):
+
+    text    - LLM replies (Gemini)
+    image   - first-frame images (Replicate Flux)
+    video   - image-to-video tasks (Runway)
+    speech  - narration (ElevenLabs)
+
+get_provider(kind) returns the implementation selected for a kind. Every kind
+has a vendor implementation (api/providers/vendors.py) and a deterministic
+local fake with latency and failure injection (api/providers/fakes.py), so the
+pipeline can be benchmarked and load-tested without network access:
+
+    PROVIDERS=fake FAKE_LATENCY_SCALE=0.1 python app.py
+
+Implementations are created on first use; a vendor SDK is not even imported
+until its provider is needed.
+
+Settings are read from the environment:
+
+    PROVIDERS          implementation of every kind, "vendor" or "fake" (vendor)
+    <KIND>_PROVIDER    implementation of one kind, e.g. VIDEO_PROVIDER=fake
+"""
+
+import os
+import threading
+from api.providers import fakes, vendors
+from api.providers.base import (
+    ProviderError,
+    ProviderRateLimited,
+    TASK_CANCELLED,
+    TASK_FAILED,
+    TASK_SUCCEEDED,
+)
+
+KINDS = ("text", "image", "video", "speech")
+
+_factories = {
+    "text": {"vendor": vendors.GeminiTextProvider, "fake": fakes.FakeTextProvider},
+    "image": {
+        "vendor": vendors.ReplicateImageProvider,
+        "fake": fakes.FakeImageProvider,
+    },
+    "video": {"vendor": vendors.RunwayVideoProvider, "fake": fakes.FakeVideoProvider},
+    "speech": {
+        "vendor": vendors.ElevenLabsSpeechProvider,
+        "fake": fakes.FakeSpeechProvider,
+    },
+}
+
+_providers = {}
+_lock = threading.Lock()
+
+
+def register_provider(kind, name, factory):
+    """Make an implementation selectable with <KIND>_PROVIDER=name."""
+    _factories[kind][name] = factory
+
+
+def provider_name(kind):
+    """Name of the implementation selected for a kind."""
+    default = os.environ.get("PROVIDERS", "vendor").lower()
+    return os.environ.get(f"{kind.upper()}_PROVIDER", default).lower()
+
+
+def get_provider(kind):
+    """The shared implementation of a kind of provider, created on first use."""
+    with _lock:
+        if kind not in _providers:
+            name = provider_name(kind)
+            if name not in _factories[kind]:
+                raise ValueError(f"Unknown {kind} provider '{name}'")
+            _providers[kind] = _factories[kind][name]()
+        return _providers[kind]
+
+
+def set_provider(kind, provider):
+    """Replace the implementation of a kind, e.g. with a configured fake."""
+    with _lock:
+        _providers[kind] = provider
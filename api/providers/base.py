@@ -0,0 +1,146 @@
+"""
+Interfaces of the external providers.
+
+Implementations raise ProviderError (or a subclass) for failed calls that have
+no more specific exception, so callers can handle vendors and fakes alike.
+
+Every call also has a coroutine version (generate_async, submit_async, ...)
+for the async pipeline. By default it runs the blocking call in a worker
+thread; implementations override it with their vendor's async client.
+"""
+
+import asyncio
+
+# Video task states, as reported by Runway
+TASK_SUCCEEDED = "SUCCEEDED"
+TASK_FAILED = "FAILED"
+TASK_CANCELLED = "CANCELLED"
+
+
+class ProviderError(Exception):
+    """A provider call failed."""
+
+
+class ProviderRateLimited(ProviderError):
+    """The provider rejected the call because of its rate limit (HTTP 429)."""
+
+
+class TextReply:
+    """Text of an LLM reply and the tokens billed for the call."""
+
+    __slots__ = ("text", "tokens")
+
+    def __init__(self, text, tokens=0):
+        self.text = text
+        self.tokens = tokens
+
+
+class TextProvider:
+    """LLM replies (Gemini)."""
+
+    def generate(self, system_prompt, prompt, model, operation="llm"):
+        """
+        Send a prompt in a new chat.
+
+        Args:
+            system_prompt: System instruction for the chat
+            prompt: The user prompt
+            model: Model to use
+            operation: What the reply is for (e.g. "narrative"); fakes use it
+                to pick the shape of their canned reply
+
+        Returns:
+            TextReply
+        """
+        raise NotImplementedError
+
+    async def generate_async(self, system_prompt, prompt, model, operation="llm"):
+        return await asyncio.to_thread(
+            self.generate, system_prompt, prompt, model, operation
+        )
+
+
+class ImageProvider:
+    """First-frame images (Replicate Flux)."""
+
+    def generate(self, model, prompt, params):
+        """Render an image and return its bytes (WebP)."""
+        raise NotImplementedError
+
+    async def generate_async(self, model, prompt, params):
+        return await asyncio.to_thread(self.generate, model, prompt, params)
+
+
+class VideoTask:
+    """State of an image-to-video task."""
+
+    __slots__ = ("id", "status", "output_url")
+
+    def __init__(self, id, status, output_url=None):
+        self.id = id
+        self.status = status
+        self.output_url = output_url
+
+    def __repr__(self):
+        return f"<VideoTask {self.id}: {self.status}>"
+
+
+class VideoProvider:
+    """Image-to-video tasks (Runway)."""
+
+    def submit(self, model, prompt_image, prompt_text, duration):
+        """
+        Start a task and return its ID.
+
+        Raises:
+            ProviderRateLimited: if the submission was rejected with HTTP 429
+        """
+        raise NotImplementedError
+
+    def retrieve(self, task_id):
+        """Return the VideoTask; output_url is set once it has succeeded."""
+        raise NotImplementedError
+
+    def cancel(self, task_id):
+        raise NotImplementedError
+
+    def download(self, url, path):
+        """Save the output of a succeeded task to a local file."""
+        raise NotImplementedError
+
+    async def submit_async(self, model, prompt_image, prompt_text, duration):
+        return await asyncio.to_thread(
+            self.submit, model, prompt_image, prompt_text, duration
+        )
+
+    async def retrieve_async(self, task_id):
+        return await asyncio.to_thread(self.retrieve, task_id)
+
+    async def cancel_async(self, task_id):
+        return await asyncio.to_thread(self.cancel, task_id)
+
+    async def download_async(self, url, path):
+        return await asyncio.to_thread(self.download, url, path)
+
+
+class SpeechProvider:
+    """Narration (ElevenLabs)."""
+
+    def available(self):
+        """Whether the provider can be called (e.g. its API key is set)."""
+        return True
+
+    def synthesize(self, voice_id, data, stream=False):
+        """
+        Request speech for a text-to-speech request body.
+
+        Returns:
+            A requests-style response (status_code, content, text,
+            iter_content(), close()); with stream=True the body is read as it
+            is synthesized
+        """
+        raise NotImplementedError
+
+    async def synthesize_async(self, voice_id, data):
+        """Request speech without streaming; the response's content is read."""
+        return await asyncio.to_thread(self.synthesize, voice_id, data)
@@ -0,0 +1,342 @@
+"""
+Deterministic local fakes of the providers, for running, benchmarking and
+load-testing the pipeline without network access.
+
+Replies depend only on the request: the same prompt always gets the same
+canned narrative, scene prompts or quiz question, shaped like the real replies
+so the agents' parsers accept them. Images are the placeholder image; videos
+and narration are small files rendered once with FFmpeg (test pattern, tone)
+into FAKE_MEDIA_DIR.
+
+Every fake waits for a latency drawn from a log-normal distribution around a
+median, and fails at a configurable rate; the *_async calls wait with
+asyncio.sleep, so async load tests hold no thread per call. Settings are read from the
+environment, per provider (GEMINI, REPLICATE, RUNWAY, ELEVENLABS):
+
+    FAKE_<PROVIDER>_LATENCY_SECONDS   median latency (see FAKE_LATENCY_DEFAULTS);
+                                      for Runway, of the whole task
+    FAKE_<PROVIDER>_LATENCY_SIGMA     spread of the latency, 0 for a fixed one (0.5)
+    FAKE_<PROVIDER>_FAILURE_RATE      share of calls that fail (0)
+    FAKE_LATENCY_SCALE                multiplier of all latencies, 0 for none (1)
+    FAKE_PROVIDER_SEED                seed of the latency and failure draws (0)
+    FAKE_MEDIA_DIR                    where rendered media is kept
+                                      (instance/fake_media)
+"""
+
+import os
+import json
+import math
+import time
+import asyncio
+import uuid
+import random
+import shutil
+import hashlib
+import threading
+from api.providers.base import (
+    TASK_FAILED,
+    TASK_SUCCEEDED,
+    ImageProvider,
+    ProviderError,
+    SpeechProvider,
+    TextProvider,
+    TextReply,
+    VideoProvider,
+    VideoTask,
+)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Median latency in seconds of each fake provider, roughly that of the real one
+FAKE_LATENCY_DEFAULTS = {
+    "gemini": 1.5,
+    "replicate": 2.0,
+    "runway": 20.0,
+    "elevenlabs": 1.0,
+}
+
+FAKE_LATENCY_SCALE = float(os.environ.get("FAKE_LATENCY_SCALE", "1"))
+FAKE_PROVIDER_SEED = os.environ.get("FAKE_PROVIDER_SEED", "0")
+FAKE_MEDIA_DIR = os.environ.get(
+    "FAKE_MEDIA_DIR", os.path.join(ROOT_DIR, "instance", "fake_media")
+)
+
+FAKE_IMAGE = os.path.join(ROOT_DIR, "static", "images", "placeholder.webp")
+
+# Fake narration runs at this pace, like a narrator reading the text
+FAKE_WORDS_PER_SECOND = 2.5
+
+_media_lock = threading.Lock()
+
+
+class FakeBehavior:
+    """Latency and failure injection for one fake provider."""
+
+    def __init__(self, provider):
+        prefix = f"FAKE_{provider.upper()}"
+        self.provider = provider
+        self.median = FAKE_LATENCY_SCALE * float(
+            os.environ.get(
+                f"{prefix}_LATENCY_SECONDS", FAKE_LATENCY_DEFAULTS.get(provider, 1.0)
+            )
+        )
+        self.sigma = float(os.environ.get(f"{prefix}_LATENCY_SIGMA", "0.5"))
+        self.failure_rate = float(os.environ.get(f"{prefix}_FAILURE_RATE", "0"))
+        self.random = random.Random(f"{FAKE_PROVIDER_SEED}:{provider}")
+        self.lock = threading.Lock()
+
+    def draw(self):
+        """Return (latency in seconds, whether the call fails) for the next call."""
+        with self.lock:
+            latency = self.median
+            if latency and self.sigma:
+                latency *= math.exp(self.random.gauss(0, self.sigma))
+            return latency, self.random.random() < self.failure_rate
+
+    def call(self):
+        """Wait like a call to the provider would, and fail like it sometimes does."""
+        latency, failed = self.draw()
+        time.sleep(latency)
+        if failed:
+            raise ProviderError(f"Injected {self.provider} failure")
+
+    async def call_async(self):
+        latency, failed = self.draw()
+        await asyncio.sleep(latency)
+        if failed:
+            raise ProviderError(f"Injected {self.provider} failure")
+
+
+def digest(*parts):
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def fake_media(filename, ffmpeg_args):
+    """Path of a fake media file, rendered with FFmpeg on first use."""
+    from api.ffmpeg_pool import run_ffmpeg
+
+    path = os.path.join(FAKE_MEDIA_DIR, filename)
+    with _media_lock:
+        if not os.path.exists(path):
+            os.makedirs(FAKE_MEDIA_DIR, exist_ok=True)
+            temp_path = f"{path}.part{os.path.splitext(path)[1]}"
+            result = run_ffmpeg(["ffmpeg", "-y", *ffmpeg_args, temp_path], job="fake_media")
+            if not result.ok:
+                raise ProviderError(f"Could not render fake media: {result.stderr}")
+            os.replace(temp_path, path)
+    return path
+
+
+def fake_video(seconds):
+    from api.media_generator import VIDEO_HEIGHT, VIDEO_WIDTH
+
+    return fake_media(
+        f"clip_{seconds}s.mp4",
+        [
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=size={VIDEO_WIDTH}x{VIDEO_HEIGHT}:rate=24",
+            "-t",
+            str(seconds),
+            "-c:v",
+            "libx264",
+            "-pix_fmt",
+            "yuv420p",
+        ],
+    )
+
+
+def fake_speech(seconds):
+    return fake_media(
+        f"narration_{seconds}s.mp3",
+        [
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency=440:duration={seconds}",
+            "-c:a",
+            "libmp3lame",
+            "-b:a",
+            "64k",
+        ],
+    )
+
+
+def fake_narrative(key, scene_id):
+    return {
+        "scene_id": scene_id,
+        "narrative": (
+            f"Scene {key[:8]}: messengers arrive with urgent news and the room "
+            "falls silent. Every advisor turns to you for a decision."
+        ),
+        "options": [
+            {"id": "1", "option": f"Act at once ({key[8:12]})"},
+            {"id": "2", "option": f"Gather more intelligence ({key[12:16]})"},
+            {"id": "3", "option": f"Open a back channel ({key[16:20]})"},
+        ],
+    }
+
+
+def fake_scene_id(prompt, key):
+    if "initial scenario" in prompt:
+        return 1
+    return int(key[:4], 16) % 1000 + 2
+
+
+def canned_reply(operation, key, prompt):
+    """Reply of the fake LLM for an operation, shaped like Gemini's."""
+    if operation == "narrative":
+        return fake_narrative(key, fake_scene_id(prompt, key))
+    if operation == "narrative_batch":
+        continuations = []
+        for option_id in ("1", "2", "3"):
+            child_key = digest(key, option_id)
+            continuations.append(
+                dict(
+                    fake_narrative(child_key, fake_scene_id(prompt, child_key)),
+                    option_id=option_id,
+                )
+            )
+        return {"continuations": continuations}
+    if operation == "scene_prompts":
+        return {
+            "scenes": [
+                {
+                    "scene_id": scene_id,
+                    "first_frame_prompt": f"A candlelit war room, shot {key[:8]}-{scene_id}",
+                    "video_prompt": f"An officer slams a map onto the table, shot {key[:8]}-{scene_id}",
+                }
+                for scene_id in (1, 2)
+            ]
+        }
+    if operation == "quiz":
+        return {
+            "question": f"Which event does question {key[:6]} ask about?",
+            "options": [
+                {"id": "a", "text": "The first option"},
+                {"id": "b", "text": "The second option"},
+                {"id": "c", "text": "The third option"},
+            ],
+            "correct_option_id": "abc"[int(key[0], 16) % 3],
+            "explanation": "Canned explanation from the fake text provider.",
+        }
+    return {}
+
+
+class FakeTextProvider(TextProvider):
+    def __init__(self):
+        self.behavior = FakeBehavior("gemini")
+
+    def generate(self, system_prompt, prompt, model, operation="llm"):
+        self.behavior.call()
+        return self.reply(system_prompt, prompt, operation)
+
+    async def generate_async(self, system_prompt, prompt, model, operation="llm"):
+        await self.behavior.call_async()
+        return self.reply(system_prompt, prompt, operation)
+
+    def reply(self, system_prompt, prompt, operation):
+        text = json.dumps(canned_reply(operation, digest(system_prompt, prompt), prompt))
+        # About four characters per token, like Gemini's tokenizer on English
+        tokens = (len(system_prompt) + len(prompt) + len(text)) // 4
+        return TextReply(text, tokens)
+
+
+class FakeImageProvider(ImageProvider):
+    def __init__(self):
+        self.behavior = FakeBehavior("replicate")
+
+    def generate(self, model, prompt, params):
+        self.behavior.call()
+        with open(FAKE_IMAGE, "rb") as f:
+            return f.read()
+
+    async def generate_async(self, model, prompt, params):
+        await self.behavior.call_async()
+        with open(FAKE_IMAGE, "rb") as f:
+            return f.read()
+
+
+class FakeVideoProvider(VideoProvider):
+    """Tasks finish after the drawn latency; failed draws end as FAILED tasks."""
+
+    def __init__(self):
+        self.behavior = FakeBehavior("runway")
+        # Task ID -> (finishes at, fails, clip seconds)
+        self.tasks = {}
+        self.lock = threading.Lock()
+
+    def submit(self, model, prompt_image, prompt_text, duration):
+        latency, failed = self.behavior.draw()
+        task_id = uuid.uuid4().hex
+        with self.lock:
+            self.tasks[task_id] = (time.monotonic() + latency, failed, int(duration))
+        return task_id
+
+    def retrieve(self, task_id):
+        with self.lock:
+            finishes_at, failed, seconds = self.tasks[task_id]
+        if time.monotonic() < finishes_at:
+            return VideoTask(task_id, "RUNNING")
+        with self.lock:
+            self.tasks.pop(task_id, None)
+        if failed:
+            return VideoTask(task_id, TASK_FAILED)
+        return VideoTask(task_id, TASK_SUCCEEDED, f"fake://video/{seconds}")
+
+    def cancel(self, task_id):
+        with self.lock:
+            self.tasks.pop(task_id, None)
+
+    def download(self, url, path):
+        shutil.copyfile(fake_video(int(url.rsplit("/", 1)[-1])), path)
+
+    async def submit_async(self, model, prompt_image, prompt_text, duration):
+        return self.submit(model, prompt_image, prompt_text, duration)
+
+    async def retrieve_async(self, task_id):
+        return self.retrieve(task_id)
+
+    async def cancel_async(self, task_id):
+        self.cancel(task_id)
+
+
+class FakeSpeechResponse:
+    """The parts of a requests response the TTS agent uses."""
+
+    status_code = 200
+    text = ""
+
+    def __init__(self, content):
+        self.content = content
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start : start + chunk_size]
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeSpeechProvider(SpeechProvider):
+    def __init__(self):
+        self.behavior = FakeBehavior("elevenlabs")
+
+    def synthesize(self, voice_id, data, stream=False):
+        self.behavior.call()
+        return self.speech(data)
+
+    async def synthesize_async(self, voice_id, data):
+        await self.behavior.call_async()
+        # Rendering the narration runs FFmpeg the first time
+        return await asyncio.to_thread(self.speech, data)
+
+    def speech(self, data):
+        words = len(data["text"].split())
+        seconds = max(1, min(120, round(words / FAKE_WORDS_PER_SECOND)))
+        with open(fake_speech(seconds), "rb") as f:
+            return FakeSpeechResponse(f.read())
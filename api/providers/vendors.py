@@ -0,0 +1,223 @@
+"""
+Implementations of the provider interfaces backed by the vendor APIs.
+
+Each SDK is imported, and its client built, when the provider is first used;
+the async clients used by the *_async calls are built on their first call.
+"""
+
+import os
+import requests
+from dotenv import load_dotenv
+from api.providers.base import (
+    ImageProvider,
+    ProviderRateLimited,
+    SpeechProvider,
+    TextProvider,
+    TextReply,
+    VideoProvider,
+    VideoTask,
+)
+
+# Load environment variables
+load_dotenv()
+
+# Seconds to wait for a Gemini response before giving up
+GEMINI_TIMEOUT_SECONDS = float(os.environ.get("GEMINI_TIMEOUT_SECONDS", "30"))
+
+# Seconds to wait on a single HTTP request to Runway or Replicate
+PROVIDER_HTTP_TIMEOUT_SECONDS = float(
+    os.environ.get("PROVIDER_HTTP_TIMEOUT_SECONDS", "60")
+)
+
+ELEVEN_LABS_API_KEY = os.environ.get("ELEVEN_LABS_API_KEY")
+
+# Seconds to wait for ElevenLabs before giving up on narration
+ELEVEN_LABS_TIMEOUT_SECONDS = float(os.environ.get("ELEVEN_LABS_TIMEOUT_SECONDS", "30"))
+
+ELEVEN_LABS_TTS_URL = "https://api.elevenlabs.io/v1/text-to-speech"
+
+
+def response_tokens(response):
+    """Tokens billed for a Gemini response (prompt and reply), 0 if not reported."""
+    usage = getattr(response, "usage_metadata", None)
+    return (getattr(usage, "total_token_count", None) or 0) if usage else 0
+
+
+class GeminiTextProvider(TextProvider):
+    def __init__(self):
+        import google.genai as genai
+        from google.genai import types
+
+        self.types = types
+        self.client = genai.Client(
+            api_key=os.environ.get("GEMINI_API_KEY"),
+            http_options=types.HttpOptions(timeout=int(GEMINI_TIMEOUT_SECONDS * 1000)),
+        )
+
+    def generate(self, system_prompt, prompt, model, operation="llm"):
+        # Create a new chat with system instruction
+        chat = self.client.chats.create(
+            model=model,
+            config=self.types.GenerateContentConfig(system_instruction=system_prompt),
+        )
+        response = chat.send_message(prompt)
+        return TextReply(response.text, response_tokens(response))
+
+    async def generate_async(self, system_prompt, prompt, model, operation="llm"):
+        chat = self.client.aio.chats.create(
+            model=model,
+            config=self.types.GenerateContentConfig(system_instruction=system_prompt),
+        )
+        response = await chat.send_message(prompt)
+        return TextReply(response.text, response_tokens(response))
+
+
+class ReplicateImageProvider(ImageProvider):
+    def __init__(self):
+        import httpx
+        import replicate
+
+        self.client = replicate.Client(
+            timeout=httpx.Timeout(PROVIDER_HTTP_TIMEOUT_SECONDS)
+        )
+
+    def generate(self, model, prompt, params):
+        output = self.client.run(model, input=dict(params, prompt=prompt))
+        # flux-schnell returns a list of images, flux-1.1-pro a single one
+        if isinstance(output, list):
+            output = output[0]
+        return output.read()
+
+    async def generate_async(self, model, prompt, params):
+        output = await self.client.async_run(model, input=dict(params, prompt=prompt))
+        if isinstance(output, list):
+            output = output[0]
+        return await output.aread()
+
+
+class RunwayVideoProvider(VideoProvider):
+    def __init__(self):
+        from runwayml import RunwayML, RateLimitError
+
+        self.rate_limit_error = RateLimitError
+        self.client = RunwayML(timeout=PROVIDER_HTTP_TIMEOUT_SECONDS)
+        self.async_client = None
+        self.http = None
+
+    def _async_clients(self):
+        if self.async_client is None:
+            import httpx
+            from runwayml import AsyncRunwayML
+
+            self.async_client = AsyncRunwayML(timeout=PROVIDER_HTTP_TIMEOUT_SECONDS)
+            self.http = httpx.AsyncClient(timeout=PROVIDER_HTTP_TIMEOUT_SECONDS)
+        return self.async_client, self.http
+
+    def submit(self, model, prompt_image, prompt_text, duration):
+        try:
+            task = self.client.image_to_video.create(
+                model=model,
+                prompt_image=prompt_image,
+                prompt_text=prompt_text,
+                duration=duration,
+            )
+        except self.rate_limit_error as e:
+            raise ProviderRateLimited(str(e)) from e
+        return task.id
+
+    def retrieve(self, task_id):
+        output = self.client.tasks.retrieve(id=task_id)
+        # Format handling for the output URL
+        output_url = output.output
+        if isinstance(output_url, list):
+            output_url = output_url[0] if output_url else None
+        return VideoTask(task_id, output.status, output_url)
+
+    def cancel(self, task_id):
+        self.client.tasks.delete(id=task_id)
+
+    def download(self, url, path):
+        response = requests.get(url, stream=True, timeout=PROVIDER_HTTP_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=8192):
+                f.write(chunk)
+
+    async def submit_async(self, model, prompt_image, prompt_text, duration):
+        client, _ = self._async_clients()
+        try:
+            task = await client.image_to_video.create(
+                model=model,
+                prompt_image=prompt_image,
+                prompt_text=prompt_text,
+                duration=duration,
+            )
+        except self.rate_limit_error as e:
+            raise ProviderRateLimited(str(e)) from e
+        return task.id
+
+    async def retrieve_async(self, task_id):
+        client, _ = self._async_clients()
+        output = await client.tasks.retrieve(id=task_id)
+        output_url = output.output
+        if isinstance(output_url, list):
+            output_url = output_url[0] if output_url else None
+        return VideoTask(task_id, output.status, output_url)
+
+    async def cancel_async(self, task_id):
+        client, _ = self._async_clients()
+        await client.tasks.delete(id=task_id)
+
+    async def download_async(self, url, path):
+        _, http = self._async_clients()
+        async with http.stream("GET", url) as response:
+            response.raise_for_status()
+            with open(path, "wb") as f:
+                async for chunk in response.aiter_bytes(chunk_size=8192):
+                    f.write(chunk)
+
+
+class ElevenLabsSpeechProvider(SpeechProvider):
+    def __init__(self):
+        self.http = None
+
+    def available(self):
+        return bool(ELEVEN_LABS_API_KEY)
+
+    def synthesize(self, voice_id, data, stream=False):
+        url = f"{ELEVEN_LABS_TTS_URL}/{voice_id}"
+        if stream:
+            url += "/stream"
+        response = requests.post(
+            url,
+            json=data,
+            headers={
+                "Accept": "audio/mpeg",
+                "Content-Type": "application/json",
+                "xi-api-key": ELEVEN_LABS_API_KEY,
+            },
+            stream=stream,
+            timeout=ELEVEN_LABS_TIMEOUT_SECONDS,
+        )
+        # Raise on server errors so they count as failures
+        if response.status_code >= 500 or response.status_code == 429:
+            response.raise_for_status()
+        return response
+
+    async def synthesize_async(self, voice_id, data):
+        if self.http is None:
+            import httpx
+
+            self.http = httpx.AsyncClient(timeout=ELEVEN_LABS_TIMEOUT_SECONDS)
+        response = await self.http.post(
+            f"{ELEVEN_LABS_TTS_URL}/{voice_id}",
+            json=data,
+            headers={
+                "Accept": "audio/mpeg",
+                "Content-Type": "application/json",
+                "xi-api-key": ELEVEN_LABS_API_KEY,
+            },
+        )
+        if response.status_code >= 500 or response.status_code == 429:
+            response.raise_for_status()
+        return response
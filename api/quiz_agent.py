@@ -1,16 +1,8 @@
-import os
 import json
 import random
-import google.genai as genai
-from dotenv import load_dotenv
-from google.genai import types
 import re
-
-# Load environment variables
-load_dotenv()
-
-# Configure Gemini API
-client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+from api.llm import extract_json, send_prompt, send_prompt_async
+from api.rate_limiter import QueueSaturated
 
 # Quiz Agent system prompt
 QUIZ_SYSTEM_PROMPT = """
@@ -49,90 +41,109 @@ def clean_json_string(json_str):
     
     return json_str
 
-def generate_quiz_question(scenario=None, narrative=None):
-    """
-    Generate a historical quiz question related to the given scenario or narrative.
-
-    Args:
-        scenario: The historical scenario (e.g., "Cuban Missile Crisis")
-        narrative: The current narrative text (optional)
-
-    Returns:
-        JSON object with the quiz question
-    """
-
-    # Create a new chat with system instruction
-    chat = client.chats.create(
-        model="gemini-2.0-flash",
-        config=types.GenerateContentConfig(system_instruction=QUIZ_SYSTEM_PROMPT),
-    )
-
+def quiz_prompt(scenario=None, narrative=None):
+    """Prompt asking for a question on the narrative, the scenario or any history."""
     # Build prompt based on available context
     if narrative:
-        prompt = f"""
+        return f"""
         Generate a multiple-choice quiz question related to the following historical narrative:
         {narrative}
         
         Focus on testing knowledge about important elements from this historical context.
         """
     elif scenario:
-        prompt = f"""
+        return f"""
         Generate a multiple-choice quiz question about the '{scenario}' historical event.
         Focus on testing knowledge about key facts, figures, or consequences of this event.
         """
-    else:
-        prompt = """
+    return """
         Generate a general historical multiple-choice quiz question about a significant 
         historical event, person, or development.
         """
 
-    # Get response from Gemini
-    response = chat.send_message(prompt)
 
-    try:
-        # Parse the response
-        content = response.text
+def generate_quiz_question(scenario=None, narrative=None):
+    """
+    Generate a historical quiz question related to the given scenario or narrative.
 
-        # Extract JSON from the response (may be wrapped in markdown code blocks)
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
+    Args:
+        scenario: The historical scenario (e.g., "Cuban Missile Crisis")
+        narrative: The current narrative text (optional)
 
-        # Clean the JSON string before parsing
-        cleaned_content = clean_json_string(content)
-        
-        # Parse the JSON
-        question_data = json.loads(cleaned_content)
+    Returns:
+        JSON object with the quiz question
+    """
+    # Get response from Gemini, falling back right away if it is unavailable or
+    # invalid. Students wait on this call, so slow replies are hedged.
+    try:
+        question_data = send_prompt(
+            QUIZ_SYSTEM_PROMPT,
+            quiz_prompt(scenario, narrative),
+            parse_quiz_question,
+            operation="quiz",
+            hedge=True,
+        )
+    except QueueSaturated:
+        raise
+    except Exception as e:
+        print(f"Error generating quiz question: {e}")
+        return fallback_quiz_question(scenario)
 
-        # Validate the response format
-        assert "question" in question_data
-        assert "options" in question_data
-        assert "correct_option_id" in question_data
-        assert "explanation" in question_data
-        assert len(question_data["options"]) == 3
+    # Add an ID to the question
+    question_data["id"] = f"q{random.randint(1000, 9999)}"
 
-        # Add an ID to the question
-        question_data["id"] = f"q{random.randint(1000, 9999)}"
+    return question_data
 
-        return question_data
 
-    except (json.JSONDecodeError, AssertionError) as e:
+async def generate_quiz_question_async(scenario=None, narrative=None):
+    """Like generate_quiz_question(), awaiting Gemini instead of blocking a thread."""
+    try:
+        question_data = await send_prompt_async(
+            QUIZ_SYSTEM_PROMPT,
+            quiz_prompt(scenario, narrative),
+            parse_quiz_question,
+            operation="quiz",
+            hedge=True,
+        )
+    except QueueSaturated:
+        raise
+    except Exception as e:
         print(f"Error generating quiz question: {e}")
-        print(f"Raw response: {response.text}")
-
-        # Fallback to a default question if the AI response is not valid
-        return {
-            "id": f"q{random.randint(1000, 9999)}",
-            "question": f"Which historical event is related to {scenario or 'world history'}?",
-            "options": [
-                {"id": "a", "text": "The signing of the Magna Carta"},
-                {"id": "b", "text": "The Cuban Missile Crisis"},
-                {"id": "c", "text": "The Fall of the Berlin Wall"},
-            ],
-            "correct_option_id": "b",
-            "explanation": "The Cuban Missile Crisis was a 13-day confrontation between the United States and Soviet Union in October 1962.",
-        }
+        return fallback_quiz_question(scenario)
+
+    question_data["id"] = f"q{random.randint(1000, 9999)}"
+
+    return question_data
+
+
+def parse_quiz_question(text):
+    """Parse and validate a quiz question reply from Gemini."""
+    # Clean the JSON string before parsing
+    question_data = json.loads(clean_json_string(extract_json(text)))
+
+    # Validate the response format
+    assert "question" in question_data
+    assert "options" in question_data
+    assert "correct_option_id" in question_data
+    assert "explanation" in question_data
+    assert len(question_data["options"]) == 3
+
+    return question_data
+
+
+def fallback_quiz_question(scenario=None):
+    """Default question used when Gemini is unavailable or returns invalid JSON."""
+    return {
+        "id": f"q{random.randint(1000, 9999)}",
+        "question": f"Which historical event is related to {scenario or 'world history'}?",
+        "options": [
+            {"id": "a", "text": "The signing of the Magna Carta"},
+            {"id": "b", "text": "The Cuban Missile Crisis"},
+            {"id": "c", "text": "The Fall of the Berlin Wall"},
+        ],
+        "correct_option_id": "b",
+        "explanation": "The Cuban Missile Crisis was a 13-day confrontation between the United States and Soviet Union in October 1962.",
+    }
 
 
 # Fallback questions in case API calls fail
@@ -0,0 +1,306 @@
+"""
+Provider-aware rate limiting and admission control.
+
+Every external provider (Gemini, Replicate, Runway, ElevenLabs) gets a limiter
+with:
+
+- a token bucket that caps the request rate at the provider's ceiling,
+- a cap on concurrent calls to the provider,
+- a priority queue of waiting callers, so interactive requests from students
+  are served before background work such as assignment warm-up.
+
+When a provider's queue is full, interactive callers are rejected right away
+with QueueSaturated (surfaced by the app as 429 + Retry-After) instead of
+piling up behind work that cannot finish in time. Background callers always
+queue.
+
+Threads and coroutines share the queue: provider_slot() blocks its thread,
+provider_slot_async() waits without holding one.
+
+Limits are configured per provider with environment variables, e.g.
+RUNWAY_RATE_PER_MIN, RUNWAY_MAX_CONCURRENCY, RUNWAY_MAX_QUEUE.
+
+The app uses one API key per provider, so every call shares the "default"
+concurrency key. Callers holding several keys can pass `key` to cap each
+separately.
+"""
+
+import os
+import time
+import asyncio
+import threading
+import itertools
+from contextvars import ContextVar
+from contextlib import asynccontextmanager, contextmanager
+from api import metrics
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# Default limits per provider: (requests per minute, concurrent calls, queue length)
+PROVIDER_DEFAULTS = {
+    "gemini": (120, 8, 64),
+    "replicate": (60, 4, 32),
+    "runway": (30, 2, 16),
+    "elevenlabs": (60, 3, 32),
+}
+
+# Every provider the scene pipeline depends on
+PIPELINE_PROVIDERS = ("gemini", "replicate", "runway", "elevenlabs")
+
+_priority = ContextVar("priority", default=PRIORITY_INTERACTIVE)
+
+
+class QueueSaturated(Exception):
+    """Raised when a provider's queue is full and the caller should retry later."""
+
+    def __init__(self, provider, retry_after):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(
+            f"{provider} queue is saturated, retry after {retry_after} seconds"
+        )
+
+
+def current_priority():
+    """Priority of the work running in this context (interactive by default)."""
+    return _priority.get()
+
+
+@contextmanager
+def request_priority(priority):
+    """Run the enclosed provider calls of this context at the given priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class ProviderLimiter:
+    """Token bucket, concurrency cap (per key) and priority queue for one provider."""
+
+    def __init__(self, name, rate_per_minute, max_concurrency, max_queue):
+        self.name = name
+        self.rate_per_second = rate_per_minute / 60.0
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        # Allow a burst of up to one call per concurrency slot
+        self.burst = max(1, max_concurrency)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.in_flight = {}
+        self.waiters = []
+        # Waiter -> (event loop, asyncio.Event) of the coroutines among them
+        self.async_waiters = {}
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate_per_second)
+        self.updated_at = now
+
+    def _notify(self):
+        """Wake up every waiting thread and coroutine; call with the condition held."""
+        self.condition.notify_all()
+        for loop, wakeup in self.async_waiters.values():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def _wait_seconds(self):
+        """Seconds until the next token is due, None if one is available."""
+        if self.tokens < 1 and self.rate_per_second:
+            return (1 - self.tokens) / self.rate_per_second
+        return None
+
+    def _take(self, waiter, key):
+        self.waiters.remove(waiter)
+        self.tokens -= 1
+        self.in_flight[key] = self.in_flight.get(key, 0) + 1
+        self._notify()
+
+    def _next_waiter(self):
+        """The highest-priority waiter whose key still has a free slot."""
+        eligible = [
+            waiter
+            for waiter in self.waiters
+            if self.in_flight.get(waiter[2], 0) < self.max_concurrency
+        ]
+        return min(eligible) if eligible else None
+
+    def queue_depth(self):
+        with self.condition:
+            return len(self.waiters)
+
+    def retry_after(self):
+        """Seconds until a newly queued call would likely be served."""
+        if not self.rate_per_second:
+            return 60
+        backlog = len(self.waiters) + 1
+        return max(1, int(backlog / self.rate_per_second))
+
+    def admit(self, priority=None):
+        """Raise QueueSaturated if an interactive caller should not queue right now."""
+        priority = current_priority() if priority is None else priority
+        with self.condition:
+            if priority <= PRIORITY_INTERACTIVE and len(self.waiters) >= self.max_queue:
+                raise QueueSaturated(self.name, self.retry_after())
+
+    def acquire(self, key="default", priority=None):
+        """Block until the caller may make one call under the given concurrency key."""
+        priority = current_priority() if priority is None else priority
+        with self.condition:
+            if priority <= PRIORITY_INTERACTIVE and len(self.waiters) >= self.max_queue:
+                raise QueueSaturated(self.name, self.retry_after())
+
+            waiter = (priority, next(self.sequence), key)
+            self.waiters.append(waiter)
+            try:
+                while True:
+                    self._refill()
+                    if self._next_waiter() == waiter and self.tokens >= 1:
+                        break
+                    # Wake up when the next token is due, or when a slot is released
+                    self.condition.wait(timeout=self._wait_seconds())
+            except BaseException:
+                self.waiters.remove(waiter)
+                raise
+            self._take(waiter, key)
+
+    async def acquire_async(self, key="default", priority=None):
+        """Like acquire(), but waits in the event loop instead of blocking a thread."""
+        priority = current_priority() if priority is None else priority
+        wakeup = asyncio.Event()
+        with self.condition:
+            if priority <= PRIORITY_INTERACTIVE and len(self.waiters) >= self.max_queue:
+                raise QueueSaturated(self.name, self.retry_after())
+
+            waiter = (priority, next(self.sequence), key)
+            self.waiters.append(waiter)
+            self.async_waiters[waiter] = (asyncio.get_running_loop(), wakeup)
+        try:
+            while True:
+                with self.condition:
+                    self._refill()
+                    if self._next_waiter() == waiter and self.tokens >= 1:
+                        del self.async_waiters[waiter]
+                        self._take(waiter, key)
+                        return
+                    wait = self._wait_seconds()
+                    wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            # Cancelled (e.g. the client went away): leave the queue to the others
+            with self.condition:
+                del self.async_waiters[waiter]
+                self.waiters.remove(waiter)
+                self._notify()
+            raise
+
+    def release(self, key="default"):
+        with self.condition:
+            self.in_flight[key] = max(0, self.in_flight.get(key, 0) - 1)
+            self._notify()
+
+    @contextmanager
+    def slot(self, key="default", priority=None):
+        self.acquire(key, priority)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    @asynccontextmanager
+    async def slot_async(self, key="default", priority=None):
+        await self.acquire_async(key, priority)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider):
+    """Return the shared limiter for a provider, creating it from the environment."""
+    with _limiters_lock:
+        if provider not in _limiters:
+            rate, concurrency, queue = PROVIDER_DEFAULTS.get(provider, (60, 4, 32))
+            prefix = provider.upper()
+            _limiters[provider] = ProviderLimiter(
+                provider,
+                rate_per_minute=float(os.environ.get(f"{prefix}_RATE_PER_MIN", rate)),
+                max_concurrency=int(
+                    os.environ.get(f"{prefix}_MAX_CONCURRENCY", concurrency)
+                ),
+                max_queue=int(os.environ.get(f"{prefix}_MAX_QUEUE", queue)),
+            )
+        return _limiters[provider]
+
+
+@contextmanager
+def provider_slot(provider, key="default"):
+    """
+    Hold one rate-limited call slot for a provider.
+
+    Usage:
+        with provider_slot("gemini"):
+            response = chat.send_message(prompt)
+    """
+    with get_limiter(provider).slot(key):
+        yield
+
+
+@asynccontextmanager
+async def provider_slot_async(provider, key="default"):
+    """
+    Hold one rate-limited call slot for a provider from a coroutine.
+
+    Usage:
+        async with provider_slot_async("gemini"):
+            response = await chat.send_message(prompt)
+    """
+    async with get_limiter(provider).slot_async(key):
+        yield
+
+
+def check_admission(providers=PIPELINE_PROVIDERS):
+    """
+    Reject interactive work early when any of the given providers is saturated.
+
+    Raises:
+        QueueSaturated: with the longest retry delay among saturated providers
+    """
+    saturated = []
+    for provider in providers:
+        try:
+            get_limiter(provider).admit()
+        except QueueSaturated as e:
+            saturated.append(e)
+    if saturated:
+        raise max(saturated, key=lambda e: e.retry_after)
+
+
+def queue_depths():
+    """Current number of waiting calls per provider."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.queue_depth() for limiter in limiters}
+
+
+QUEUE_DEPTH = metrics.gauge(
+    "provider_queue_depth", "Calls waiting for a provider slot", ("provider",)
+)
+
+
+@metrics.on_render
+def _update_queue_depths():
+    for provider, depth in queue_depths().items():
+        QUEUE_DEPTH.set(depth, provider=provider)
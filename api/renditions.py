@@ -0,0 +1,239 @@
+"""
+Adaptive bitrate renditions for scene videos.
+
+Runway clips are served at their original bitrate, which saturates a school's
+uplink when a whole class loads a scene at once. Every combined scene video is
+transcoded in the background, on the FFmpeg pool's background lane, into a
+small ladder of HLS renditions with a master playlist. The player starts on
+the lowest rendition and steps up as bandwidth allows; until the renditions
+are ready it plays the original MP4.
+
+Transcodes are queued where scene videos are made (the media pipeline).
+Videos cached before renditions existed, or migrated from the old database,
+are backfilled with scripts/transcode_renditions.py.
+
+Renditions are registered in the videos table, linked to their source video.
+The master playlist URL is stored on the source video.
+
+Settings are read from the environment:
+
+    RENDITIONS                  whether renditions are transcoded (true)
+    RENDITION_TIMEOUT_SECONDS   timeout of one transcoding job (600)
+"""
+
+import os
+import shutil
+import threading
+from flask import current_app
+from api.ffmpeg_pool import LANE_BACKGROUND, FFmpegError, submit_ffmpeg
+from database.models import db, SceneCache, Video
+from database.video_cache import VideoCache
+
+RENDITIONS = os.environ.get("RENDITIONS", "true").lower() == "true"
+RENDITION_TIMEOUT_SECONDS = float(os.environ.get("RENDITION_TIMEOUT_SECONDS", "600"))
+
+# (name, height, video bitrate in kbps), lowest first: players that pick the
+# first variant of the master playlist start on the cheapest one
+RENDITION_LADDER = [
+    ("360p", 360, 800),
+    ("540p", 540, 1400),
+    ("720p", 720, 2800),
+]
+
+# Seconds per HLS segment; keyframes are forced on segment boundaries
+HLS_SEGMENT_SECONDS = 4
+
+AUDIO_BITRATE = "128k"
+
+# Source videos being transcoded by this process, and those it failed on
+# (not retried until restart, so a broken file is not transcoded per request)
+_in_progress = set()
+_failed = set()
+_lock = threading.Lock()
+
+
+def rendition_command(source_path, output_dir, has_audio):
+    """
+    FFmpeg command transcoding a video into the whole ladder in one pass.
+
+    The source is decoded once and split into one scaled stream per rung.
+    """
+    splits = "".join(f"[s{index}]" for index in range(len(RENDITION_LADDER)))
+    filters = [f"[0:v]split={len(RENDITION_LADDER)}{splits}"]
+    for index, (_, height, _) in enumerate(RENDITION_LADDER):
+        filters.append(f"[s{index}]scale=-2:{height}[v{index}]")
+
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-i",
+        source_path,
+        "-filter_complex",
+        ";".join(filters),
+    ]
+    stream_map = []
+    for index, (name, _, bitrate) in enumerate(RENDITION_LADDER):
+        cmd += [
+            "-map",
+            f"[v{index}]",
+            f"-c:v:{index}",
+            "libx264",
+            f"-b:v:{index}",
+            f"{bitrate}k",
+            f"-maxrate:v:{index}",
+            f"{bitrate * 107 // 100}k",
+            f"-bufsize:v:{index}",
+            f"{bitrate * 3 // 2}k",
+        ]
+        if has_audio:
+            cmd += ["-map", "0:a"]
+            stream_map.append(f"v:{index},a:{index},name:{name}")
+        else:
+            stream_map.append(f"v:{index},name:{name}")
+    if has_audio:
+        cmd += ["-c:a", "aac", "-b:a", AUDIO_BITRATE]
+
+    cmd += [
+        "-preset",
+        "veryfast",
+        "-pix_fmt",
+        "yuv420p",
+        "-force_key_frames",
+        f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        "-f",
+        "hls",
+        "-hls_time",
+        str(HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type",
+        "vod",
+        "-hls_segment_filename",
+        os.path.join(output_dir, "%v_%03d.ts"),
+        "-master_pl_name",
+        "master.m3u8",
+        "-var_stream_map",
+        " ".join(stream_map),
+        os.path.join(output_dir, "%v.m3u8"),
+    ]
+    return cmd
+
+
+def schedule_renditions(video_url):
+    """
+    Transcode a video into its HLS renditions in the background.
+
+    Does nothing if the renditions exist or are already being transcoded.
+
+    Args:
+        video_url: URL of the source video (e.g. '/static/videos/xyz.mp4')
+
+    Returns:
+        The Future of the transcoding job if one was queued, None otherwise
+    """
+    if not RENDITIONS or not video_url:
+        return None
+
+    video = VideoCache.get_video_by_url(video_url)
+    if not video or video.hls_url or video.source_video_id:
+        return None
+
+    with _lock:
+        if video.id in _in_progress or video.id in _failed:
+            return None
+        _in_progress.add(video.id)
+
+    stem = os.path.splitext(video.filename)[0]
+    output_dir = os.path.join(VideoCache.get_static_video_dir(), "hls", stem)
+    os.makedirs(output_dir, exist_ok=True)
+    source_path = VideoCache.get_video_path(video.id)
+    cmd = rendition_command(source_path, output_dir, bool(video.has_audio))
+
+    try:
+        future = submit_ffmpeg(
+            cmd,
+            job="renditions",
+            timeout=RENDITION_TIMEOUT_SECONDS,
+            lane=LANE_BACKGROUND,
+        )
+    except FFmpegError as e:
+        print(f"Skipping renditions for {video_url}: {e}")
+        _finish(video.id, output_dir, failed=True)
+        return None
+
+    app = current_app._get_current_object()
+    future.add_done_callback(
+        lambda future: _on_transcoded(app, future, video.id, stem, output_dir)
+    )
+    print(f"Queued renditions for {video_url}")
+    return future
+
+
+def hls_url_for(video_url):
+    """HLS master playlist of a video, or None while it has no renditions."""
+    if not video_url:
+        return None
+    return VideoCache.get_hls_url(video_url)
+
+
+def scene_videos_without_renditions(limit=None):
+    """URLs of the full videos of cached scenes that have no renditions yet."""
+
+    def media_field(name):
+        return db.func.json_extract(
+            SceneCache.next_media_urls, db.literal_column(f"'$.{name}'")
+        )
+
+    # Scenes cached before tiers existed are full videos
+    played = db.session.query(media_field("combined_video")).filter(
+        db.func.coalesce(media_field("tier"), "video") == "video"
+    )
+    query = (
+        db.session.query(Video.url_path)
+        .filter(
+            Video.hls_url.is_(None),
+            Video.source_video_id.is_(None),
+            Video.url_path.in_(played),
+        )
+        .order_by(Video.id)
+    )
+    if limit:
+        query = query.limit(limit)
+    return [url_path for url_path, in query]
+
+
+def _on_transcoded(app, future, video_id, stem, output_dir):
+    with app.app_context():
+        try:
+            result = future.result()
+            if not result.ok:
+                print(f"FFmpeg error: {result.stderr}")
+                _finish(video_id, output_dir, failed=True)
+                return
+
+            source_video = Video.query.get(video_id)
+            if not source_video:
+                _finish(video_id, output_dir, failed=True)
+                return
+
+            base_url = f"/static/videos/hls/{stem}"
+            VideoCache.save_renditions(
+                source_video,
+                f"{base_url}/master.m3u8",
+                [
+                    (f"{base_url}/{name}.m3u8", height, bitrate)
+                    for name, height, bitrate in RENDITION_LADDER
+                ],
+            )
+            print(f"Renditions ready: {base_url}/master.m3u8")
+            _finish(video_id, output_dir)
+        except Exception as e:
+            print(f"Error transcoding renditions: {e}")
+            _finish(video_id, output_dir, failed=True)
+
+
+def _finish(video_id, output_dir, failed=False):
+    if failed:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    with _lock:
+        _in_progress.discard(video_id)
+        if failed:
+            _failed.add(video_id)
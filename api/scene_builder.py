@@ -0,0 +1,529 @@
+import json
+import time
+import threading
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from api.ledger import current_generation_id, generation_context
+from api.media_generator import PROFILE_DRAFT, PROFILE_PREMIUM, quality_profile
+from api.media_tiers import (
+    MEDIA_UPGRADE_RETRY_SECONDS,
+    TIER_VIDEO,
+    generate_scene_media,
+    generate_scene_media_async,
+    media_upgrade_due,
+    scene_deadline,
+)
+from api.producer_agent import generate_scene_prompts, generate_scene_prompts_async
+from api.rate_limiter import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    check_admission,
+    current_priority,
+    request_priority,
+)
+from api.timing import record_cache_lookup, scenario_context, timed
+from api.tracing import child_span, current_context, current_trace_id, span, use_context
+from api.writer_agent import generate_narrative, generate_narrative_async
+from database import run_in_thread
+from database.models import db, SceneCache
+
+# Cached scenes whose media is being re-rendered by this process
+_media_upgrades = set()
+_media_upgrades_lock = threading.Lock()
+
+
+def initial_partial_narrative(scenario):
+    """
+    Build the partial narrative used as the cache key for a scenario's first scene.
+
+    Args:
+        scenario: The historical scenario
+
+    Returns:
+        Partial narrative dictionary with no prior scene and no decisions
+    """
+    return {
+        "scenario": scenario,
+        "last_narrative": None,
+        "decision_history": [],
+    }
+
+
+def child_partial_narrative(partial_narrative_obj, option):
+    """
+    Build the partial narrative reached by choosing an option of the last scene.
+
+    This mirrors the decision record written by the /api/decision route so that
+    pre-generated scenes are found by the same cache key a student produces.
+
+    Args:
+        partial_narrative_obj: Partial narrative whose last_narrative holds the options
+        option: The chosen option dictionary ({"id": ..., "option": ...})
+
+    Returns:
+        New partial narrative dictionary (the input is not modified)
+    """
+    last_narrative = partial_narrative_obj["last_narrative"]
+    decision_record = {
+        "scene_id": last_narrative["scene_id"] if last_narrative else 0,
+        "decision": option["id"],
+        "decision_text": option["option"],
+    }
+    return {
+        "scenario": partial_narrative_obj["scenario"],
+        "last_narrative": last_narrative,
+        "decision_history": partial_narrative_obj["decision_history"]
+        + [decision_record],
+    }
+
+
+def get_cached_scene(scenario, partial_narrative_str):
+    """
+    Look up a generated scene by its (scenario, partial_narrative) cache key.
+
+    Returns:
+        The SceneCache row if found, None otherwise
+    """
+    return SceneCache.query.filter_by(
+        scenario=scenario, partial_narrative=partial_narrative_str
+    ).first()
+
+
+def generate_scene(
+    last_narrative,
+    decision_id,
+    scenario,
+    deadline=None,
+    on_upgrade=None,
+    previous_media=None,
+    narrative=None,
+):
+    """
+    Run the full generation pipeline for one scene.
+
+    Args:
+        last_narrative: The previous narrative (None for the initial scene)
+        decision_id: The option chosen in last_narrative (None for the initial scene)
+        scenario: The historical scenario
+        deadline: Monotonic deadline for the media (None waits for the full video)
+        on_upgrade: Called with full-video media data if a lower tier was returned
+        previous_media: Media data of last_narrative's scene, for visual continuity
+        narrative: The scene's narrative if it was already written (e.g. by
+            generate_child_narratives()); otherwise the writer is called
+
+    Returns:
+        Tuple of (narrative, scene_prompts, media_data, fallback), where
+        fallback is True if the narrative or the scene prompts are the canned
+        ones an agent falls back to (e.g. while Gemini's breaker is open)
+    """
+    narrative_fallback = False
+    if narrative is None:
+        with timed("writer", provider="gemini"):
+            narrative, narrative_fallback = generate_narrative(
+                last_narrative, decision_id, scenario
+            )
+    with timed("producer", provider="gemini"):
+        scene_prompts, prompts_fallback = generate_scene_prompts(narrative["narrative"])
+    fallback = narrative_fallback or prompts_fallback
+    with timed("media"):
+        # Fallback scenes are not cached, so there is nothing to upgrade
+        media_data = generate_scene_media(
+            scene_prompts,
+            narrative["narrative"],
+            deadline,
+            None if fallback else on_upgrade,
+            previous_media,
+        )
+    return narrative, scene_prompts, media_data, fallback
+
+
+async def generate_scene_async(
+    last_narrative,
+    decision_id,
+    scenario,
+    deadline=None,
+    on_upgrade=None,
+    previous_media=None,
+    narrative=None,
+):
+    """Like generate_scene(), awaiting the providers instead of blocking a thread."""
+    narrative_fallback = False
+    if narrative is None:
+        with timed("writer", provider="gemini"):
+            narrative, narrative_fallback = await generate_narrative_async(
+                last_narrative, decision_id, scenario
+            )
+    with timed("producer", provider="gemini"):
+        scene_prompts, prompts_fallback = await generate_scene_prompts_async(
+            narrative["narrative"]
+        )
+    fallback = narrative_fallback or prompts_fallback
+    with timed("media"):
+        media_data = await generate_scene_media_async(
+            scene_prompts,
+            narrative["narrative"],
+            deadline,
+            None if fallback else on_upgrade,
+            previous_media,
+        )
+    return narrative, scene_prompts, media_data, fallback
+
+
+def save_scene(scenario, partial_narrative_str, narrative, scene_prompts, media_data):
+    """
+    Store a generated scene in the scene cache.
+
+    If another request or warm-up job stored the same key first, the existing
+    row wins and is returned instead.
+
+    Returns:
+        The SceneCache row holding the scene
+    """
+    new_cache = SceneCache(
+        scenario=scenario,
+        partial_narrative=partial_narrative_str,
+        next_narrative=json.dumps(narrative),
+        next_scene_prompts=json.dumps(scene_prompts),
+        next_media_urls=json.dumps(media_data),
+        quality_profile=media_data.get("profile"),
+        trace_id=current_trace_id(),
+        generation_id=current_generation_id(),
+    )
+    db.session.add(new_cache)
+    try:
+        with timed("db_commit"):
+            db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        print("Scene was cached concurrently, using the existing entry")
+        return get_cached_scene(scenario, partial_narrative_str)
+    return new_cache
+
+
+def upgrade_scene_media(scenario, partial_narrative_str, media_data, attempts=30):
+    """
+    Replace the media of a cached scene, e.g. once its full video is ready.
+
+    The scene may still be on its way into the cache when the upgrade arrives,
+    so the lookup is retried for a while.
+
+    Returns:
+        True if the cached scene was updated
+    """
+    for _ in range(attempts):
+        cache_entry = get_cached_scene(scenario, partial_narrative_str)
+        if cache_entry:
+            cache_entry.next_media_urls_obj = media_data
+            cache_entry.quality_profile = media_data.get(
+                "profile", cache_entry.quality_profile
+            )
+            db.session.commit()
+            return True
+        time.sleep(1)
+    print("Cached scene not found, media upgrade dropped")
+    return False
+
+
+def upgrade_scene_quality(scenario, partial_narrative_str):
+    """
+    Re-render the media of a draft scene with the premium profile.
+
+    The narrative and scene prompts are kept; only the media is replaced, and
+    only once the full premium video is ready.
+
+    Returns:
+        True if the cached scene was upgraded
+    """
+    cache_entry = get_cached_scene(scenario, partial_narrative_str)
+    if not cache_entry or cache_entry.quality_profile != PROFILE_DRAFT:
+        return False
+
+    narrative = cache_entry.next_narrative_obj
+    scene_prompts = cache_entry.next_scene_prompts_obj
+    # The premium render adds to the cost of the scene's generation
+    with quality_profile(PROFILE_PREMIUM), generation_context(
+        cache_entry.generation_id
+    ) as generation_id:
+        media_data = generate_scene_media(scene_prompts, narrative["narrative"], None)
+    if media_data.get("tier") != TIER_VIDEO:
+        print("Premium video failed, keeping the draft scene")
+        return False
+
+    cache_entry = get_cached_scene(scenario, partial_narrative_str)
+    cache_entry.next_media_urls_obj = media_data
+    cache_entry.quality_profile = PROFILE_PREMIUM
+    cache_entry.generation_id = cache_entry.generation_id or generation_id
+    db.session.commit()
+    print("Draft scene upgraded to premium")
+    return True
+
+
+def upgrade_scene_video(scenario, partial_narrative_str):
+    """
+    Retry the full video of a cached scene that was delivered at a lower tier.
+
+    The retry is claimed by moving the scene's upgrade_retry_at forward, so of
+    several workers hitting the scene only one reruns the pipeline, and a
+    failed retry is not attempted again before MEDIA_UPGRADE_RETRY_SECONDS.
+
+    Returns:
+        True if the cached scene was upgraded
+    """
+    cache_entry = get_cached_scene(scenario, partial_narrative_str)
+    if not cache_entry or not media_upgrade_due(cache_entry.next_media_urls_obj):
+        return False
+
+    claimed_media = dict(
+        cache_entry.next_media_urls_obj,
+        upgrade_retry_at=time.time() + MEDIA_UPGRADE_RETRY_SECONDS,
+    )
+    claimed = SceneCache.query.filter_by(
+        id=cache_entry.id, next_media_urls=cache_entry.next_media_urls
+    ).update({"next_media_urls": json.dumps(claimed_media)})
+    db.session.commit()
+    if not claimed:
+        return False
+
+    narrative = cache_entry.next_narrative_obj
+    scene_prompts = cache_entry.next_scene_prompts_obj
+    profile = cache_entry.quality_profile or claimed_media.get("profile")
+    with quality_profile(profile), generation_context(cache_entry.generation_id):
+        media_data = generate_scene_media(scene_prompts, narrative["narrative"], None)
+    if media_data.get("tier") != TIER_VIDEO:
+        print("Full video failed again, keeping the scene's lower tier")
+        return False
+
+    upgrade_scene_media(scenario, partial_narrative_str, media_data, attempts=1)
+    print("Scene upgraded to the full video")
+    return True
+
+
+def start_media_upgrade(name, upgrade, scenario, partial_narrative_str):
+    """
+    Run upgrade(scenario, partial_narrative_str) for a cached scene in a
+    background thread (traced as span `name`), unless this process is already
+    upgrading the scene.
+    """
+    key = (scenario, partial_narrative_str)
+    with _media_upgrades_lock:
+        if key in _media_upgrades:
+            return None
+        _media_upgrades.add(key)
+
+    app = current_app._get_current_object()
+    trace_context = current_context()
+
+    def run():
+        # The student already has a scene, so this yields to interactive work
+        with app.app_context(), request_priority(
+            PRIORITY_BACKGROUND
+        ), scenario_context(scenario), use_context(trace_context), span(name):
+            try:
+                upgrade(scenario, partial_narrative_str)
+            except Exception as e:
+                print(f"Error upgrading cached scene: {e}")
+            finally:
+                with _media_upgrades_lock:
+                    _media_upgrades.discard(key)
+
+    thread = threading.Thread(target=run, name="scene-media-upgrade", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_quality_upgrade(scenario, partial_narrative_str):
+    """Upgrade a draft scene to the premium profile in a background thread."""
+    return start_media_upgrade(
+        "quality_upgrade", upgrade_scene_quality, scenario, partial_narrative_str
+    )
+
+
+def upgrade_cached_scene(scenario, partial_narrative_str, quality_profile_name, media_data):
+    """
+    Start the background upgrade a cache hit calls for, if any: drafts reached
+    by a student are rendered premium, and scenes stuck at a lower tier retry
+    the full video.
+    """
+    if (
+        quality_profile_name == PROFILE_DRAFT
+        and current_priority() <= PRIORITY_INTERACTIVE
+    ):
+        return start_quality_upgrade(scenario, partial_narrative_str)
+    if media_upgrade_due(media_data):
+        return start_media_upgrade(
+            "video_upgrade", upgrade_scene_video, scenario, partial_narrative_str
+        )
+    return None
+
+
+def get_or_create_scene(
+    scenario,
+    partial_narrative_obj,
+    decision_id=None,
+    previous_media=None,
+    narrative=None,
+):
+    """
+    Return the scene for a partial narrative, generating and caching it if needed.
+
+    A scene built from an agent's fallback (e.g. while Gemini is down) is
+    returned but not cached, so later students get a real scene.
+
+    Args:
+        scenario: The historical scenario
+        partial_narrative_obj: Cache key; its last_narrative is the scene being continued
+        decision_id: The option chosen in last_narrative (None for the initial scene)
+        previous_media: Media data of the scene being continued, if known
+        narrative: Narrative to use if the scene has to be generated
+
+    Returns:
+        Tuple of (narrative, scene_prompts, media_data, cached)
+
+    Raises:
+        QueueSaturated: if the scene is not cached and the providers are saturated
+    """
+    with scenario_context(scenario), child_span("scene", scenario=scenario):
+        return _get_or_create_scene(
+            scenario, partial_narrative_obj, decision_id, previous_media, narrative
+        )
+
+
+def _get_or_create_scene(
+    scenario, partial_narrative_obj, decision_id, previous_media, narrative
+):
+    # The latency SLO covers the whole decision, so the clock starts here
+    deadline = scene_deadline()
+    partial_narrative_str = json.dumps(partial_narrative_obj)
+
+    with timed("scene_cache") as stage:
+        cache_entry = get_cached_scene(scenario, partial_narrative_str)
+        stage["cache"] = record_cache_lookup("scene", cache_entry)
+    if cache_entry:
+        upgrade_cached_scene(
+            scenario,
+            partial_narrative_str,
+            cache_entry.quality_profile,
+            cache_entry.next_media_urls_obj,
+        )
+        return (
+            cache_entry.next_narrative_obj,
+            cache_entry.next_scene_prompts_obj,
+            cache_entry.next_media_urls_obj,
+            True,
+        )
+
+    # Reject interactive work up front rather than queueing it behind a full backlog
+    check_admission()
+
+    def on_upgrade(upgraded_media_data):
+        upgrade_scene_media(scenario, partial_narrative_str, upgraded_media_data)
+
+    # Provider calls from here on are recorded as this scene's generation
+    with generation_context():
+        narrative, scene_prompts, media_data, fallback = generate_scene(
+            partial_narrative_obj["last_narrative"],
+            decision_id,
+            scenario,
+            deadline,
+            on_upgrade,
+            previous_media,
+            narrative,
+        )
+        if fallback:
+            # Serve it, but let the next student get a real scene
+            print("Serving a fallback scene without caching it")
+            return narrative, scene_prompts, media_data, False
+        cache_entry = save_scene(
+            scenario, partial_narrative_str, narrative, scene_prompts, media_data
+        )
+    return (
+        cache_entry.next_narrative_obj,
+        cache_entry.next_scene_prompts_obj,
+        cache_entry.next_media_urls_obj,
+        False,
+    )
+
+
+async def get_or_create_scene_async(
+    scenario,
+    partial_narrative_obj,
+    decision_id=None,
+    previous_media=None,
+    narrative=None,
+):
+    """
+    Like get_or_create_scene(), for coroutines. The scene cache is read and
+    written in worker threads; generation waits in the event loop.
+    """
+    with scenario_context(scenario), child_span("scene", scenario=scenario):
+        return await _get_or_create_scene_async(
+            scenario, partial_narrative_obj, decision_id, previous_media, narrative
+        )
+
+
+def cached_scene_data(scenario, partial_narrative_str):
+    """(narrative, scene_prompts, media_data, quality_profile) of a cached scene, or None."""
+    cache_entry = get_cached_scene(scenario, partial_narrative_str)
+    if not cache_entry:
+        return None
+    return (
+        cache_entry.next_narrative_obj,
+        cache_entry.next_scene_prompts_obj,
+        cache_entry.next_media_urls_obj,
+        cache_entry.quality_profile,
+    )
+
+
+def save_scene_data(scenario, partial_narrative_str, narrative, scene_prompts, media_data):
+    """Like save_scene(), returning the stored (narrative, scene_prompts, media_data)."""
+    cache_entry = save_scene(
+        scenario, partial_narrative_str, narrative, scene_prompts, media_data
+    )
+    return (
+        cache_entry.next_narrative_obj,
+        cache_entry.next_scene_prompts_obj,
+        cache_entry.next_media_urls_obj,
+    )
+
+
+async def _get_or_create_scene_async(
+    scenario, partial_narrative_obj, decision_id, previous_media, narrative
+):
+    deadline = scene_deadline()
+    partial_narrative_str = json.dumps(partial_narrative_obj)
+
+    with timed("scene_cache") as stage:
+        cached = await run_in_thread(cached_scene_data, scenario, partial_narrative_str)
+        stage["cache"] = record_cache_lookup("scene", cached)
+    if cached:
+        cached_narrative, scene_prompts, media_data, profile = cached
+        upgrade_cached_scene(scenario, partial_narrative_str, profile, media_data)
+        return cached_narrative, scene_prompts, media_data, True
+
+    check_admission()
+
+    def on_upgrade(upgraded_media_data):
+        upgrade_scene_media(scenario, partial_narrative_str, upgraded_media_data)
+
+    with generation_context():
+        narrative, scene_prompts, media_data, fallback = await generate_scene_async(
+            partial_narrative_obj["last_narrative"],
+            decision_id,
+            scenario,
+            deadline,
+            on_upgrade,
+            previous_media,
+            narrative,
+        )
+        if fallback:
+            print("Serving a fallback scene without caching it")
+            return narrative, scene_prompts, media_data, False
+        saved = await run_in_thread(
+            save_scene_data,
+            scenario,
+            partial_narrative_str,
+            narrative,
+            scene_prompts,
+            media_data,
+        )
+    return saved + (False,)
@@ -0,0 +1,101 @@
+"""
+Per-stage latency of scene generation.
+
+Every stage of a decision (scene cache lookup, writer, producer, Flux, Runway
+submit/poll/download, FFmpeg, TTS, DB commits) is timed into the
+stage_duration_seconds histogram, labeled with the scenario, whether the
+stage was served from a cache, and the provider it called:
+
+    with timed("flux", provider="replicate") as stage:
+        if cached_image:
+            stage["cache"] = "hit"
+            ...
+
+Cache lookups are also counted per cache, and /metrics exposes the hit ratio
+of each cache.
+
+The scenario label comes from scenario_context(), which is a context
+variable: it follows the coroutines of an async request, and threads that
+work on a scene set it again from the value their creator had.
+
+Inside a trace (see api/tracing.py), every timed stage is also a span.
+"""
+
+import time
+from contextvars import ContextVar
+from contextlib import contextmanager
+from api import metrics
+from api.tracing import child_span
+
+STAGE_SECONDS = metrics.histogram(
+    "stage_duration_seconds",
+    "Seconds spent in each stage of scene generation",
+    ("stage", "scenario", "cache", "provider"),
+)
+CACHE_LOOKUPS = metrics.counter(
+    "cache_lookups_total", "Cache lookups by cache and result (hit, miss)", ("cache", "result")
+)
+CACHE_HIT_RATIO = metrics.gauge(
+    "cache_hit_ratio", "Share of lookups served from the cache", ("cache",)
+)
+
+CACHE_NAMES = ("scene", "image", "video", "combined_video", "audio")
+
+_scenario = ContextVar("scenario", default="")
+
+
+def current_scenario():
+    """Scenario the work running in this context belongs to ("" if unknown)."""
+    return _scenario.get()
+
+
+@contextmanager
+def scenario_context(scenario):
+    """Label the stages timed in the enclosed block with this scenario."""
+    token = _scenario.set(scenario or "")
+    try:
+        yield
+    finally:
+        _scenario.reset(token)
+
+
+@contextmanager
+def timed(stage, provider="", cache=""):
+    """
+    Time the enclosed block as a stage.
+
+    Yields a dictionary of labels; set its "cache" entry to "hit" or "miss"
+    once it is known.
+    """
+    labels = {"cache": cache}
+    started = time.monotonic()
+    try:
+        attributes = {"provider": provider} if provider else {}
+        with child_span(stage, **attributes) as stage_span:
+            yield labels
+            if stage_span and labels["cache"]:
+                stage_span.set_attribute("cache", labels["cache"])
+    finally:
+        STAGE_SECONDS.observe(
+            time.monotonic() - started,
+            stage=stage,
+            scenario=current_scenario(),
+            cache=labels["cache"],
+            provider=provider,
+        )
+
+
+def record_cache_lookup(cache, hit):
+    """Count a lookup of one of the caches; returns "hit" or "miss" for labels."""
+    result = "hit" if hit else "miss"
+    CACHE_LOOKUPS.inc(cache=cache, result=result)
+    return result
+
+
+@metrics.on_render
+def _update_hit_ratios():
+    for cache in CACHE_NAMES:
+        hits = CACHE_LOOKUPS.value(cache=cache, result="hit")
+        total = hits + CACHE_LOOKUPS.value(cache=cache, result="miss")
+        if total:
+            CACHE_HIT_RATIO.set(hits / total, cache=cache)
@@ -0,0 +1,260 @@
+"""
+Span-based tracing across requests and background generation jobs.
+
+A trace starts at a traced entry point (e.g. the /api/decision view, a
+warm-up job) and every stage timed with api.timing, every provider call and
+every FFmpeg job becomes a child span. Spans are context variables, so they
+follow the coroutines of an async request (and asyncio.to_thread); work handed
+to another thread carries the trace with it:
+
+    context = current_context()
+
+    def run():
+        with use_context(context), span("scene_media_job"):
+            ...
+
+Whether a trace is recorded is decided once, at its root (TRACE_SAMPLE_RATE),
+and inherited by all of its spans. Recorded spans are exported in the Zipkin
+v2 JSON format, either appended to a JSON lines file or posted to a local
+collector, from a background thread so tracing never waits on I/O.
+
+Settings are read from the environment:
+
+    TRACE_SAMPLE_RATE       share of traces recorded, 0 to 1 (0.1)
+    TRACE_EXPORTER          "file", "collector" or "none" (file)
+    TRACE_FILE              where the file exporter writes (instance/traces.jsonl)
+    TRACE_COLLECTOR_URL     Zipkin-compatible endpoint of the collector
+                            (http://localhost:9411/api/v2/spans)
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import inspect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import requests
+from api import metrics
+
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "file").lower()
+TRACE_FILE = os.environ.get(
+    "TRACE_FILE",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "instance",
+        "traces.jsonl",
+    ),
+)
+TRACE_COLLECTOR_URL = os.environ.get(
+    "TRACE_COLLECTOR_URL", "http://localhost:9411/api/v2/spans"
+)
+
+SERVICE_NAME = "rewritten"
+
+# Spans waiting for the exporter; more than this are dropped, not buffered
+EXPORT_QUEUE_SIZE = 10000
+EXPORT_BATCH_SIZE = 200
+EXPORT_INTERVAL_SECONDS = 2
+
+SPANS = metrics.counter(
+    "trace_spans_total", "Recorded spans by export outcome", ("outcome",)
+)
+
+# Context of the innermost open span, and of the trace continued with use_context()
+_span = ContextVar("span", default=None)
+_remote = ContextVar("remote_span", default=None)
+_export_queue = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+_exporter_lock = threading.Lock()
+_exporter_thread = None
+
+
+class SpanContext:
+    """What a child span needs from its parent, also across threads."""
+
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id, span_id, sampled):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+class Span:
+    def __init__(self, name, parent=None, attributes=None):
+        if parent is None:
+            trace_id = os.urandom(16).hex()
+            sampled = TRACE_EXPORTER != "none" and random.random() < TRACE_SAMPLE_RATE
+            parent_id = None
+        else:
+            trace_id, sampled, parent_id = parent.trace_id, parent.sampled, parent.span_id
+        self.context = SpanContext(trace_id, os.urandom(8).hex(), sampled)
+        self.name = name
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.timestamp = time.time()
+        self.started = time.monotonic()
+        self.duration = None
+
+    @property
+    def trace_id(self):
+        return self.context.trace_id
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self):
+        self.duration = time.monotonic() - self.started
+        if self.context.sampled:
+            _export(self)
+
+    def to_zipkin(self):
+        span = {
+            "traceId": self.trace_id,
+            "id": self.context.span_id,
+            "name": self.name,
+            "timestamp": int(self.timestamp * 1_000_000),
+            "duration": max(1, int(self.duration * 1_000_000)),
+            "localEndpoint": {"serviceName": SERVICE_NAME},
+            "tags": {key: str(value) for key, value in self.attributes.items()},
+        }
+        if self.parent_id:
+            span["parentId"] = self.parent_id
+        return span
+
+
+def current_context():
+    """Context of the innermost span of this context, or None outside a trace."""
+    return _span.get() or _remote.get()
+
+
+def current_trace_id():
+    """ID of the trace running in this context if it is recorded, otherwise None."""
+    context = current_context()
+    return context.trace_id if context and context.sampled else None
+
+
+@contextmanager
+def use_context(context):
+    """Continue a trace from another thread; spans opened here become its children."""
+    token = _remote.set(context)
+    try:
+        yield
+    finally:
+        _remote.reset(token)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Record the enclosed block as a span, starting a new trace if none is active.
+
+    Yields the Span, e.g. to add attributes once they are known.
+    """
+    current = Span(name, current_context(), attributes)
+    token = _span.set(current.context)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_attribute("error", repr(e))
+        raise
+    finally:
+        _span.reset(token)
+        current.end()
+
+
+@contextmanager
+def child_span(name, **attributes):
+    """Like span(), but only inside an active trace; yields None otherwise."""
+    if current_context() is None:
+        yield None
+        return
+    with span(name, **attributes) as current:
+        yield current
+
+
+def traced(name):
+    """
+    Decorator running a function or coroutine function (e.g. a view) as a
+    span, the root of a new trace unless one is active. Responses of recorded
+    traces get an X-Trace-Id header, so a slow request can be looked up.
+    """
+
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name) as current:
+                    result = await fn(*args, **kwargs)
+                if current.context.sampled and hasattr(result, "headers"):
+                    result.headers["X-Trace-Id"] = current.trace_id
+                return result
+
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name) as current:
+                result = fn(*args, **kwargs)
+            if current.context.sampled and hasattr(result, "headers"):
+                result.headers["X-Trace-Id"] = current.trace_id
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _export(finished_span):
+    _start_exporter()
+    try:
+        _export_queue.put_nowait(finished_span.to_zipkin())
+    except queue.Full:
+        SPANS.inc(outcome="dropped")
+
+
+def _start_exporter():
+    global _exporter_thread
+    with _exporter_lock:
+        if _exporter_thread is None:
+            _exporter_thread = threading.Thread(
+                target=_export_loop, name="trace-exporter", daemon=True
+            )
+            _exporter_thread.start()
+
+
+def _export_loop():
+    while True:
+        batch = [_export_queue.get()]
+        deadline = time.monotonic() + EXPORT_INTERVAL_SECONDS
+        while len(batch) < EXPORT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_export_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        try:
+            write_spans(batch)
+            SPANS.inc(len(batch), outcome="exported")
+        except Exception as e:
+            print(f"Error exporting {len(batch)} spans: {e}")
+            SPANS.inc(len(batch), outcome="failed")
+
+
+def write_spans(spans):
+    """Send finished spans (Zipkin v2 dictionaries) to the configured exporter."""
+    if TRACE_EXPORTER == "collector":
+        response = requests.post(TRACE_COLLECTOR_URL, json=spans, timeout=5)
+        response.raise_for_status()
+    elif TRACE_EXPORTER == "file":
+        os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+        with open(TRACE_FILE, "a") as f:
+            for finished_span in spans:
+                f.write(json.dumps(finished_span) + "\n")
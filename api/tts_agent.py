@@ -1,19 +1,68 @@
 import os
-import requests
-import json
+import uuid
 from dotenv import load_dotenv
+from api.circuit_breaker import CircuitOpenError, call_provider, call_provider_async
+from api.ledger import metered
+from api.media_generator import current_profile
+from api.providers import get_provider
+from api.timing import record_cache_lookup, timed
+from database import run_in_thread
+from database.audio_cache import AudioCache
 
 # Load environment variables
 load_dotenv()
 
-# Get ElevenLabs API key from environment variables
-ELEVEN_LABS_API_KEY = os.environ.get("ELEVEN_LABS_API_KEY")
+# Voice settings; together with the text, voice and model (from the quality
+# profile, see api/media_generator.py) they form the cache key
+TTS_VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.5, "speed": 1.0}
 
+# Default voice ('Rachel')
+DEFAULT_VOICE_ID = "nPczCjzI2devNBz1zQrb"
 
-def generate_speech(text, voice_id="nPczCjzI2devNBz1zQrb"):
+# Whether students get narration streamed from /api/narration instead of
+# waiting for the full MP3 before the scene is returned
+STREAMING_TTS = os.environ.get("STREAMING_TTS", "true").lower() == "true"
+
+# Size of the chunks relayed to the browser while streaming
+STREAM_CHUNK_BYTES = 4096
+
+
+def tts_model_id():
+    """ElevenLabs model of the quality profile of the work running in this context."""
+    return current_profile()["tts_model"]
+
+
+def tts_request_data(text, model_id):
+    """Request body for ElevenLabs text-to-speech requests."""
+    return {
+        "text": text,
+        "model_id": model_id,
+        "voice_settings": TTS_VOICE_SETTINGS,
+    }
+
+
+def speech_cache_key(text, voice_id=DEFAULT_VOICE_ID, model_id=None):
+    model_id = model_id or tts_model_id()
+    return AudioCache.make_key(text, voice_id, model_id, TTS_VOICE_SETTINGS)
+
+
+def cached_speech_url(text, voice_id=DEFAULT_VOICE_ID):
+    """URL of already generated narration for this text, or None (never calls the API)."""
+    try:
+        cached_audio = AudioCache.get_audio(speech_cache_key(text, voice_id))
+        return cached_audio.url_path if cached_audio else None
+    except Exception as e:
+        print(f"Error reading narration cache: {e}")
+        return None
+
+
+def generate_speech(text, voice_id=DEFAULT_VOICE_ID):
     """
     Generate speech using ElevenLabs API
 
+    Narration is cached by text, voice, model and settings, so identical
+    narration (e.g. the opening scene every class hears) is served from disk.
+
     Args:
         text: The text to convert to speech
         voice_id: The voice ID to use (default is 'Rachel')
@@ -21,57 +70,211 @@ def generate_speech(text, voice_id="nPczCjzI2devNBz1zQrb"):
     Returns:
         URL to the generated audio file or None if generation failed
     """
+    with timed("tts", provider="elevenlabs") as stage:
+        return _generate_speech(text, voice_id, stage)
 
-    if not ELEVEN_LABS_API_KEY:
+
+def _generate_speech(text, voice_id, stage):
+    model_id = tts_model_id()
+    cache_key = speech_cache_key(text, voice_id, model_id)
+    cached_url = cached_speech_url(text, voice_id)
+    stage["cache"] = record_cache_lookup("audio", cached_url)
+    if cached_url:
+        print(f"Using cached narration: {cached_url}")
+        return cached_url
+
+    provider = get_provider("speech")
+    if not provider.available():
         print("Error: ELEVEN_LABS_API_KEY not found in environment variables")
         return None
 
     try:
-        # API endpoint for text-to-speech
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-
-        # Headers with API key
-        headers = {
-            "Accept": "audio/mpeg",
-            "Content-Type": "application/json",
-            "xi-api-key": ELEVEN_LABS_API_KEY,
-        }
-
-        # Request data
-        data = {
-            "text": text,
-            "model_id": "eleven_monolingual_v1",
-            "voice_settings": {"stability": 0.5, "similarity_boost": 0.5, "speed": 1.0},
-        }
+        data = tts_request_data(text, model_id)
 
         # Make the API request
-        response = requests.post(url, json=data, headers=headers)
+        with metered("tts", "elevenlabs", model_id, "characters") as usage:
+            response = call_provider("elevenlabs", provider.synthesize, voice_id, data)
+            if response.status_code == 200:
+                usage["units"] = len(text)
 
         # Check if the request was successful
         if response.status_code == 200:
-            # Save the audio file
-            static_dir = os.path.join(
-                os.path.dirname(os.path.dirname(__file__)), "static", "audio"
-            )
-            os.makedirs(static_dir, exist_ok=True)
+            # Save the audio in the narration cache
+            return save_speech(cache_key, response.content, text, voice_id, model_id)
+        else:
+            print(f"Error generating audio: {response.status_code}")
+            print(response.text)
+            return None
+
+    except CircuitOpenError as e:
+        print(f"Skipping narration: {e}")
+        return None
 
-            # Generate a unique filename
-            from uuid import uuid4
+    except Exception as e:
+        print(f"Error in TTS generation: {e}")
+        return None
 
-            filename = f"{uuid4()}.mp3"
-            filepath = os.path.join(static_dir, filename)
 
-            # Save the audio
-            with open(filepath, "wb") as f:
-                f.write(response.content)
+async def generate_speech_async(text, voice_id=DEFAULT_VOICE_ID):
+    """
+    Like generate_speech(), awaiting ElevenLabs instead of blocking a thread;
+    the narration cache is read and written in a worker thread.
+    """
+    with timed("tts", provider="elevenlabs") as stage:
+        return await _generate_speech_async(text, voice_id, stage)
 
-            print(f"Audio generated successfully: {filepath}")
-            return f"/static/audio/{filename}"
+
+async def _generate_speech_async(text, voice_id, stage):
+    model_id = tts_model_id()
+    cache_key = speech_cache_key(text, voice_id, model_id)
+    cached_url = await run_in_thread(cached_speech_url, text, voice_id)
+    stage["cache"] = record_cache_lookup("audio", cached_url)
+    if cached_url:
+        print(f"Using cached narration: {cached_url}")
+        return cached_url
+
+    provider = get_provider("speech")
+    if not provider.available():
+        print("Error: ELEVEN_LABS_API_KEY not found in environment variables")
+        return None
+
+    try:
+        data = tts_request_data(text, model_id)
+        with metered("tts", "elevenlabs", model_id, "characters") as usage:
+            response = await call_provider_async(
+                "elevenlabs", provider.synthesize_async, voice_id, data
+            )
+            if response.status_code == 200:
+                usage["units"] = len(text)
+
+        if response.status_code == 200:
+            return await run_in_thread(
+                save_speech, cache_key, response.content, text, voice_id, model_id
+            )
         else:
             print(f"Error generating audio: {response.status_code}")
             print(response.text)
             return None
 
+    except CircuitOpenError as e:
+        print(f"Skipping narration: {e}")
+        return None
+
     except Exception as e:
         print(f"Error in TTS generation: {e}")
         return None
+
+
+def save_speech(cache_key, content, text, voice_id, model_id):
+    """Add generated narration to the narration cache and return its URL."""
+    audio = AudioCache.save_audio(
+        cache_key,
+        content,
+        text,
+        voice_id,
+        model_id,
+        TTS_VOICE_SETTINGS,
+    )
+    print(f"Audio generated successfully: {audio.url_path}")
+    return audio.url_path
+
+
+def open_speech_stream(text, voice_id=DEFAULT_VOICE_ID):
+    """
+    Start streaming narration for a text.
+
+    Cached narration is read from disk. Otherwise the audio is relayed from
+    ElevenLabs' streaming endpoint as it is synthesized, and teed to a file that
+    is added to the narration cache once the stream completes.
+
+    Args:
+        text: The text to convert to speech
+        voice_id: The voice ID to use (default is 'Rachel')
+
+    Returns:
+        Iterator of MP3 chunks, or None if narration is unavailable
+    """
+    model_id = tts_model_id()
+    cached_audio = AudioCache.get_audio(speech_cache_key(text, voice_id, model_id))
+    if cached_audio:
+        audio_path = os.path.join(AudioCache.get_static_audio_dir(), cached_audio.filename)
+        return read_file_chunks(audio_path)
+
+    provider = get_provider("speech")
+    if not provider.available():
+        print("Error: ELEVEN_LABS_API_KEY not found in environment variables")
+        return None
+
+    try:
+        # Only the response headers are awaited here; the body streams afterwards
+        with metered("tts_stream", "elevenlabs", model_id, "characters") as usage:
+            response = call_provider(
+                "elevenlabs",
+                provider.synthesize,
+                voice_id,
+                tts_request_data(text, model_id),
+                stream=True,
+            )
+            if response.status_code == 200:
+                usage["units"] = len(text)
+    except CircuitOpenError as e:
+        print(f"Skipping narration: {e}")
+        return None
+    except Exception as e:
+        print(f"Error starting TTS stream: {e}")
+        return None
+
+    if response.status_code != 200:
+        print(f"Error streaming audio: {response.status_code}")
+        print(response.text)
+        response.close()
+        return None
+
+    return tee_speech_stream(response, text, voice_id, model_id)
+
+
+def read_file_chunks(path):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_BYTES), b""):
+            yield chunk
+
+
+def tee_speech_stream(response, text, voice_id, model_id):
+    """
+    Relay a streaming TTS response while writing it to disk.
+
+    If the listener goes away mid-stream, the rest of the audio is still
+    downloaded so the narration ends up in the cache for the next student.
+    """
+    temp_path = os.path.join(AudioCache.get_static_audio_dir(), f"{uuid.uuid4()}.part")
+    completed = False
+    try:
+        with open(temp_path, "wb") as f:
+            chunks = response.iter_content(chunk_size=STREAM_CHUNK_BYTES)
+            try:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            except GeneratorExit:
+                for chunk in chunks:
+                    f.write(chunk)
+            completed = True
+    except Exception as e:
+        print(f"Error streaming narration: {e}")
+    finally:
+        response.close()
+        try:
+            if completed:
+                audio = AudioCache.save_audio_file(
+                    speech_cache_key(text, voice_id, model_id),
+                    temp_path,
+                    text,
+                    voice_id,
+                    model_id,
+                    TTS_VOICE_SETTINGS,
+                )
+                print(f"Streamed narration cached: {audio.url_path}")
+            elif os.path.exists(temp_path):
+                os.remove(temp_path)
+        except Exception as e:
+            print(f"Error caching streamed narration: {e}")
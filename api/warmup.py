@@ -0,0 +1,325 @@
+"""
+Assignment warm-up: pre-render the scene tree of an assignment in the background
+so that the first students to join never wait on the generation pipeline.
+
+Jobs are stored in the warmup_jobs table. Every scene goes through the scene
+cache, so a job that is interrupted by a restart can simply be run again: the
+scenes it already produced are cache hits and it continues where it stopped.
+
+The narratives of a scene's three children are written in one batched writer
+call, so each level of the tree costs one LLM round-trip per parent scene.
+"""
+
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from api.ledger import assignment_context, scene_cost_estimate
+from api.rate_limiter import PRIORITY_BACKGROUND, request_priority
+from api.scene_builder import (
+    child_partial_narrative,
+    get_cached_scene,
+    get_or_create_scene,
+    initial_partial_narrative,
+)
+from api.timing import scenario_context
+from api.tracing import traced
+from api.writer_agent import generate_child_narratives
+from database.models import db, WarmupJob
+
+# Decision levels to pre-generate below the first scene (0 = first scene only)
+WARMUP_DEPTH = int(os.environ.get("WARMUP_DEPTH", "0"))
+
+# Deepest warm-up anyone may request; the tree triples with every level
+# (3 levels = 40 scenes), so deeper requests are cut to this
+WARMUP_MAX_DEPTH = int(os.environ.get("WARMUP_MAX_DEPTH", "3"))
+
+# Whether creating an assignment starts a warm-up job automatically
+WARMUP_ON_CREATE = os.environ.get("WARMUP_ON_CREATE", "true").lower() == "true"
+
+# Whether the web app resumes queued and interrupted jobs when a worker starts
+# (on the worker's first request)
+WARMUP_RESUME_ON_START = (
+    os.environ.get("WARMUP_RESUME_ON_START", "true").lower() == "true"
+)
+
+# Most a warm-up job may spend, in USD estimated from the cost ledger; trees
+# that would cost more are pre-generated less deep (0 = no limit)
+WARMUP_BUDGET_USD = float(os.environ.get("WARMUP_BUDGET_USD", "0"))
+
+# A running job that has not reported progress for this long is treated as
+# abandoned (e.g. the worker running it was restarted) and may be picked up again
+WARMUP_STALE_SECONDS = int(os.environ.get("WARMUP_STALE_SECONDS", "900"))
+
+
+def count_scenes(depth):
+    """Number of scenes in a tree of three options per scene, `depth` levels deep."""
+    return sum(3**level for level in range(depth + 1))
+
+
+def parse_depth(depth=None):
+    """
+    Warm-up depth to use for a requested one (e.g. from a request body).
+
+    Args:
+        depth: Requested decision levels (defaults to WARMUP_DEPTH); negative
+            depths become 0 and depths above WARMUP_MAX_DEPTH are cut to it
+
+    Raises:
+        ValueError: if `depth` is not a whole number
+    """
+    if depth is None:
+        depth = WARMUP_DEPTH
+    if isinstance(depth, bool) or (
+        isinstance(depth, float) and not depth.is_integer()
+    ):
+        raise ValueError(f"Invalid warm-up depth: {depth!r}")
+    try:
+        depth = int(depth)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid warm-up depth: {depth!r}") from None
+    if depth > WARMUP_MAX_DEPTH:
+        print(f"Warm-up depth {depth} limited to WARMUP_MAX_DEPTH ({WARMUP_MAX_DEPTH})")
+        return WARMUP_MAX_DEPTH
+    return max(0, depth)
+
+
+def affordable_depth(scenario, depth):
+    """
+    Deepest tree, at most `depth` levels, whose estimated cost fits the budget.
+
+    Scenes are priced at the average recorded cost of a background-generated
+    scene; cached scenes cost nothing, so this errs on the safe side.
+    """
+    if not WARMUP_BUDGET_USD:
+        return depth
+    scene_cost = scene_cost_estimate(scenario, PRIORITY_BACKGROUND)
+    if not scene_cost:
+        return depth
+    while depth > 0 and count_scenes(depth) * scene_cost > WARMUP_BUDGET_USD:
+        depth -= 1
+    return depth
+
+
+def queue_warmup(assignment, depth=None):
+    """
+    Create a warm-up job for an assignment.
+
+    Args:
+        assignment: The Assignment to pre-render
+        depth: Decision levels to pre-generate (defaults to WARMUP_DEPTH, at
+            most WARMUP_MAX_DEPTH)
+
+    Returns:
+        The new WarmupJob
+
+    Raises:
+        ValueError: if `depth` is not a whole number
+    """
+    depth = parse_depth(depth)
+    affordable = affordable_depth(assignment.scenario, depth)
+    if affordable < depth:
+        print(
+            f"Warm-up of '{assignment.scenario}' limited to depth {affordable} "
+            f"by the ${WARMUP_BUDGET_USD:.2f} budget"
+        )
+        depth = affordable
+    job = WarmupJob(
+        assignment_id=assignment.id,
+        scenario=assignment.scenario,
+        depth=depth,
+        status="queued",
+        scenes_total=count_scenes(depth),
+        scenes_done=0,
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def latest_warmup(assignment_id):
+    """Return the most recent warm-up job for an assignment, or None."""
+    return (
+        WarmupJob.query.filter_by(assignment_id=assignment_id)
+        .order_by(WarmupJob.id.desc())
+        .first()
+    )
+
+
+def claim_job(job_id, force=False):
+    """
+    Atomically mark a queued or abandoned job as running.
+
+    The conditional UPDATE makes sure only one worker runs a job even when
+    several processes try to resume it at the same time.
+
+    Args:
+        job_id: ID of the WarmupJob to claim
+        force: Also claim running jobs that are not stale yet (for operators
+            who know the previous worker is gone)
+
+    Returns:
+        True if this caller now owns the job
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=WARMUP_STALE_SECONDS)
+    if force:
+        stale_before = datetime.max
+    claimed = WarmupJob.query.filter(
+        WarmupJob.id == job_id,
+        or_(
+            WarmupJob.status == "queued",
+            and_(WarmupJob.status == "running", WarmupJob.updated_at < stale_before),
+        ),
+    ).update(
+        {"status": "running", "error": None, "updated_at": datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+@traced("warmup")
+def run_warmup(job_id, force=False):
+    """
+    Run a warm-up job to completion in the current thread.
+
+    The scene tree is walked breadth-first so the first scene (the one every
+    student sees) is ready as early as possible.
+
+    Args:
+        job_id: ID of the WarmupJob to run
+        force: Take over the job even if another worker claimed it recently
+
+    Returns:
+        True if the job ran, False if it could not be claimed
+    """
+    if not claim_job(job_id, force):
+        print(f"Warm-up job {job_id} is already running or finished")
+        return False
+
+    job = WarmupJob.query.get(job_id)
+    print(f"Warming up '{job.scenario}' to depth {job.depth} (job {job.id})")
+
+    try:
+        scenes_done = 0
+        frontier = [(initial_partial_narrative(job.scenario), None, None, None)]
+
+        for level in range(job.depth + 1):
+            next_frontier = []
+            for partial_narrative_obj, decision_id, previous_media, written in frontier:
+                with assignment_context(job.assignment_id):
+                    narrative, _, media_data, _ = get_or_create_scene(
+                        job.scenario,
+                        partial_narrative_obj,
+                        decision_id,
+                        previous_media,
+                        written,
+                    )
+
+                # Report progress; this also refreshes the job's heartbeat
+                scenes_done += 1
+                job.scenes_done = scenes_done
+                db.session.commit()
+
+                if level < job.depth:
+                    reached = dict(partial_narrative_obj, last_narrative=narrative)
+                    children = [
+                        (child_partial_narrative(reached, option), option["id"])
+                        for option in narrative["options"]
+                    ]
+                    # One writer call for all children that still need a scene
+                    child_narratives = {}
+                    if any(
+                        not get_cached_scene(job.scenario, json.dumps(child))
+                        for child, _ in children
+                    ):
+                        with scenario_context(job.scenario), assignment_context(
+                            job.assignment_id
+                        ):
+                            child_narratives = (
+                                generate_child_narratives(narrative, job.scenario)
+                                or {}
+                            )
+                    for child, option_id in children:
+                        next_frontier.append(
+                            (
+                                child,
+                                option_id,
+                                media_data,
+                                child_narratives.get(option_id),
+                            )
+                        )
+            frontier = next_frontier
+
+        job.status = "completed"
+        print(f"Warm-up job {job.id} completed ({scenes_done} scenes)")
+    except Exception as e:
+        print(f"Error in warm-up job {job_id}: {e}")
+        db.session.rollback()
+        job = WarmupJob.query.get(job_id)
+        job.status = "failed"
+        job.error = str(e)
+
+    db.session.commit()
+    return True
+
+
+def start_warmup(app, job_id):
+    """Run a warm-up job in a background thread."""
+
+    def run():
+        # Students' requests are served before warm-up calls to the providers
+        with app.app_context(), request_priority(PRIORITY_BACKGROUND):
+            run_warmup(job_id)
+
+    thread = threading.Thread(target=run, name=f"warmup-{job_id}", daemon=True)
+    thread.start()
+    return thread
+
+
+def resume_warmups(app):
+    """
+    Restart warm-up jobs that were queued or interrupted by a restart.
+
+    Returns:
+        Number of jobs started
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=WARMUP_STALE_SECONDS)
+    with app.app_context():
+        jobs = WarmupJob.query.filter(
+            or_(
+                WarmupJob.status == "queued",
+                and_(
+                    WarmupJob.status == "running",
+                    WarmupJob.updated_at < stale_before,
+                ),
+            )
+        ).all()
+        job_ids = [job.id for job in jobs]
+
+    for job_id in job_ids:
+        print(f"Resuming warm-up job {job_id}")
+        start_warmup(app, job_id)
+    return len(job_ids)
+
+
+def resume_warmups_on_first_request(app):
+    """
+    Resume interrupted warm-up jobs on the first request a process serves.
+
+    Waiting for a request rather than resuming when the app is created keeps
+    job threads and database connections out of a pre-fork server's master
+    process and out of CLI commands. Every worker resumes the jobs, and the
+    claim in run_warmup makes sure each job runs in only one of them.
+    """
+    lock = threading.Lock()
+    resumed = []
+
+    @app.before_request
+    def resume_once():
+        with lock:
+            if resumed:
+                return
+            resumed.append(True)
+        resume_warmups(app)
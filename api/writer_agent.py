@@ -1,14 +1,7 @@
-import os
-import json
-import google.genai as genai
-from dotenv import load_dotenv
-from google.genai import types
-
-# Load environment variables
-load_dotenv()
-
-# Configure Gemini API
-client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+from api.ledger import record_fallback
+from api.llm import GEMINI_MODEL, parse_json, send_prompt, send_prompt_async
+from api.rate_limiter import QueueSaturated
+from api.timing import timed
 
 # Writer Agent (Historical Narrative Generator) system prompt
 WRITER_SYSTEM_PROMPT = """
@@ -32,6 +25,46 @@ IMPORTANT GUIDELINES:
 Your narratives should make the player feel they're at the center of a fast-moving historical situation, while remaining informative from a learning perspective.
 """
 
+# Batch mode: the continuations of all three options of a scene in one reply
+WRITER_BATCH_SYSTEM_PROMPT = (
+    WRITER_SYSTEM_PROMPT
+    + """
+BATCH MODE: You will be given one narrative and its three decision options. Write the continuation for EACH option, as if the player had chosen it. Every continuation follows all of the guidelines above. Your output must then be valid JSON in the following format instead:
+
+{
+  "continuations": [
+      { "option_id": "1", "scene_id": <integer>, "narrative": "<...>", "options": [<three options as above>] },
+      { "option_id": "2", "scene_id": <integer>, "narrative": "<...>", "options": [<three options as above>] },
+      { "option_id": "3", "scene_id": <integer>, "narrative": "<...>", "options": [<three options as above>] }
+  ]
+}
+"""
+)
+
+
+def narrative_prompt(previous_narrative, decision_id, scenario=None):
+    """Prompt asking for the scene that follows a decision (or the first scene)."""
+    if previous_narrative is None:
+        # Initial narrative generation
+        return f"Generate the initial scenario for '{scenario}'. Focus on the first critical decision point with high tension and urgency."
+
+    # Generate continuation based on previous narrative and decision
+    option_text = next(
+        (
+            opt["option"]
+            for opt in previous_narrative["options"]
+            if opt["id"] == decision_id
+        ),
+        "",
+    )
+    return f"""
+        Previous narrative: {previous_narrative['narrative']}
+        Player's decision: {option_text}
+        
+        Generate the next fast-paced narrative segment and three new decision options. 
+        Keep it brief and impactful - focus on the immediate consequences and the next critical choice.
+        """
+
 
 def generate_narrative(previous_narrative, decision_id, scenario=None):
     """
@@ -43,75 +76,136 @@ def generate_narrative(previous_narrative, decision_id, scenario=None):
         scenario: The historical scenario to generate (e.g., "Cuban Missile Crisis")
 
     Returns:
-        JSON object with the new narrative state
+        Tuple of (new narrative state, whether it is the fallback narrative)
     """
+    prompt = narrative_prompt(previous_narrative, decision_id, scenario)
 
-    # Create a new chat with system instruction
-    chat = client.chats.create(
-        model="gemini-2.0-flash",
-        config=types.GenerateContentConfig(system_instruction=WRITER_SYSTEM_PROMPT),
-    )
-
-    if previous_narrative is None:
-        # Initial narrative generation
-        prompt = f"Generate the initial scenario for '{scenario}'. Focus on the first critical decision point with high tension and urgency."
-    else:
-        # Generate continuation based on previous narrative and decision
-        option_text = next(
-            (
-                opt["option"]
-                for opt in previous_narrative["options"]
-                if opt["id"] == decision_id
-            ),
-            "",
+    # Get response from Gemini, falling back right away if it is unavailable or
+    # invalid. Students wait on this call, so slow replies are hedged.
+    try:
+        narrative = send_prompt(
+            WRITER_SYSTEM_PROMPT,
+            prompt,
+            parse_narrative,
+            operation="narrative",
+            hedge=True,
         )
-        prompt = f"""
-        Previous narrative: {previous_narrative['narrative']}
-        Player's decision: {option_text}
-        
-        Generate the next fast-paced narrative segment and three new decision options. 
-        Keep it brief and impactful - focus on the immediate consequences and the next critical choice.
-        """
+    except QueueSaturated:
+        raise
+    except Exception as e:
+        print(f"Error generating narrative: {e}")
+        record_fallback("narrative", "gemini", GEMINI_MODEL)
+        return fallback_narrative(previous_narrative, scenario), True
+    return narrative, False
 
-    # Get response from Gemini
-    response = chat.send_message(prompt)
 
+async def generate_narrative_async(previous_narrative, decision_id, scenario=None):
+    """Like generate_narrative(), awaiting Gemini instead of blocking a thread."""
+    prompt = narrative_prompt(previous_narrative, decision_id, scenario)
     try:
-        # Parse the response
-        content = response.text
-
-        # Extract JSON from the response (may be wrapped in markdown code blocks)
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
+        narrative = await send_prompt_async(
+            WRITER_SYSTEM_PROMPT,
+            prompt,
+            parse_narrative,
+            operation="narrative",
+            hedge=True,
+        )
+    except QueueSaturated:
+        raise
+    except Exception as e:
+        print(f"Error generating narrative: {e}")
+        record_fallback("narrative", "gemini", GEMINI_MODEL)
+        return fallback_narrative(previous_narrative, scenario), True
+    return narrative, False
 
-        # Parse the JSON
-        narrative_data = json.loads(content)
 
-        # Validate the response format
-        assert "scene_id" in narrative_data
-        assert "narrative" in narrative_data
-        assert "options" in narrative_data
-        assert len(narrative_data["options"]) == 3
+def generate_child_narratives(narrative, scenario=None):
+    """
+    Generate the continuations of all three options of a scene in one call.
 
-        return narrative_data
+    The shared context (system prompt and narrative) is sent once instead of
+    once per option. Used to pre-generate a level of the scene tree.
 
-    except (json.JSONDecodeError, AssertionError) as e:
-        print(f"Error generating narrative: {e}")
-        print(f"Raw response: {response.text}")
+    Args:
+        narrative: The narrative state whose options are continued
+        scenario: The historical scenario (e.g., "Cuban Missile Crisis")
 
-        # Fallback to a default response if the AI response is not valid
-        scene_id = (
-            1 if previous_narrative is None else previous_narrative["scene_id"] + 1
-        )
+    Returns:
+        Dictionary of option ID -> narrative state, or None if the batch call
+        failed (callers then generate the continuations one by one)
+    """
+    options = "\n".join(
+        f'{option["id"]}. {option["option"]}' for option in narrative["options"]
+    )
+    prompt = f"""
+        Scenario: {scenario or 'historical'}
+        Previous narrative: {narrative['narrative']}
+        Decision options:
+        {options}
+
+        For each option, generate the next fast-paced narrative segment and three new decision options.
+        Keep each one brief and impactful - focus on the immediate consequences and the next critical choice.
+        """
 
-        return {
-            "scene_id": scene_id,
-            "narrative": f"A critical moment in the {scenario or 'historical'} scenario unfolds. Time for a quick decision.",
-            "options": [
-                {"id": "1", "option": "Take immediate action"},
-                {"id": "2", "option": "Consult with advisors first"},
-                {"id": "3", "option": "Consider an alternative approach"},
-            ],
-        }
+    option_ids = [option["id"] for option in narrative["options"]]
+    try:
+        # Only speculative work batches, so the call is not hedged
+        with timed("writer_batch", provider="gemini"):
+            return send_prompt(
+                WRITER_BATCH_SYSTEM_PROMPT,
+                prompt,
+                lambda text: parse_child_narratives(text, option_ids),
+                operation="narrative_batch",
+            )
+    except QueueSaturated:
+        raise
+    except Exception as e:
+        print(f"Error generating child narratives: {e}")
+        return None
+
+
+def validate_narrative(narrative_data):
+    """Check that a narrative has the fields and three options the game needs."""
+    assert "scene_id" in narrative_data
+    assert "narrative" in narrative_data
+    assert "options" in narrative_data
+    assert len(narrative_data["options"]) == 3
+
+
+def parse_narrative(text):
+    """Parse and validate a narrative reply from Gemini."""
+    narrative_data = parse_json(text)
+
+    # Validate the response format
+    validate_narrative(narrative_data)
+
+    return narrative_data
+
+
+def parse_child_narratives(text, option_ids):
+    """Parse and validate a batch reply: one narrative per option ID."""
+    continuations = parse_json(text)["continuations"]
+
+    children = {}
+    for continuation in continuations:
+        option_id = str(continuation.pop("option_id"))
+        validate_narrative(continuation)
+        children[option_id] = continuation
+    assert sorted(children) == sorted(option_ids)
+
+    return children
+
+
+def fallback_narrative(previous_narrative, scenario=None):
+    """Default narrative used when Gemini is unavailable or returns invalid JSON."""
+    scene_id = 1 if previous_narrative is None else previous_narrative["scene_id"] + 1
+
+    return {
+        "scene_id": scene_id,
+        "narrative": f"A critical moment in the {scenario or 'historical'} scenario unfolds. Time for a quick decision.",
+        "options": [
+            {"id": "1", "option": "Take immediate action"},
+            {"id": "2", "option": "Consult with advisors first"},
+            {"id": "3", "option": "Consider an alternative approach"},
+        ],
+    }
@@ -1,25 +1,54 @@
 import json
 import os
+import threading
 import uuid
 from functools import wraps
 
-# 1. Import Authlib
-from authlib.integrations.flask_client import OAuth
+import click
 from dotenv import load_dotenv
-from flask import Flask, jsonify, redirect, render_template, request, session, url_for
+from flask import (
+    Flask,
+    Response,
+    current_app,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    session,
+    stream_with_context,
+    url_for,
+)
 from flask_cors import CORS
 from sqlalchemy import text
 
-from api.media_generator import concatenate_videos, generate_scene_videos
-from api.producer_agent import generate_scene_prompts
-from api.writer_agent import generate_narrative
+from api import metrics
+from api.circuit_breaker import breaker_states
+from api.ledger import assignment_context
+from api.rate_limiter import QueueSaturated, queue_depths
+from api.renditions import hls_url_for
+from api.timing import scenario_context, timed
+from api.tracing import traced
+from api.tts_agent import STREAMING_TTS, cached_speech_url, open_speech_stream
+from api.scene_builder import (
+    get_or_create_scene,
+    get_or_create_scene_async,
+    initial_partial_narrative,
+)
+from api.warmup import (
+    WARMUP_ON_CREATE,
+    WARMUP_RESUME_ON_START,
+    latest_warmup,
+    parse_depth,
+    queue_warmup,
+    resume_warmups_on_first_request,
+    start_warmup,
+)
 from database.models import (
     db,
     Session as GameSession,
     NarrativeData,
     ScenePrompt,
     MediaUrl,
-    SceneCache,
     Teacher,
     Student,
     Assignment,
@@ -27,39 +56,106 @@ from database.models import (
     QuestionResponse,
 )
 import database
-from api.tts_agent import generate_speech
-from api.quiz_agent import generate_quiz_question, get_fallback_question
+from database import run_in_thread
+from api.quiz_agent import (
+    generate_quiz_question,
+    generate_quiz_question_async,
+    get_fallback_question,
+)
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__, static_folder="static", template_folder="templates")
-CORS(app)
-app.secret_key = os.environ.get("APP_SECRET_KEY", "fallback-secret-key")
+# Routes, registered on the app by create_app: (rule, view function, options)
+ROUTES = []
+
+# Coroutine functions serving routes under the ASGI app (see asgi.py), by endpoint
+ASYNC_VIEWS = {}
+
+
+def route(rule, **options):
+    """Like app.route, for the app create_app will build."""
+
+    def decorator(f):
+        ROUTES.append((rule, f, options))
+        return f
+
+    return decorator
+
+
+def async_view(endpoint):
+    """
+    Serve an endpoint with a coroutine function when the app runs under the
+    ASGI server; the endpoint's view function still serves it under WSGI.
+    """
+
+    def decorator(f):
+        ASYNC_VIEWS[endpoint] = f
+        return f
 
-# Initialize database with SQLAlchemy
-database.init_app(app)
+    return decorator
 
-# Add Flask-Migrate support
-from flask_migrate import Migrate
 
-migrate = Migrate(app, db)
+def create_app():
+    """
+    Create the web application.
+
+    Creating it does no database, provider or network work, so it is fast and
+    safe to do once in the master process of a pre-fork server before forking
+    the workers (gunicorn --preload "app:create_app()"): the schema is set up
+    by `flask setup-db`, providers and the Auth0 client are built on first use,
+    and interrupted warm-up jobs are resumed on each worker's first request.
+    """
+    app = Flask(__name__, static_folder="static", template_folder="templates")
+    CORS(app)
+    app.secret_key = os.environ.get("APP_SECRET_KEY", "fallback-secret-key")
+
+    # Initialize database with SQLAlchemy
+    database.init_app(app)
+
+    # Add Flask-Migrate support to the flask command; Alembic is slow to
+    # import, and servers have no use for it
+    if click.get_current_context(silent=True):
+        from flask_migrate import Migrate
+
+        Migrate(app, db)
+
+    for rule, view_func, options in ROUTES:
+        app.add_url_rule(rule, view_func=view_func, **options)
+    app.register_error_handler(QueueSaturated, handle_queue_saturated)
+
+    # Pick up assignment warm-up jobs interrupted by a restart
+    if WARMUP_RESUME_ON_START:
+        resume_warmups_on_first_request(app)
+
+    return app
+
 
 # ---------------------
 # 2. Setup OAuth Client
 # ---------------------
-oauth = OAuth(app)
-
-oauth.register(
-    "auth0",
-    client_id=os.environ.get("AUTH0_CLIENT_ID"),
-    client_secret=os.environ.get("AUTH0_CLIENT_SECRET"),
-    client_kwargs={
-        "scope": "openid profile email",
-    },
-    # This retrieves the Auth0 OIDC configuration dynamically
-    server_metadata_url=f'https://{os.environ.get("AUTH0_DOMAIN")}/.well-known/openid-configuration',
-)
+_oauth_lock = threading.Lock()
+
+
+def auth0():
+    """The app's Auth0 client, registered on first use (Authlib is slow to import)."""
+    with _oauth_lock:
+        oauth = current_app.extensions.get("authlib.integrations.flask_client")
+        if oauth is None:
+            from authlib.integrations.flask_client import OAuth
+
+            oauth = OAuth(current_app)
+            oauth.register(
+                "auth0",
+                client_id=os.environ.get("AUTH0_CLIENT_ID"),
+                client_secret=os.environ.get("AUTH0_CLIENT_SECRET"),
+                client_kwargs={
+                    "scope": "openid profile email",
+                },
+                # This retrieves the Auth0 OIDC configuration dynamically
+                server_metadata_url=f'https://{os.environ.get("AUTH0_DOMAIN")}/.well-known/openid-configuration',
+            )
+    return oauth.auth0
 
 
 # --------------------
@@ -78,10 +174,20 @@ def requires_auth(f):
     return decorated
 
 
+def handle_queue_saturated(e):
+    """Tell clients to back off while the generation providers are saturated."""
+    response = jsonify(
+        {"error": "The server is busy generating scenes, please retry shortly"}
+    )
+    response.status_code = 429
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
 # --------------------
 # 4. Auth Routes
 # --------------------
-@app.route("/login")
+@route("/login")
 def login():
     """
     Redirects the user to Auth0's hosted login page.
@@ -90,18 +196,18 @@ def login():
     role = request.args.get("role", "student")
     session["pending_role"] = role
 
-    return oauth.auth0.authorize_redirect(
+    return auth0().authorize_redirect(
         redirect_uri=url_for("callback", _external=True)
     )
 
 
-@app.route("/callback")
+@route("/callback")
 def callback():
     """
     Handles the callback from Auth0. It will exchange the 'code' for valid tokens,
     store them in session, and then redirect to your protected route.
     """
-    token = oauth.auth0.authorize_access_token()
+    token = auth0().authorize_access_token()
     session["user"] = token
 
     # Get user details from Auth0
@@ -163,7 +269,7 @@ def callback():
     return redirect(url_for("index"))
 
 
-@app.route("/")
+@route("/")
 def index():
     """Render the role selection page."""
     if "user" in session and "user_type" in session:
@@ -173,13 +279,13 @@ def index():
     return render_template("role_select.html")
 
 
-@app.route("/view-scenarios")
+@route("/view-scenarios")
 def view_scenarios():
     """View all scenarios without requiring login."""
     return render_template("index.html")
 
 
-@app.route("/dashboard")
+@route("/dashboard")
 @requires_auth
 def dashboard():
     """Unified dashboard for both teachers and students."""
@@ -197,7 +303,7 @@ def dashboard():
         return redirect(url_for("index"))
 
 
-@app.route("/logout")
+@route("/logout")
 def logout():
     """
     Logs the user out (clears local session) and also logs them out of Auth0.
@@ -212,120 +318,131 @@ def logout():
     )
 
 
-@app.route("/api/start", methods=["POST"])
-def start_game():
+def attach_scene(
+    game_session, partial_narrative_obj, narrative, scene_prompts, media_data
+):
     """
-    Start a new game session by creating a 'partial_narrative' that includes:
-      - the scenario
-      - no prior narrative yet
-      - empty decision_history
-    Look up (scenario, partial_narrative) in cache. If found, reuse. Otherwise, generate.
+    Make `narrative` the current scene of a game session (caller commits).
+
+    Args:
+        game_session: The GameSession to update
+        partial_narrative_obj: The session's partial narrative; last_narrative is set to `narrative`
+        narrative: The scene narrative
+        scene_prompts: The scene prompts for the narrative
+        media_data: The media URLs for the scene
     """
-    session_id = str(uuid.uuid4())
-    session["session_id"] = session_id
+    partial_narrative_obj["last_narrative"] = narrative
+    game_session.partial_narrative = json.dumps(partial_narrative_obj)
+    game_session.current_scene_id = narrative["scene_id"]
 
-    scenario = request.json.get("scenario", "Cuban Missile Crisis")
-    print(f"\n=== Starting new game: {scenario} ===")
+    if game_session.narrative_data:
+        game_session.narrative_data.data = json.dumps(narrative)
+    else:
+        db.session.add(
+            NarrativeData(session_id=game_session.id, data=json.dumps(narrative))
+        )
 
-    # 1) Create an empty partial_narrative for the initial scene
-    partial_narrative_obj = {
-        "scenario": scenario,
-        "last_narrative": None,  # no prior scene
-        "decision_history": [],
-    }
-    partial_narrative_str = json.dumps(partial_narrative_obj)
+    if game_session.scene_prompts:
+        game_session.scene_prompts.data = json.dumps(scene_prompts)
+    else:
+        db.session.add(
+            ScenePrompt(session_id=game_session.id, data=json.dumps(scene_prompts))
+        )
 
-    # 2) Create a record for this session using SQLAlchemy
-    game_session = GameSession(
-        id=session_id,
-        scenario=scenario,
-        current_scene_id=0,
-        partial_narrative=partial_narrative_str,
-    )
-    db.session.add(game_session)
-    db.session.commit()
+    if game_session.media_urls:
+        game_session.media_urls.data = json.dumps(media_data)
+    else:
+        db.session.add(
+            MediaUrl(session_id=game_session.id, data=json.dumps(media_data))
+        )
 
-    # 3) Check the cache using SQLAlchemy query
-    cache_entry = SceneCache.query.filter_by(
-        scenario=scenario, partial_narrative=partial_narrative_str
-    ).first()
 
-    if cache_entry:
-        # Reuse what we previously generated
-        print("Found cached initial scene for scenario:", scenario)
-        new_narrative = cache_entry.next_narrative_obj
-        scene_prompts = cache_entry.next_scene_prompts_obj
-        media_data = cache_entry.next_media_urls_obj
-        cached = True
-    else:
-        # Generate a new initial scene
-        new_narrative = generate_narrative(None, None, scenario)
-        scene_prompts = generate_scene_prompts(new_narrative["narrative"])
-        video_urls = generate_scene_videos(scene_prompts)
-        combined_video_url = concatenate_videos(video_urls)
-
-        # Generate audio for narrative
-        audio_url = generate_speech(new_narrative["narrative"])
-
-        media_data = {
-            "individual_videos": video_urls,
-            "combined_video": combined_video_url,
-            "audio": audio_url,
-        }
+def scene_media_fields(media_data, narrative):
+    """
+    Media fields of a scene response.
 
-        # Store in scene_cache for next time
-        new_cache = SceneCache(
-            scenario=scenario,
-            partial_narrative=partial_narrative_str,
-            next_narrative=json.dumps(new_narrative),
-            next_scene_prompts=json.dumps(scene_prompts),
-            next_media_urls=json.dumps(media_data),
-        )
-        db.session.add(new_cache)
-        db.session.commit()
-        cached = False
+    media_tier tells the client what it got: "video" or "pan_zoom" (play
+    `media`), "image" (show `image` with the narration) or "text". Scenes cached
+    before tiers existed are full videos.
 
-    # 4) Update partial_narrative with the newly generated scene
-    partial_narrative_obj["last_narrative"] = new_narrative
-    updated_partial_narrative_str = json.dumps(partial_narrative_obj)
+    Scenes without a narration file get the streaming narration endpoint as
+    their `audio`; the scene id keeps browsers from reusing an earlier scene's
+    stream. When `narration_in_media` is set, the narration is the audio
+    track of `media` and there is no separate `audio`.
 
-    # 5) Update the session record with the new data using SQLAlchemy
-    game_session.current_scene_id = new_narrative["scene_id"]
-    game_session.partial_narrative = updated_partial_narrative_str
+    Full videos whose adaptive bitrate renditions are ready also get
+    `media_hls`, an HLS master playlist the client prefers over `media`.
+    """
+    first_frames = media_data.get("first_frames") or []
+    tier = media_data.get("tier", "video")
+    media_hls = hls_url_for(media_data.get("combined_video")) if tier == "video" else None
+    narration_in_media = bool(media_data.get("narration_in_video"))
+    audio = media_data.get("audio")
+    if not audio and STREAMING_TTS and not narration_in_media:
+        audio = url_for("stream_narration", scene=narrative["scene_id"])
+    return {
+        "media": media_data.get("combined_video"),
+        "audio": audio,
+        "media_hls": media_hls,
+        "narration_in_media": narration_in_media,
+        "media_tier": tier,
+        "image": first_frames[0] if first_frames else None,
+    }
 
-    # Create related records
-    narrative_data = NarrativeData(
-        session_id=session_id, data=json.dumps(new_narrative)
-    )
 
-    scene_prompt = ScenePrompt(session_id=session_id, data=json.dumps(scene_prompts))
+def new_game():
+    """
+    Read the scenario of a new game and build its 'partial_narrative', which
+    includes:
+      - the scenario
+      - no prior narrative yet
+      - empty decision_history
 
-    media_url = MediaUrl(session_id=session_id, data=json.dumps(media_data))
+    Returns:
+        Tuple of (scenario, partial_narrative_obj)
+    """
+    scenario = request.json.get("scenario", "Cuban Missile Crisis")
+    print(f"\n=== Starting new game: {scenario} ===")
 
-    db.session.add_all([narrative_data, scene_prompt, media_url])
-    db.session.commit()
+    # The partial_narrative of the initial scene is also its cache key
+    return scenario, initial_partial_narrative(scenario)
 
-    return jsonify(
-        {
-            "session_id": session_id,
-            "narrative": new_narrative,
-            "media": media_data["combined_video"],
-            "audio": media_data.get("audio"),
-            "cached": cached,
-        }
+
+def create_game_session(scenario, partial_narrative_obj):
+    """
+    Create the record of a new game session and make it the player's session.
+
+    Called once the initial scene is ready, so a start rejected by admission
+    control (429) or failing in generation leaves no session behind.
+
+    Returns:
+        The new session_id
+    """
+    session_id = str(uuid.uuid4())
+    game_session = GameSession(
+        id=session_id,
+        scenario=scenario,
+        current_scene_id=0,
+        partial_narrative=json.dumps(partial_narrative_obj),
     )
+    db.session.add(game_session)
+    db.session.commit()
+    session["session_id"] = session_id
+    return session_id
 
 
-@app.route("/api/decision", methods=["POST"])
-def make_decision():
+def prepare_decision():
     """
-    Process the player's decision. We'll read 'partial_narrative' from the session row,
-    update the decision_history, then check the cache using that as the key.
-    If it doesn't exist, we generate the next scene. If it does, we reuse it.
+    Read the player's decision and add it to the decision history of the
+    session's 'partial_narrative', which is then the cache key of the next scene.
+
+    Returns:
+        Tuple of (error response, None) or (None, decision), where decision is
+        a dictionary of what generating the next scene needs
     """
     session_id = session.get("session_id")
     if not session_id:
-        return jsonify({"error": "No active session"}), 400
+        return (jsonify({"error": "No active session"}), 400), None
 
     decision_id = request.json.get("decision")
     current_scene_id = request.json.get("scene_id")
@@ -333,12 +450,12 @@ def make_decision():
     # Query for session data using SQLAlchemy
     game_session = GameSession.query.get(session_id)
     if not game_session:
-        return jsonify({"error": "Session not found"}), 404
+        return (jsonify({"error": "Session not found"}), 404), None
 
     scenario = game_session.scenario
     partial_narrative_str = game_session.partial_narrative
     if not partial_narrative_str:
-        return jsonify({"error": "No partial_narrative found in session"}), 400
+        return (jsonify({"error": "No partial_narrative found in session"}), 400), None
 
     partial_narrative_obj = json.loads(partial_narrative_str)
 
@@ -362,91 +479,198 @@ def make_decision():
     }
     decision_history.append(decision_record)
     partial_narrative_obj["decision_history"] = decision_history
-    updated_partial_narrative_str = json.dumps(partial_narrative_obj)
-
-    # Check the scene cache using SQLAlchemy
-    cache_entry = SceneCache.query.filter_by(
-        scenario=scenario, partial_narrative=updated_partial_narrative_str
-    ).first()
-
-    if cache_entry:
-        # Found in cache, use the pre-generated content
-        print("Found cached next scene")
-        next_narrative = cache_entry.next_narrative_obj
-        scene_prompts = cache_entry.next_scene_prompts_obj
-        media_data = cache_entry.next_media_urls_obj
-        cached = True
-    else:
-        # Generate a new scene
-        print("Generating new scene")
-        next_narrative = generate_narrative(last_narrative, decision_history, scenario)
-        scene_prompts = generate_scene_prompts(next_narrative["narrative"])
-        video_urls = generate_scene_videos(scene_prompts)
-        combined_video_url = concatenate_videos(video_urls)
-
-        # Generate audio for narrative
-        audio_url = generate_speech(new_narrative["narrative"])
-
-        media_data = {
-            "individual_videos": video_urls,
-            "combined_video": combined_video_url,
-            "audio": audio_url,
+
+    return None, {
+        "session_id": session_id,
+        "scenario": scenario,
+        "partial_narrative": partial_narrative_obj,
+        "decision_id": decision_id,
+        # Media of the scene being continued
+        "previous_media": (
+            game_session.media_urls.urls_obj if game_session.media_urls else None
+        ),
+        "assignment_id": game_session.assignment_id,
+    }
+
+
+def scene_response(
+    session_id, scenario, partial_narrative_obj, narrative, scene_prompts, media_data, cached
+):
+    """Make a scene the session's current one and return it to the player."""
+    game_session = GameSession.query.get(session_id)
+    attach_scene(
+        game_session, partial_narrative_obj, narrative, scene_prompts, media_data
+    )
+    with scenario_context(scenario), timed("db_commit"):
+        db.session.commit()
+
+    return jsonify(
+        {
+            "session_id": session_id,
+            "narrative": narrative,
+            **scene_media_fields(media_data, narrative),
+            "cached": cached,
         }
+    )
+
+
+@route("/api/start", methods=["POST"])
+@traced("POST /api/start")
+def start_game():
+    """
+    Start a new game session. Look up the initial scene of its scenario in the
+    cache. If found, reuse. Otherwise, generate.
+    """
+    scenario, partial_narrative_obj = new_game()
+
+    # Reuse the cached initial scene, or generate and cache it
+    new_narrative, scene_prompts, media_data, cached = get_or_create_scene(
+        scenario, partial_narrative_obj
+    )
+    if cached:
+        print("Found cached initial scene for scenario:", scenario)
+
+    session_id = create_game_session(scenario, partial_narrative_obj)
+
+    return scene_response(
+        session_id,
+        scenario,
+        partial_narrative_obj,
+        new_narrative,
+        scene_prompts,
+        media_data,
+        cached,
+    )
+
+
+@async_view("start_game")
+@traced("POST /api/start")
+async def start_game_async():
+    """start_game under the ASGI app: the scene is generated without holding a thread."""
+    scenario, partial_narrative_obj = new_game()
+
+    new_narrative, scene_prompts, media_data, cached = await get_or_create_scene_async(
+        scenario, partial_narrative_obj
+    )
+    if cached:
+        print("Found cached initial scene for scenario:", scenario)
+
+    session_id = await run_in_thread(
+        create_game_session, scenario, partial_narrative_obj
+    )
+
+    return await run_in_thread(
+        scene_response,
+        session_id,
+        scenario,
+        partial_narrative_obj,
+        new_narrative,
+        scene_prompts,
+        media_data,
+        cached,
+    )
+
 
-        # Save to cache for future reuse
-        new_cache = SceneCache(
-            scenario=scenario,
-            partial_narrative=updated_partial_narrative_str,
-            next_narrative=json.dumps(next_narrative),
-            next_scene_prompts=json.dumps(scene_prompts),
-            next_media_urls=json.dumps(media_data),
+@route("/api/decision", methods=["POST"])
+@traced("POST /api/decision")
+def make_decision():
+    """
+    Process the player's decision. We'll read 'partial_narrative' from the session row,
+    update the decision_history, then check the cache using that as the key.
+    If it doesn't exist, we generate the next scene. If it does, we reuse it.
+    """
+    error, decision = prepare_decision()
+    if error:
+        return error
+
+    # Reuse the cached next scene, or generate and cache it
+    with assignment_context(decision["assignment_id"]):
+        next_narrative, scene_prompts, media_data, cached = get_or_create_scene(
+            decision["scenario"],
+            decision["partial_narrative"],
+            decision["decision_id"],
+            decision["previous_media"],
         )
-        db.session.add(new_cache)
-        db.session.commit()
-        cached = False
+    print("Found cached next scene" if cached else "Generated new scene")
 
     # Prepare for the next scene by updating partial_narrative
-    partial_narrative_obj["last_narrative"] = next_narrative
-    game_session.partial_narrative = json.dumps(partial_narrative_obj)
-    game_session.current_scene_id = next_narrative["scene_id"]
+    return scene_response(
+        decision["session_id"],
+        decision["scenario"],
+        decision["partial_narrative"],
+        next_narrative,
+        scene_prompts,
+        media_data,
+        cached,
+    )
 
-    # Update related data
-    if game_session.narrative_data:
-        game_session.narrative_data.data = json.dumps(next_narrative)
-    else:
-        narrative_data = NarrativeData(
-            session_id=session_id, data=json.dumps(next_narrative)
-        )
-        db.session.add(narrative_data)
 
-    if game_session.scene_prompts:
-        game_session.scene_prompts.data = json.dumps(scene_prompts)
-    else:
-        scene_prompt = ScenePrompt(
-            session_id=session_id, data=json.dumps(scene_prompts)
+@async_view("make_decision")
+@traced("POST /api/decision")
+async def make_decision_async():
+    """make_decision under the ASGI app: the scene is generated without holding a thread."""
+    error, decision = await run_in_thread(prepare_decision)
+    if error:
+        return error
+
+    with assignment_context(decision["assignment_id"]):
+        next_narrative, scene_prompts, media_data, cached = await get_or_create_scene_async(
+            decision["scenario"],
+            decision["partial_narrative"],
+            decision["decision_id"],
+            decision["previous_media"],
         )
-        db.session.add(scene_prompt)
+    print("Found cached next scene" if cached else "Generated new scene")
+
+    return await run_in_thread(
+        scene_response,
+        decision["session_id"],
+        decision["scenario"],
+        decision["partial_narrative"],
+        next_narrative,
+        scene_prompts,
+        media_data,
+        cached,
+    )
 
-    if game_session.media_urls:
-        game_session.media_urls.data = json.dumps(media_data)
-    else:
-        media_url = MediaUrl(session_id=session_id, data=json.dumps(media_data))
-        db.session.add(media_url)
 
-    db.session.commit()
+@route("/api/narration", methods=["GET"])
+@traced("GET /api/narration")
+def stream_narration():
+    """
+    Stream the narration of the session's current scene.
 
-    return jsonify(
-        {
-            "session_id": session_id,
-            "narrative": next_narrative,
-            "media": media_data["combined_video"],
-            "audio": media_data.get("audio"),
-            "cached": cached,
-        }
-    )
+    Narration that was generated before is served from the cache; otherwise the
+    audio is relayed from ElevenLabs as it is synthesized (chunked transfer) and
+    cached once complete.
+    """
+    session_id = session.get("session_id")
+    if not session_id:
+        return jsonify({"error": "No active session"}), 400
+
+    game_session = GameSession.query.get(session_id)
+    if not game_session or not game_session.narrative_data:
+        return jsonify({"error": "Session not found"}), 404
 
+    text = game_session.narrative_data.narrative_obj["narrative"]
 
-@app.route("/api/progress", methods=["GET"])
+    cached_url = cached_speech_url(text)
+    if cached_url:
+        return redirect(cached_url)
+
+    with scenario_context(game_session.scenario), assignment_context(
+        game_session.assignment_id
+    ):
+        chunks = open_speech_stream(text)
+    if chunks is None:
+        return jsonify({"error": "Narration is unavailable"}), 503
+
+    response = Response(stream_with_context(chunks), mimetype="audio/mpeg")
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@route("/api/progress", methods=["GET"])
 def get_progress():
     """Get the current progress of the game session."""
     session_id = session.get("session_id")
@@ -464,7 +688,7 @@ def get_progress():
     return jsonify({"decisions": decisions})
 
 
-@app.route("/api/scenarios", methods=["GET"])
+@route("/api/scenarios", methods=["GET"])
 def get_scenarios():
     """Get all distinct scenarios from the database."""
     print("Getting scenarios")
@@ -493,7 +717,7 @@ def get_scenarios():
     return jsonify({"scenarios": scenario_list})
 
 
-@app.route("/api/scenarios", methods=["POST"])
+@route("/api/scenarios", methods=["POST"])
 def add_scenario():
     """Add a new scenario to the database."""
     print("Received add_scenario request")
@@ -524,7 +748,7 @@ def add_scenario():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/scenarios/<scenario_name>", methods=["DELETE"])
+@route("/api/scenarios/<scenario_name>", methods=["DELETE"])
 @requires_auth
 def delete_scenario(scenario_name):
     """Delete a scenario from the database."""
@@ -544,36 +768,35 @@ def delete_scenario(scenario_name):
     )
 
 
-@app.route("/api/quiz", methods=["GET"])
-def get_quiz():
-    """Get a dynamic quiz question related to the current scenario/narrative."""
+def quiz_context():
+    """Scenario and narrative of the current session to ask about (empty without one)."""
     session_id = session.get("session_id")
+    if session_id:
+        # Get the current session using SQLAlchemy
+        game_session = GameSession.query.get(session_id)
+
+        if game_session:
+            narrative = None
 
+            # Get narrative data from the related table
+            narrative_data_record = NarrativeData.query.filter_by(
+                session_id=session_id
+            ).first()
+            if narrative_data_record:
+                narrative_data = json.loads(narrative_data_record.data)
+                narrative = narrative_data.get("narrative")
+
+            return {"scenario": game_session.scenario, "narrative": narrative}
+
+    # If no session or no data, generate a generic question
+    return {}
+
+
+@route("/api/quiz", methods=["GET"])
+def get_quiz():
+    """Get a dynamic quiz question related to the current scenario/narrative."""
     try:
-        if session_id:
-            # Get the current session using SQLAlchemy
-            game_session = GameSession.query.get(session_id)
-
-            if game_session:
-                scenario = game_session.scenario
-                narrative = None
-
-                # Get narrative data from the related table
-                narrative_data_record = NarrativeData.query.filter_by(
-                    session_id=session_id
-                ).first()
-                if narrative_data_record:
-                    narrative_data = json.loads(narrative_data_record.data)
-                    narrative = narrative_data.get("narrative")
-
-                # Generate question based on context
-                question = generate_quiz_question(
-                    scenario=scenario, narrative=narrative
-                )
-                return jsonify({"question": question})
-
-        # If no session or no data, generate a generic question
-        question = generate_quiz_question()
+        question = generate_quiz_question(**quiz_context())
         return jsonify({"question": question})
 
     except Exception as e:
@@ -582,6 +805,18 @@ def get_quiz():
         return jsonify({"question": get_fallback_question()})
 
 
+@async_view("get_quiz")
+async def get_quiz_async():
+    """get_quiz under the ASGI app: the question is generated without holding a thread."""
+    try:
+        question = await generate_quiz_question_async(**await run_in_thread(quiz_context))
+        return jsonify({"question": question})
+
+    except Exception as e:
+        print(f"Error generating quiz question: {e}")
+        return jsonify({"question": get_fallback_question()})
+
+
 # --------------------------
 # Assignment Management APIs
 # --------------------------
@@ -599,7 +834,7 @@ def generate_access_code(length=6):
             return code
 
 
-@app.route("/api/assignments", methods=["POST"])
+@route("/api/assignments", methods=["POST"])
 @requires_auth
 def create_assignment():
     """Create a new assignment with a scenario"""
@@ -612,6 +847,12 @@ def create_assignment():
     scenario = request.json.get("scenario", "Apollo 11")
     title = request.json.get("title", f"Assignment: {scenario}")
     
+    # Check the warm-up depth before anything is saved
+    try:
+        warmup_depth = parse_depth(request.json.get("warmup_depth"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
     # Generate a unique access code
     access_code = generate_access_code()
     
@@ -626,18 +867,25 @@ def create_assignment():
     db.session.add(assignment)
     db.session.commit()
     
+    # Pre-render the scenario in the background so the first student doesn't wait
+    warmup_job = None
+    if WARMUP_ON_CREATE:
+        warmup_job = queue_warmup(assignment, warmup_depth)
+        start_warmup(current_app._get_current_object(), warmup_job.id)
+    
     return jsonify({
         "success": True, 
         "assignment": {
             "id": assignment.id,
             "title": assignment.title,
             "scenario": assignment.scenario,
-            "access_code": assignment.access_code
+            "access_code": assignment.access_code,
+            "warmup": warmup_job.to_dict() if warmup_job else None
         }
     })
 
 
-@app.route("/api/assignments", methods=["GET"])
+@route("/api/assignments", methods=["GET"])
 @requires_auth
 def get_teacher_assignments():
     """Get all assignments for the current teacher"""
@@ -652,6 +900,7 @@ def get_teacher_assignments():
         # Count enrolled students
         student_count = db.session.query(student_assignment_progress).filter_by(
             assignment_id=assignment.id).count()
+        warmup_job = latest_warmup(assignment.id)
             
         assignment_list.append({
             "id": assignment.id,
@@ -660,13 +909,14 @@ def get_teacher_assignments():
             "access_code": assignment.access_code,
             "created_at": assignment.created_at.isoformat(),
             "student_count": student_count,
-            "is_active": assignment.is_active
+            "is_active": assignment.is_active,
+            "warmup": warmup_job.to_dict() if warmup_job else None
         })
     
     return jsonify({"assignments": assignment_list})
 
 
-@app.route("/api/assignments/<assignment_id>", methods=["GET"])
+@route("/api/assignments/<assignment_id>", methods=["GET"])
 @requires_auth
 def get_assignment_details(assignment_id):
     """Get details of a specific assignment including student progress"""
@@ -714,7 +964,37 @@ def get_assignment_details(assignment_id):
     })
 
 
-@app.route("/api/join-assignment", methods=["POST"])
+@route("/api/assignments/<assignment_id>/warmup", methods=["GET", "POST"])
+@requires_auth
+def assignment_warmup(assignment_id):
+    """Get the warm-up progress of an assignment, or (POST) start a new warm-up"""
+    if session.get("user_type") != "teacher":
+        return jsonify({"error": "Only teachers can manage assignment warm-up"}), 403
+    
+    teacher_id = session.get("user_id")
+    assignment = Assignment.query.filter_by(id=assignment_id, teacher_id=teacher_id).first()
+    
+    if not assignment:
+        return jsonify({"error": "Assignment not found"}), 404
+    
+    warmup_job = latest_warmup(assignment.id)
+    
+    if request.method == "POST":
+        if warmup_job and warmup_job.status in ("queued", "running"):
+            # Restart the job in case its worker went away; it is ignored if still active
+            start_warmup(current_app._get_current_object(), warmup_job.id)
+        else:
+            try:
+                depth = parse_depth((request.get_json(silent=True) or {}).get("depth"))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            warmup_job = queue_warmup(assignment, depth)
+            start_warmup(current_app._get_current_object(), warmup_job.id)
+    
+    return jsonify({"warmup": warmup_job.to_dict() if warmup_job else None})
+
+
+@route("/api/join-assignment", methods=["POST"])
 @requires_auth
 def join_assignment():
     """Allow a student to join an assignment using an access code"""
@@ -783,7 +1063,7 @@ def join_assignment():
     })
 
 
-@app.route("/api/student/assignments", methods=["GET"])
+@route("/api/student/assignments", methods=["GET"])
 @requires_auth
 def get_student_assignments():
     """Get all assignments for the current student"""
@@ -832,7 +1112,7 @@ def get_student_assignments():
     return jsonify({"assignments": assignment_list})
 
 
-@app.route("/student/assignments")
+@route("/student/assignments")
 @requires_auth
 def student_assignments_page():
     """Show a student their assignments with play options"""
@@ -845,7 +1125,7 @@ def student_assignments_page():
     return render_template("student_assignments.html", user=student)
 
 
-@app.route("/api/student/progress", methods=["GET"])
+@route("/api/student/progress", methods=["GET"])
 @requires_auth
 def get_student_progress():
     """Get progress data for the current student including quiz results"""
@@ -923,7 +1203,7 @@ def get_student_progress():
             }
         })
     except Exception as e:
-        app.logger.error(f"Error in get_student_progress: {str(e)}")
+        current_app.logger.error(f"Error in get_student_progress: {str(e)}")
         return jsonify({
             "error": "An error occurred while fetching progress data",
             "message": str(e),
@@ -940,7 +1220,7 @@ def get_student_progress():
         })
 
 
-@app.route("/api/teacher/student-progress", methods=["GET"])
+@route("/api/teacher/student-progress", methods=["GET"])
 @requires_auth
 def get_teacher_student_progress():
     """Get progress data for all students in a teacher's assignments"""
@@ -949,13 +1229,13 @@ def get_teacher_student_progress():
             return jsonify({"error": "Only teachers can view student progress"}), 403
         
         teacher_id = session.get("user_id")
-        app.logger.info(f"Fetching progress data for teacher ID: {teacher_id}")
+        current_app.logger.info(f"Fetching progress data for teacher ID: {teacher_id}")
         
         # Get all assignments for this teacher
         assignments = Assignment.query.filter_by(teacher_id=teacher_id).all()
         assignment_ids = [a.id for a in assignments]
         
-        app.logger.info(f"Found {len(assignments)} assignments: {assignment_ids}")
+        current_app.logger.info(f"Found {len(assignments)} assignments: {assignment_ids}")
         
         if not assignment_ids:
             # No assignments found, return empty data
@@ -980,14 +1260,14 @@ def get_teacher_student_progress():
             student_assignment_progress.c.assignment_id.in_(assignment_ids)
         ).all()
         
-        app.logger.info(f"Found {len(student_assignments_data)} student-assignment records")
+        current_app.logger.info(f"Found {len(student_assignments_data)} student-assignment records")
         
         # Get all quiz responses for these assignments
         quiz_responses = QuestionResponse.query.filter(
             QuestionResponse.assignment_id.in_(assignment_ids)
         ).all()
         
-        app.logger.info(f"Found {len(quiz_responses)} quiz responses")
+        current_app.logger.info(f"Found {len(quiz_responses)} quiz responses")
         
         # Count student assignments and completed assignments by assignment ID
         assignment_counts = {}
@@ -1095,7 +1375,7 @@ def get_teacher_student_progress():
         })
     
     except Exception as e:
-        app.logger.error(f"Error in get_teacher_student_progress: {str(e)}")
+        current_app.logger.error(f"Error in get_teacher_student_progress: {str(e)}")
         return jsonify({
             "error": "An error occurred while fetching progress data",
             "message": str(e),
@@ -1105,5 +1385,25 @@ def get_teacher_student_progress():
         })
 
 
+# --------------------
+# Monitoring Routes
+# --------------------
+@route("/metrics")
+def get_metrics():
+    """
+    Expose this worker's metrics in the Prometheus text format: per-stage
+    latency histograms, cache hit ratios, provider queue depths and more.
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@route("/api/providers/status", methods=["GET"])
+def get_provider_status():
+    """Circuit breaker state and queue depth of each external provider."""
+    return jsonify({"breakers": breaker_states(), "queues": queue_depths()})
+
+
 if __name__ == "__main__":
+    app = create_app()
+    database.setup_database(app)
     app.run(debug=True, port=5001)
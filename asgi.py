@@ -0,0 +1,207 @@
+"""
+ASGI serving mode.
+
+Under `flask run` or gunicorn every request holds a thread, and a scene being
+generated holds it for up to a minute while it waits on Gemini, Replicate,
+Runway and ElevenLabs. Served by this ASGI app, the endpoints that generate
+content (those with a coroutine registered with app.async_view: /api/start,
+/api/decision and /api/quiz) run as coroutines on the event loop: a student
+waiting for a scene costs a task, not a thread, so one process can hold
+thousands of them. Their database work runs in worker threads, one short step
+at a time.
+
+Every other route is served by the unchanged Flask views through a WSGI bridge
+with a thread pool of its own, so slow sync routes never starve the threads the
+coroutines' database steps run in. Streaming responses (e.g. /api/narration)
+are relayed chunk by chunk.
+
+A student who disconnects does not stop a generation: the scene is still
+cached for the next one, as under WSGI.
+
+Usage:
+    flask setup-db
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+
+Settings are read from the environment:
+
+    WSGI_BRIDGE_THREADS     threads serving the sync routes (32)
+"""
+
+import io
+import os
+import sys
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.exceptions import HTTPException
+from app import ASYNC_VIEWS, create_app
+from database import run_in_thread
+
+WSGI_BRIDGE_THREADS = int(os.environ.get("WSGI_BRIDGE_THREADS", "32"))
+
+# Methods Flask answers itself for every route, without calling the view
+AUTOMATIC_METHODS = ("HEAD", "OPTIONS")
+
+flask_app = create_app()
+
+_wsgi_executor = ThreadPoolExecutor(
+    max_workers=WSGI_BRIDGE_THREADS, thread_name_prefix="wsgi"
+)
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        raise ValueError(f"Unsupported ASGI scope type {scope['type']}")
+
+    body = await read_body(receive)
+    environ = build_environ(scope, body)
+    view, arguments = async_view_for(scope)
+    if view:
+        await serve_async_view(view, arguments, environ, send)
+    else:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_wsgi_executor, serve_wsgi, environ, loop, send)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _wsgi_executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def async_view_for(scope):
+    """(coroutine function, URL arguments) serving a request; no function for the WSGI views."""
+    if scope["method"] in AUTOMATIC_METHODS:
+        return None, None
+    adapter = flask_app.url_map.bind("localhost", script_name=scope.get("root_path") or None)
+    try:
+        rule, arguments = adapter.match(
+            scope["path"], method=scope["method"], return_rule=True
+        )
+    except HTTPException:
+        # Not found, wrong method or a redirect: Flask answers as usual
+        return None, None
+    return ASYNC_VIEWS.get(rule.endpoint), arguments
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+def build_environ(scope, body):
+    """WSGI environ of an ASGI HTTP request (PEP 3333)."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+        environ["REMOTE_PORT"] = str(scope["client"][1])
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = name
+        else:
+            key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def response_start(status_code, headers):
+    return {
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in headers
+        ],
+    }
+
+
+async def serve_async_view(view, arguments, environ, send):
+    """
+    Serve a request with a coroutine view, doing what Flask does around a view
+    function: request context, before/after request hooks, session cookie,
+    error handlers and teardown.
+    """
+    ctx = flask_app.request_context(environ)
+    error = None
+    ctx.push()
+    try:
+        try:
+            try:
+                rv = await run_in_thread(flask_app.preprocess_request)
+                if rv is None:
+                    rv = await view(**arguments)
+            except Exception as e:
+                # Registered error handlers, e.g. 429 for QueueSaturated
+                rv = flask_app.handle_user_exception(e)
+            response = await run_in_thread(flask_app.finalize_request, rv)
+        except Exception as e:
+            error = e
+            response = flask_app.handle_exception(e)
+        await send(response_start(response.status_code, response.headers.items()))
+        await send({"type": "http.response.body", "body": response.get_data()})
+    finally:
+        ctx.pop(error)
+
+
+def serve_wsgi(environ, loop, send):
+    """Run the Flask app on a request in a bridge thread, relaying its response."""
+
+    def send_message(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    status = []
+
+    def start_response(status_line, headers, exc_info=None):
+        if exc_info and status and status[0] is None:
+            raise exc_info[1].with_traceback(exc_info[2])
+        status[:] = [response_start(int(status_line.split(" ", 1)[0]), headers)]
+
+    result = flask_app(environ, start_response)
+    try:
+        for chunk in result:
+            if not chunk:
+                continue
+            if status[0]:
+                # Headers go out with the first chunk of the body
+                send_message(status[0])
+                status[0] = None
+            send_message({"type": "http.response.body", "body": chunk, "more_body": True})
+        if status[0]:
+            send_message(status[0])
+        send_message({"type": "http.response.body", "body": b""})
+    finally:
+        close = getattr(result, "close", None)
+        if close:
+            close()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Database Hot Path Benchmarks
+
+Times the queries and endpoint handlers that slow down as the tables grow,
+each in isolation, against a database seeded with synthetic data at a
+production-like scale:
+
+    scene_cache_hit, scene_cache_miss   the (scenario, partial_narrative)
+                                        lookup of every decision
+    video_by_prompt                     Video.original_prompt lookup
+    student_progress                    GET /api/student/progress
+    teacher_progress                    GET /api/teacher/student-progress
+
+The statements every benchmark runs are recorded with their EXPLAIN QUERY
+PLAN. The run fails (exit status 1) when a benchmark is slower than its
+threshold in benchmarks/db_thresholds.json, when its plan scans a table the
+thresholds forbid scanning, or, with --baseline, when its p95 regressed by
+more than --max-regression against a saved run.
+
+--scale sets the number of scene cache rows, videos, sessions and quiz
+responses; the district (database/seed.py) has as many teachers, with their
+students, assignments and enrollments, as that many quiz responses take.
+Seeding 10M rows takes a while, so --db keeps the seeded database for later
+runs (seeded databases are reused only at the same scale; remove the file
+after schema changes so the new indexes are built).
+
+Results are saved as JSON in benchmarks/results/, like the load test's.
+
+Usage:
+    python benchmarks/db_bench.py                              # 100k rows
+    python benchmarks/db_bench.py --scale 10000000 --db /tmp/bench_10m.db
+    python benchmarks/db_bench.py --only scene_cache_hit --iterations 500
+    python benchmarks/db_bench.py --baseline benchmarks/results/BASELINE.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import shutil
+from datetime import datetime
+
+# Add the parent directory to the path so we can import from the project
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from load_test import PERCENTILES, RESULTS_DIR, git_commit, percentile
+
+THRESHOLDS_PATH = os.path.join(ROOT_DIR, "benchmarks", "db_thresholds.json")
+
+# Quiz responses per enrollment, on average (see database.seed.grade_rows)
+RESPONSES_PER_ENROLLMENT = 3.6
+
+SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the database hot paths")
+    parser.add_argument(
+        "--scale",
+        type=int,
+        default=100000,
+        help="Scene cache rows, videos, sessions and quiz responses to seed",
+    )
+    parser.add_argument("--db", help="Seeded database to create or reuse (default: temporary)")
+    parser.add_argument("--iterations", type=int, default=100, help="Timed runs per benchmark")
+    parser.add_argument("--only", action="append", help="Run only this benchmark (repeatable)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data")
+    parser.add_argument("--baseline", help="Saved run to check for regressions against")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=1.5,
+        help="Largest allowed ratio of p95 to the baseline's p95",
+    )
+    parser.add_argument("--output", help="Where to save the results")
+    parser.add_argument(
+        "--plans", action="store_true", help="Print the query plan of every statement"
+    )
+    return parser.parse_args()
+
+
+# --------------------
+# Synthetic data
+# --------------------
+def sizes_for(scale):
+    """A district with about `scale` quiz responses, sessions, scene cache rows and videos."""
+    from database.seed import DEFAULT_SIZES
+
+    enrollments = DEFAULT_SIZES["students_per_teacher"] * DEFAULT_SIZES["assignments_per_student"]
+    teachers = max(1, round(scale / (enrollments * RESPONSES_PER_ENROLLMENT)))
+    return {
+        "teachers": teachers,
+        "anonymous_sessions": max(0, scale - teachers * enrollments),
+        "scene_cache": scale,
+        "videos": scale,
+    }
+
+
+def seed(path, scale, seed):
+    """Seed the benchmark database and record its scale."""
+    from database.seed import seed_database
+
+    started = time.monotonic()
+    counts = seed_database(path, sizes_for(scale), seed)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE bench_meta (scale INTEGER, seed INTEGER)")
+    conn.execute("INSERT INTO bench_meta VALUES (?, ?)", (scale, seed))
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    print(
+        f"Seeded {sum(counts.values())} rows at scale {scale} "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+
+
+def seeded_scale(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT scale FROM bench_meta").fetchone()[0]
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+# --------------------
+# Benchmarks
+# --------------------
+def sample_rows(path, table, columns, count, seed):
+    """A reproducible sample of rows of a table, picked by ROWID."""
+    conn = sqlite3.connect(path)
+    try:
+        (highest,) = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()
+        rng = random.Random(seed)
+        rows = []
+        for _ in range(count):
+            row = conn.execute(
+                f"SELECT {columns} FROM {table} WHERE rowid = ?", (rng.randint(1, highest),)
+            ).fetchone()
+            if row:
+                rows.append(row)
+        return rows
+    finally:
+        conn.close()
+
+
+def call_view(app, endpoint, user_type, user_id):
+    """Run an endpoint's handler in a request context, as the user."""
+    from flask import session
+
+    with app.test_request_context():
+        session["user"] = {"benchmark": True}
+        session["user_type"] = user_type
+        session["user_id"] = user_id
+        response = app.view_functions[endpoint]()
+        payload = response.get_json()
+        if "error" in payload:
+            raise RuntimeError(f"{endpoint} failed: {payload.get('message', payload['error'])}")
+
+
+def benchmarks(app, path, seed):
+    """Name -> callable running the benchmark once, with the i-th sample."""
+    from api.scene_builder import get_cached_scene
+    from database.video_cache import VideoCache
+
+    def in_context(fn):
+        def run(i):
+            with app.app_context():
+                fn(i)
+
+        return run
+
+    scenes = sample_rows(path, "scene_cache", "scenario, partial_narrative", 200, seed)
+    prompts = sample_rows(path, "videos", "original_prompt", 200, seed)
+    students = sample_rows(path, "students", "id", 200, seed)
+    teachers = sample_rows(path, "teachers", "id", 200, seed)
+
+    def scene_cache_hit(i):
+        scenario, key = scenes[i % len(scenes)]
+        assert get_cached_scene(scenario, key) is not None
+
+    def scene_cache_miss(i):
+        scenario, key = scenes[i % len(scenes)]
+        assert get_cached_scene(scenario, key.replace('"decision_history"', '"decision_log"')) is None
+
+    def video_by_prompt(i):
+        assert VideoCache.get_video_by_prompt(prompts[i % len(prompts)][0]) is not None
+
+    return {
+        "scene_cache_hit": in_context(scene_cache_hit),
+        "scene_cache_miss": in_context(scene_cache_miss),
+        "video_by_prompt": in_context(video_by_prompt),
+        "student_progress": lambda i: call_view(
+            app, "get_student_progress", "student", students[i % len(students)][0]
+        ),
+        "teacher_progress": lambda i: call_view(
+            app, "get_teacher_student_progress", "teacher", teachers[i % len(teachers)][0]
+        ),
+    }
+
+
+class StatementRecorder:
+    """Collects the distinct statements an engine executes while active."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.statements = {}
+        self.active = False
+        event.listen(engine, "before_cursor_execute", self.record)
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active and not executemany:
+            self.statements.setdefault(statement, parameters)
+
+
+def query_plans(path, statements):
+    """EXPLAIN QUERY PLAN of each statement, as lists of indented lines."""
+    conn = sqlite3.connect(path)
+    plans = []
+    try:
+        for statement, parameters in statements.items():
+            if not statement.lstrip().upper().startswith("SELECT"):
+                continue
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+            depth = {0: -1}
+            lines = []
+            for node, parent, _, detail in rows:
+                depth[node] = depth.get(parent, -1) + 1
+                lines.append("  " * depth[node] + detail)
+            plans.append({"statement": " ".join(statement.split()), "plan": lines})
+    finally:
+        conn.close()
+    return plans
+
+
+def scanned_tables(plans):
+    tables = set()
+    for plan in plans:
+        for line in plan["plan"]:
+            match = SCAN_RE.match(line.strip())
+            if match:
+                tables.add(match.group(1))
+    return sorted(tables)
+
+
+def run_benchmark(name, fn, iterations, recorder, path):
+    # Warm the statement cache and SQLite's page cache, and record the plans
+    recorder.statements = {}
+    recorder.active = True
+    fn(0)
+    recorder.active = False
+    for i in range(1, 5):
+        fn(i)
+
+    timings = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    plans = query_plans(path, recorder.statements)
+    return {
+        "iterations": iterations,
+        "mean_ms": sum(timings) / len(timings),
+        **{f"p{p}_ms": percentile(timings, p) for p in PERCENTILES},
+        "max_ms": timings[-1],
+        "statements": len(recorder.statements),
+        "scans": scanned_tables(plans),
+        "plans": plans,
+    }
+
+
+# --------------------
+# Checks
+# --------------------
+def check(name, result, thresholds, baseline, max_regression):
+    """Reasons the benchmark failed (empty if it passed)."""
+    failures = []
+    limits = thresholds.get(name, {})
+    if "p95_ms" in limits and result["p95_ms"] > limits["p95_ms"]:
+        failures.append(f"p95 {result['p95_ms']:.2f}ms over the {limits['p95_ms']}ms threshold")
+    for table in limits.get("no_scan", []):
+        if table in result["scans"]:
+            failures.append(f"scans {table}")
+    previous = (baseline or {}).get("benchmarks", {}).get(name)
+    if previous and result["p95_ms"] > previous["p95_ms"] * max_regression:
+        failures.append(
+            f"p95 {result['p95_ms']:.2f}ms regressed from {previous['p95_ms']:.2f}ms"
+        )
+    return failures
+
+
+def print_results(results, show_plans):
+    header = " ".join(f"{f'p{p} ms':>9}" for p in PERCENTILES)
+    print(f"\n{'benchmark':<20} {header} {'max ms':>9} {'stmts':>6}  scans")
+    for name, result in results["benchmarks"].items():
+        cells = " ".join(f"{result[f'p{p}_ms']:9.3f}" for p in PERCENTILES)
+        print(
+            f"{name:<20} {cells} {result['max_ms']:9.3f} {result['statements']:>6}  "
+            f"{', '.join(result['scans']) or '-'}"
+        )
+        if show_plans:
+            for plan in result["plans"]:
+                print(f"    {plan['statement'][:160]}")
+                for line in plan["plan"]:
+                    print(f"      {line}")
+    for name, failures in results["failures"].items():
+        for failure in failures:
+            print(f"FAIL {name}: {failure}")
+
+
+def open_app(path):
+    """Import the app against the benchmark database."""
+    os.environ["DATABASE_PATH"] = path
+    os.environ.setdefault("PROVIDERS", "fake")
+    os.environ["WARMUP_RESUME_ON_START"] = "false"
+    os.environ.setdefault("TRACE_EXPORTER", "none")
+
+    import database
+    from app import create_app
+
+    app = create_app()
+    database.setup_database(app)
+    return app
+
+
+def main(args):
+    temporary_dir = None
+    path = args.db
+    if not path:
+        temporary_dir = tempfile.mkdtemp(prefix="db_bench_")
+        path = os.path.join(temporary_dir, "bench.db")
+    reuse = os.path.exists(path) and seeded_scale(path) == args.scale
+    if os.path.exists(path) and not reuse:
+        sys.exit(f"{path} was not seeded at scale {args.scale}; remove it or pick another --db")
+
+    try:
+        app = open_app(path)
+        if not reuse:
+            seed(path, args.scale, args.seed)
+
+        from database.models import db
+
+        with app.app_context():
+            recorder = StatementRecorder(db.engine)
+        selected = benchmarks(app, path, args.seed)
+        for name in args.only or []:
+            if name not in selected:
+                sys.exit(f"Unknown benchmark '{name}', pick from {', '.join(selected)}")
+
+        with open(THRESHOLDS_PATH) as f:
+            thresholds = json.load(f)
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+
+        commit, dirty = git_commit()
+        results = {
+            "run": {
+                "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+                "commit": commit,
+                "dirty": dirty,
+                "scale": args.scale,
+                "sqlite_version": sqlite3.sqlite_version,
+            },
+            "benchmarks": {},
+            "failures": {},
+        }
+        for name, fn in selected.items():
+            if args.only and name not in args.only:
+                continue
+            result = run_benchmark(name, fn, args.iterations, recorder, path)
+            results["benchmarks"][name] = result
+            failures = check(name, result, thresholds, baseline, args.max_regression)
+            if failures:
+                results["failures"][name] = failures
+    finally:
+        if temporary_dir:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+
+    print_results(results, args.plans)
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = results["run"]["started_at"].replace(":", "").replace("-", "")[:15]
+        output = os.path.join(RESULTS_DIR, f"db_{stamp}_{commit}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results saved to {output}")
+    if results["failures"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_args())
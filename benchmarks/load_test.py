@@ -0,0 +1,776 @@
+#!/usr/bin/env python3
+"""
+Classroom Load Test
+
+Simulates classes of students playing an assignment at the same time, against
+the app with fake providers (see api/providers/fakes.py), and reports per
+endpoint the p50/p95/p99 latency, errors and requests per second, along with
+the scene cache hit rate, the time spent on SQLite writes (which includes
+waiting for the write lock), lock errors and the memory of each worker.
+
+Every class has a teacher, who creates an assignment and polls the progress
+dashboards while the class plays, and students, who join the assignment in a
+burst over --ramp-seconds, start the scenario and make decisions after think
+times drawn around --think-seconds, asking for a quiz question now and then.
+Students favor the first options, like real classes do, so later students
+find more of their scenes in the cache.
+
+By default the app runs in this process against a new temporary database
+(DATABASE_PATH) with PROVIDERS=fake, and the media it renders is removed
+afterwards (the fake providers' own media in FAKE_MEDIA_DIR is kept).
+
+With --url, students play against a running server instead, which should
+have been started with PROVIDERS=fake; logins go through Auth0 there, so the
+assignment and dashboard steps are skipped, and the DB and memory figures
+come from /metrics of whichever workers answered the scrapes.
+
+Results are saved as JSON in benchmarks/results/, named after the start time
+and the commit, so runs can be compared across commits.
+
+Usage:
+    python benchmarks/load_test.py --classes 4 --students 30 --decisions 5
+    python benchmarks/load_test.py --latency-scale 0 --think-seconds 0.5
+    python benchmarks/load_test.py --url http://localhost:5001 --classes 2
+    python benchmarks/load_test.py --compare benchmarks/results/BASELINE.json
+    python benchmarks/load_test.py --diff BASELINE.json RESULT.json
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter, defaultdict
+from datetime import datetime
+
+# Add the parent directory to the path so we can import from the project
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+
+PERCENTILES = (50, 95, 99)
+
+# Chance of picking each option of a scene
+OPTION_WEIGHTS = (0.6, 0.3, 0.1)
+
+# Retries of a request answered with 429, like the frontend's postWithRetry
+MAX_RETRIES = 3
+
+SAMPLE_RE = re.compile(r"^([a-zA-Z_:][\w:]*)(?:\{(.*)\})?\s+(\S+)$")
+LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load-test the app with classes of students")
+    parser.add_argument("--classes", type=int, default=2, help="Classes playing at once")
+    parser.add_argument("--students", type=int, default=25, help="Students per class")
+    parser.add_argument("--decisions", type=int, default=4, help="Decisions per student")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="Scenario of the assignments, repeat to spread the classes over several "
+        "(Cuban Missile Crisis)",
+    )
+    parser.add_argument(
+        "--think-seconds",
+        type=float,
+        default=8.0,
+        help="Median time a student reads a scene before deciding",
+    )
+    parser.add_argument(
+        "--ramp-seconds",
+        type=float,
+        default=10.0,
+        help="Time over which the students of a class join",
+    )
+    parser.add_argument(
+        "--quiz-rate", type=float, default=0.3, help="Share of scenes followed by a quiz"
+    )
+    parser.add_argument(
+        "--dashboard-seconds",
+        type=float,
+        default=15.0,
+        help="Interval of the teacher's dashboard polls",
+    )
+    parser.add_argument(
+        "--warmup-depth",
+        type=int,
+        default=0,
+        help="Warm-up depth requested for the assignments (0 for none)",
+    )
+    parser.add_argument(
+        "--latency-scale",
+        type=float,
+        default=0.1,
+        help="FAKE_LATENCY_SCALE of the in-process app's fake providers",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the think times and choices")
+    parser.add_argument("--url", help="Play against the server at this URL")
+    parser.add_argument("--output", help="Where to save the results")
+    parser.add_argument("--compare", help="Compare the results with a saved run")
+    parser.add_argument(
+        "--diff",
+        nargs=2,
+        metavar=("BASELINE", "RESULT"),
+        help="Compare two saved runs without running",
+    )
+    parser.add_argument(
+        "--keep-media",
+        action="store_true",
+        help="Keep the media the in-process app rendered",
+    )
+    return parser.parse_args()
+
+
+# --------------------
+# Clients
+# --------------------
+class InProcessClient:
+    """A user of the app running in this process (a Flask test client)."""
+
+    can_login = True
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def login(self, user_type, user_id):
+        with self.client.session_transaction() as session:
+            session["user"] = {"load_test": True}
+            session["user_type"] = user_type
+            session["user_id"] = user_id
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True), response.headers
+
+    def text(self, path):
+        return self.client.get(path).get_data(as_text=True)
+
+
+class HttpClient:
+    """A user of a running server."""
+
+    can_login = False
+
+    def __init__(self, base_url):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def request(self, method, path, body=None):
+        response = self.session.request(
+            method, self.base_url + path, json=body, timeout=600
+        )
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        return response.status_code, payload, response.headers
+
+    def text(self, path):
+        return self.session.get(self.base_url + path, timeout=30).text
+
+
+# --------------------
+# Recording
+# --------------------
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an ascending list."""
+    index = max(0, int(round(percent / 100 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class Recorder:
+    """Latency and status of every request, and whether scenes were cached."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.scenes = Counter()
+        self.students = Counter()
+
+    def call(self, client, endpoint, method, path, body=None):
+        """Send a request, retrying on 429; returns (status, JSON body)."""
+        for attempt in range(MAX_RETRIES + 1):
+            started = time.monotonic()
+            try:
+                status, payload, headers = client.request(method, path, body)
+            except Exception as e:
+                print(f"{endpoint} failed: {e}")
+                status, payload, headers = 0, None, {}
+            self.record(endpoint, time.monotonic() - started, status, payload)
+            if status != 429 or attempt == MAX_RETRIES:
+                return status, payload
+            time.sleep(float(headers.get("Retry-After", 1)))
+
+    def record(self, endpoint, seconds, status, payload):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+            if status == 200 and isinstance(payload, dict) and "cached" in payload:
+                self.scenes["hits" if payload["cached"] else "misses"] += 1
+
+    def endpoint_summary(self, duration):
+        summary = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            statuses = self.statuses[endpoint]
+            summary[endpoint] = {
+                "requests": len(values),
+                "errors": sum(n for status, n in statuses.items() if status != 200),
+                "statuses": {str(status): n for status, n in sorted(statuses.items())},
+                "requests_per_second": len(values) / duration,
+                "mean": sum(values) / len(values),
+                **{f"p{p}": percentile(values, p) for p in PERCENTILES},
+                "max": values[-1],
+            }
+        return summary
+
+
+# --------------------
+# Metrics scraping
+# --------------------
+def parse_metrics(text):
+    """Samples of a Prometheus text page: {(name, ((label, value), ...)): value}."""
+    samples = {}
+    for line in text.splitlines():
+        match = SAMPLE_RE.match(line.strip())
+        if not match or line.startswith("#"):
+            continue
+        name, labels, value = match.groups()
+        labels = tuple(sorted(LABEL_RE.findall(labels or "")))
+        samples[(name, labels)] = float(value)
+    return samples
+
+
+def worker_pid(samples):
+    for (name, labels), _ in samples.items():
+        if name == "process_resident_memory_bytes":
+            return dict(labels).get("pid")
+    return None
+
+
+class MetricsSampler(threading.Thread):
+    """Scrapes /metrics during the run, keeping the first and last page of each worker."""
+
+    def __init__(self, client, interval=2.0):
+        super().__init__(daemon=True)
+        self.client = client
+        self.interval = interval
+        self.first = {}
+        self.last = {}
+        self.peak_memory = {}
+        self.stopped = threading.Event()
+
+    def scrape(self):
+        try:
+            samples = parse_metrics(self.client.text("/metrics"))
+        except Exception as e:
+            print(f"Could not scrape /metrics: {e}")
+            return
+        pid = worker_pid(samples) or "unknown"
+        self.first.setdefault(pid, samples)
+        self.last[pid] = samples
+        for (name, _), value in samples.items():
+            if name == "process_resident_memory_bytes":
+                self.peak_memory[pid] = max(value, self.peak_memory.get(pid, 0))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.scrape()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.scrape()
+
+    def deltas(self):
+        """Growth of every counter and histogram sample over the run, over all workers."""
+        totals = defaultdict(float)
+        for pid, last in self.last.items():
+            first = self.first[pid]
+            for key, value in last.items():
+                if key[0].endswith(("_total", "_bucket", "_sum", "_count")):
+                    totals[key] += value - first.get(key, 0.0)
+        return totals
+
+
+def histogram_buckets(deltas, name, **match):
+    """Cumulative [(upper bound, count)] of a histogram, summed over its label sets."""
+    counts = defaultdict(float)
+    for (sample, labels), value in deltas.items():
+        labels = dict(labels)
+        if sample != f"{name}_bucket":
+            continue
+        if any(labels.get(key) != wanted for key, wanted in match.items()):
+            continue
+        counts[float(labels["le"])] += value
+    return sorted(counts.items())
+
+
+def bucket_quantile(buckets, quantile):
+    """Estimate a quantile from cumulative buckets, like Prometheus' histogram_quantile."""
+    if not buckets or not buckets[-1][1]:
+        return None
+    rank = quantile * buckets[-1][1]
+    lower, below = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if math.isinf(bound):
+                return lower
+            if count == below:
+                return bound
+            return lower + (bound - lower) * (rank - below) / (count - below)
+        lower, below = bound, count
+    return lower
+
+
+def metric_total(deltas, name, **match):
+    return sum(
+        value
+        for (sample, labels), value in deltas.items()
+        if sample == name
+        and all(dict(labels).get(key) == wanted for key, wanted in match.items())
+    )
+
+
+def histogram_summary(deltas, name, **match):
+    buckets = histogram_buckets(deltas, name, **match)
+    count = metric_total(deltas, f"{name}_count", **match)
+    seconds = metric_total(deltas, f"{name}_sum", **match)
+    return {
+        "count": int(count),
+        "seconds": seconds,
+        "mean": seconds / count if count else None,
+        **{f"p{p}": bucket_quantile(buckets, p / 100) for p in PERCENTILES},
+    }
+
+
+def server_summary(sampler):
+    deltas = sampler.deltas()
+    caches = {}
+    for (name, labels), _ in deltas.items():
+        if name == "cache_lookups_total":
+            caches.setdefault(dict(labels)["cache"], None)
+    for cache in sorted(caches):
+        hits = metric_total(deltas, "cache_lookups_total", cache=cache, result="hit")
+        misses = metric_total(deltas, "cache_lookups_total", cache=cache, result="miss")
+        caches[cache] = {
+            "hits": int(hits),
+            "misses": int(misses),
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+        }
+    return {
+        "caches": caches,
+        "db": {
+            "writes": histogram_summary(deltas, "db_write_seconds"),
+            "commits": histogram_summary(deltas, "stage_duration_seconds", stage="db_commit"),
+            "locked_errors": int(metric_total(deltas, "db_locked_errors_total")),
+        },
+        "memory": {
+            "workers": {pid: int(peak) for pid, peak in sorted(sampler.peak_memory.items())},
+            "max_bytes": int(max(sampler.peak_memory.values(), default=0)),
+        },
+    }
+
+
+# --------------------
+# Simulated users
+# --------------------
+class Classroom:
+    """One teacher's assignment and the students playing it."""
+
+    def __init__(self, number, scenario, teacher_id=None, student_ids=()):
+        self.number = number
+        self.scenario = scenario
+        self.teacher_id = teacher_id
+        self.student_ids = list(student_ids)
+        self.access_code = None
+        self.ready = threading.Event()
+        self.finished = threading.Event()
+
+
+def think(rng, median):
+    if median > 0:
+        time.sleep(median * math.exp(rng.gauss(0, 0.5)))
+
+
+def run_teacher(client, recorder, classroom, args):
+    try:
+        client.login("teacher", classroom.teacher_id)
+        status, payload = recorder.call(
+            client,
+            "create_assignment",
+            "POST",
+            "/api/assignments",
+            {
+                "scenario": classroom.scenario,
+                "title": f"Load test {classroom.number}",
+                "warmup_depth": args.warmup_depth,
+            },
+        )
+        if status == 200 and payload:
+            classroom.access_code = payload["assignment"]["access_code"]
+    finally:
+        classroom.ready.set()
+
+    while not classroom.finished.wait(args.dashboard_seconds):
+        recorder.call(client, "teacher_progress", "GET", "/api/teacher/student-progress")
+        recorder.call(client, "teacher_assignments", "GET", "/api/assignments")
+
+
+def run_student(client, recorder, classroom, student_id, args, rng):
+    time.sleep(rng.uniform(0, args.ramp_seconds))
+    if client.can_login:
+        classroom.ready.wait()
+        client.login("student", student_id)
+        if classroom.access_code:
+            recorder.call(
+                client,
+                "join_assignment",
+                "POST",
+                "/api/join-assignment",
+                {"access_code": classroom.access_code},
+            )
+            recorder.call(client, "student_assignments", "GET", "/api/student/assignments")
+
+    status, payload = recorder.call(
+        client, "start", "POST", "/api/start", {"scenario": classroom.scenario}
+    )
+    for _ in range(args.decisions):
+        narrative = (payload or {}).get("narrative") or {}
+        options = narrative.get("options") or []
+        if status != 200 or not options:
+            recorder.students["failed"] += 1
+            return
+        think(rng, args.think_seconds)
+        if rng.random() < args.quiz_rate:
+            recorder.call(client, "quiz", "GET", "/api/quiz")
+        option = rng.choices(options, weights=OPTION_WEIGHTS[: len(options)])[0]
+        status, payload = recorder.call(
+            client,
+            "decision",
+            "POST",
+            "/api/decision",
+            {"decision": option["id"], "scene_id": narrative.get("scene_id")},
+        )
+
+    if client.can_login:
+        recorder.call(client, "student_progress", "GET", "/api/student/progress")
+    recorder.students["failed" if status != 200 else "finished"] += 1
+
+
+def create_users(app, classes, students):
+    """Create a teacher and students for every class; returns their IDs."""
+    from database.models import Student, Teacher, db
+
+    with app.app_context():
+        users = []
+        for number in range(classes):
+            teacher = Teacher(
+                name=f"Load Teacher {number}",
+                email=f"load-teacher-{number}@example.com",
+                password="",
+            )
+            pupils = [
+                Student(
+                    name=f"Load Student {number}-{index}",
+                    email=f"load-student-{number}-{index}@example.com",
+                    grade_level=8,
+                )
+                for index in range(students)
+            ]
+            db.session.add(teacher)
+            db.session.add_all(pupils)
+            users.append((teacher, pupils))
+        db.session.commit()
+        return [(teacher.id, [pupil.id for pupil in pupils]) for teacher, pupils in users]
+
+
+# --------------------
+# Media cleanup
+# --------------------
+def media_dirs():
+    from database.audio_cache import AudioCache
+    from database.image_cache import ImageCache
+    from database.video_cache import VideoCache
+
+    return [
+        ImageCache.get_static_image_dir(),
+        VideoCache.get_static_video_dir(),
+        AudioCache.get_static_audio_dir(),
+    ]
+
+
+def list_files(directories):
+    paths = set()
+    for directory in directories:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            paths.add(dirpath)
+            paths.update(os.path.join(dirpath, name) for name in filenames)
+    return paths
+
+
+def remove_new_media(directories, before):
+    """Remove the files and directories created in the media directories since before."""
+    created = sorted(list_files(directories) - before, key=len, reverse=True)
+    for path in created:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+    print(f"Removed {len(created)} media files and directories")
+
+
+# --------------------
+# Results
+# --------------------
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, bool(dirty)
+
+
+def save_results(results, output):
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = results["run"]["started_at"].replace(":", "").replace("-", "")[:15]
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{results['run']['commit']}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results saved to {output}")
+
+
+def print_results(results):
+    print(
+        f"\n{results['requests']} requests in {results['duration_seconds']:.1f}s "
+        f"({results['requests_per_second']:.1f}/s), students finished "
+        f"{results['students'].get('finished', 0)}, failed "
+        f"{results['students'].get('failed', 0)}"
+    )
+    header = " ".join(f"{f'p{p}':>8}" for p in PERCENTILES)
+    print(f"{'endpoint':<22} {'requests':>8} {'errors':>7} {'rps':>7} {header} {'max':>8}")
+    for endpoint, stats in results["endpoints"].items():
+        cells = " ".join(f"{stats[f'p{p}']:8.3f}" for p in PERCENTILES)
+        print(
+            f"{endpoint:<22} {stats['requests']:>8} {stats['errors']:>7} "
+            f"{stats['requests_per_second']:>7.2f} {cells} {stats['max']:8.3f}"
+        )
+
+    scenes = results["scene_cache"]
+    if scenes["hit_rate"] is not None:
+        print(
+            f"\nScene cache: {scenes['hits']} hits, {scenes['misses']} misses "
+            f"({scenes['hit_rate']:.0%})"
+        )
+    for cache, stats in results["caches"].items():
+        if stats["hit_rate"] is not None:
+            print(f"  {cache:<16} {stats['hit_rate']:.0%} of {stats['hits'] + stats['misses']}")
+
+    db = results["db"]
+    for label, stats in (("writes", db["writes"]), ("commits", db["commits"])):
+        if stats["count"]:
+            p95 = stats["p95"]
+            print(
+                f"DB {label}: {stats['count']}, {stats['seconds']:.2f}s in total, "
+                f"p95 ~{p95:.3f}s" if p95 is not None else f"DB {label}: {stats['count']}"
+            )
+    print(f"DB lock errors: {db['locked_errors']}")
+    for pid, peak in results["memory"]["workers"].items():
+        print(f"Worker {pid}: {peak / 2**20:.0f} MiB peak RSS")
+
+
+def comparison_rows(results):
+    rows = {"requests/s": results["requests_per_second"]}
+    for endpoint, stats in results["endpoints"].items():
+        for p in PERCENTILES:
+            rows[f"{endpoint} p{p}"] = stats[f"p{p}"]
+        rows[f"{endpoint} errors"] = stats["errors"]
+    rows["scene cache hit rate"] = results["scene_cache"]["hit_rate"]
+    rows["db write p95"] = results["db"]["writes"]["p95"]
+    rows["db commit p95"] = results["db"]["commits"]["p95"]
+    rows["db lock errors"] = results["db"]["locked_errors"]
+    rows["peak RSS MiB"] = results["memory"]["max_bytes"] / 2**20
+    return rows
+
+
+def print_comparison(baseline, results):
+    print(
+        f"\n{'':<32} {baseline['run']['commit']:>10} {results['run']['commit']:>10} {'change':>8}"
+    )
+    before, after = comparison_rows(baseline), comparison_rows(results)
+    for name in list(before) + [name for name in after if name not in before]:
+        old, new = before.get(name), after.get(name)
+        change = ""
+        if old and new is not None:
+            change = f"{(new - old) / old:+.0%}"
+        cells = " ".join(
+            f"{value:10.3f}" if value is not None else f"{'-':>10}" for value in (old, new)
+        )
+        print(f"{name[:32]:<32} {cells} {change:>8}")
+
+
+# --------------------
+# Run
+# --------------------
+def in_process_app(args):
+    """Import the app against a temporary database and fake providers."""
+    database_dir = tempfile.mkdtemp(prefix="load_test_")
+    os.environ["DATABASE_PATH"] = os.path.join(database_dir, "load_test.db")
+    os.environ.setdefault("PROVIDERS", "fake")
+    os.environ["FAKE_LATENCY_SCALE"] = str(args.latency_scale)
+    os.environ["WARMUP_RESUME_ON_START"] = "false"
+    # Keep the run's traces out of the app's trace file
+    os.environ.setdefault("TRACE_FILE", os.path.join(database_dir, "traces.jsonl"))
+
+    import database
+    from app import create_app
+
+    app = create_app()
+    database.setup_database(app)
+    return app, database_dir
+
+
+def run(args):
+    scenarios = args.scenario or ["Cuban Missile Crisis"]
+    rng = random.Random(args.seed)
+
+    database_dir = None
+    if args.url:
+        app = None
+        make_client = lambda: HttpClient(args.url)
+        users = [(None, [None] * args.students) for _ in range(args.classes)]
+    else:
+        app, database_dir = in_process_app(args)
+        make_client = lambda: InProcessClient(app)
+        users = create_users(app, args.classes, args.students)
+        directories = media_dirs()
+        media_before = list_files(directories)
+
+    recorder = Recorder()
+    sampler = MetricsSampler(make_client())
+    sampler.scrape()
+    sampler.start()
+
+    classrooms = [
+        Classroom(number, scenarios[number % len(scenarios)], teacher_id, student_ids)
+        for number, (teacher_id, student_ids) in enumerate(users)
+    ]
+    started_at = datetime.utcnow()
+    started = time.monotonic()
+    teachers, students = [], []
+    for classroom in classrooms:
+        client = make_client()
+        if client.can_login:
+            teachers.append(
+                threading.Thread(
+                    target=run_teacher, args=(client, recorder, classroom, args), daemon=True
+                )
+            )
+        for student_id in classroom.student_ids:
+            student_rng = random.Random(rng.random())
+            students.append(
+                (
+                    classroom,
+                    threading.Thread(
+                        target=run_student,
+                        args=(make_client(), recorder, classroom, student_id, args, student_rng),
+                        daemon=True,
+                    ),
+                )
+            )
+    print(
+        f"Running {len(classrooms)} classes of {args.students} students "
+        f"({'against ' + args.url if args.url else 'in process'})"
+    )
+    for thread in teachers + [thread for _, thread in students]:
+        thread.start()
+    for classroom in classrooms:
+        for owner, thread in students:
+            if owner is classroom:
+                thread.join()
+        classroom.finished.set()
+    for thread in teachers:
+        thread.join()
+    duration = time.monotonic() - started
+    sampler.stop()
+
+    commit, dirty = git_commit()
+    requests_sent = sum(len(values) for values in recorder.latencies.values())
+    hits, misses = recorder.scenes["hits"], recorder.scenes["misses"]
+    settings = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("output", "compare", "diff", "keep_media")
+    }
+    results = {
+        "run": {
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "commit": commit,
+            "dirty": dirty,
+            "mode": "http" if args.url else "in-process",
+            "settings": settings,
+        },
+        "duration_seconds": duration,
+        "requests": requests_sent,
+        "requests_per_second": requests_sent / duration,
+        "students": dict(recorder.students),
+        "endpoints": recorder.endpoint_summary(duration),
+        "scene_cache": {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+        },
+        **server_summary(sampler),
+    }
+
+    if app is not None:
+        if not args.keep_media:
+            remove_new_media(directories, media_before)
+        shutil.rmtree(database_dir, ignore_errors=True)
+    return results
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(args):
+    if args.diff:
+        print_comparison(load(args.diff[0]), load(args.diff[1]))
+        return
+
+    results = run(args)
+    print_results(results)
+    save_results(results, args.output)
+    if args.compare:
+        print_comparison(load(args.compare), results)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Start-up Time Benchmark
+
+Times, each in a fresh Python process, how long the app and the scripts take
+to start, since that is paid by every worker boot, every deploy and every
+script run:
+
+    import_app          import app
+    create_app          import app and create the application
+    first_request       create the application and serve GET /api/scenarios
+                        (a worker's boot until its first response)
+    <script>            python scripts/<script>.py --help, for every script
+                        (its imports, up to parsing the command line)
+
+The app runs against a new temporary database (DATABASE_PATH) with
+PROVIDERS=fake. With --importtime, the modules taking the longest to import
+under `import app` are listed too (from python -X importtime).
+
+The run fails (exit status 1) when, with --baseline, the median of a
+benchmark regressed by more than --max-regression against a saved run.
+
+Results are saved as JSON in benchmarks/results/, like the load test's.
+
+Usage:
+    python benchmarks/startup_bench.py
+    python benchmarks/startup_bench.py --runs 20 --importtime
+    python benchmarks/startup_bench.py --baseline benchmarks/results/BASELINE.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+# Add the parent directory to the path so we can import from the project
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from load_test import RESULTS_DIR, git_commit, percentile
+
+SCRIPTS_DIR = os.path.join(ROOT_DIR, "scripts")
+
+# Python run by the app benchmarks, in a fresh process each
+APP_BENCHMARKS = {
+    "import_app": "import app",
+    "create_app": "import app; app.create_app()",
+    "first_request": (
+        "import app; "
+        "response = app.create_app().test_client().get('/api/scenarios'); "
+        "assert response.status_code == 200, response.status_code"
+    ),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark app and script start-up")
+    parser.add_argument("--runs", type=int, default=10, help="Timed runs per benchmark")
+    parser.add_argument("--only", action="append", help="Run only this benchmark (repeatable)")
+    parser.add_argument(
+        "--importtime", action="store_true", help="List the slowest imports of the app"
+    )
+    parser.add_argument("--top", type=int, default=15, help="Imports to list with --importtime")
+    parser.add_argument("--baseline", help="Saved run to check for regressions against")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=1.3,
+        help="Largest allowed ratio of the median to the baseline's median",
+    )
+    parser.add_argument("--output", help="Where to save the results")
+    return parser.parse_args()
+
+
+def benchmarks():
+    """Command line of every benchmark, by name."""
+    selected = {
+        name: [sys.executable, "-c", code] for name, code in APP_BENCHMARKS.items()
+    }
+    for filename in sorted(os.listdir(SCRIPTS_DIR)):
+        if filename.endswith(".py"):
+            selected[filename[:-3]] = [
+                sys.executable,
+                os.path.join(SCRIPTS_DIR, filename),
+                "--help",
+            ]
+    return selected
+
+
+def run_benchmark(command, runs, env):
+    """Wall-clock seconds of each run of a command."""
+    seconds = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+        seconds.append(time.perf_counter() - started)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{' '.join(command)} failed:\n{completed.stderr}")
+    return sorted(seconds)
+
+
+def slowest_imports(env, top):
+    """(cumulative ms, module) of the slowest imports under `import app`."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit():
+            imports.append((int(cumulative) / 1000, module.rstrip()))
+    # Only the modules app.py imports itself and their direct imports
+    imports = [
+        (ms, module)
+        for ms, module in imports
+        if len(module) - len(module.lstrip()) <= 5 and module.strip() != "app"
+    ]
+    return sorted(imports, reverse=True)[:top]
+
+
+def check(name, result, baseline, max_regression):
+    previous = (baseline or {}).get("benchmarks", {}).get(name)
+    if previous and result["p50_ms"] > previous["p50_ms"] * max_regression:
+        return [f"median {result['p50_ms']:.0f}ms regressed from {previous['p50_ms']:.0f}ms"]
+    return []
+
+
+def print_results(results):
+    print(f"\n{'benchmark':<20} {'p50 ms':>9} {'p95 ms':>9} {'min ms':>9}")
+    for name, result in results["benchmarks"].items():
+        print(
+            f"{name:<20} {result['p50_ms']:9.0f} {result['p95_ms']:9.0f} {result['min_ms']:9.0f}"
+        )
+    if results.get("imports"):
+        print("\nSlowest imports under `import app` (cumulative ms):")
+        for ms, module in results["imports"]:
+            print(f"{ms:9.1f}  {module}")
+    for name, failures in results["failures"].items():
+        for failure in failures:
+            print(f"FAIL {name}: {failure}")
+
+
+def main(args):
+    selected = benchmarks()
+    for name in args.only or []:
+        if name not in selected:
+            sys.exit(f"Unknown benchmark '{name}', pick from {', '.join(selected)}")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    temporary_dir = tempfile.mkdtemp(prefix="startup_bench_")
+    try:
+        path = os.path.join(temporary_dir, "startup.db")
+        from database.seed import create_schema
+
+        create_schema(path)
+        env = dict(
+            os.environ,
+            DATABASE_PATH=path,
+            PROVIDERS="fake",
+            WARMUP_RESUME_ON_START="false",
+            TRACE_FILE=os.path.join(temporary_dir, "traces.jsonl"),
+        )
+
+        commit, dirty = git_commit()
+        results = {
+            "run": {
+                "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+                "commit": commit,
+                "dirty": dirty,
+                "runs": args.runs,
+                "python": sys.version.split()[0],
+            },
+            "benchmarks": {},
+            "failures": {},
+        }
+        for name, command in selected.items():
+            if args.only and name not in args.only:
+                continue
+            seconds = run_benchmark(command, args.runs, env)
+            result = {
+                "p50_ms": percentile(seconds, 50) * 1000,
+                "p95_ms": percentile(seconds, 95) * 1000,
+                "min_ms": seconds[0] * 1000,
+            }
+            results["benchmarks"][name] = result
+            failures = check(name, result, baseline, args.max_regression)
+            if failures:
+                results["failures"][name] = failures
+        if args.importtime:
+            results["imports"] = slowest_imports(env, args.top)
+    finally:
+        shutil.rmtree(temporary_dir, ignore_errors=True)
+
+    print_results(results)
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = results["run"]["started_at"].replace(":", "").replace("-", "")[:15]
+        output = os.path.join(RESULTS_DIR, f"startup_{stamp}_{commit}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results saved to {output}")
+    if results["failures"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_args())
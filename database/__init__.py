@@ -1,23 +1,51 @@
 # Database package initialization
 import os
-from flask import Flask
+import time
+import asyncio
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from api import metrics
 from .models import db as sqlalchemy_db
 from .db import init_db, close_db
 
+# Absolute path to the SQLite database used by the application; DATABASE_PATH
+# points a run (e.g. a load test) at another database
+BASE_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+DB_PATH = os.environ.get(
+    "DATABASE_PATH", os.path.join(BASE_DIR, "rewritten", "database", "rewritten.db")
+)
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+# SQLite takes its write lock on the first write of a transaction, so the time
+# of write statements includes the wait for other writers
+DB_WRITE_SECONDS = metrics.histogram(
+    "db_write_seconds",
+    "Seconds spent executing write statements, including waits for the write lock",
+    ("statement",),
+)
+DB_LOCKED = metrics.counter(
+    "db_locked_errors_total", "Statements that failed because the database was locked"
+)
+
 
 def init_app(app: Flask):
-    """Initialize the application with SQLAlchemy database."""
-    # Get the absolute path to the project root directory
-    base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+    """
+    Initialize the application with SQLAlchemy database.
 
+    This only configures the app; creating the tables and migrating the old
+    database is left to setup_database (`flask setup-db`), so starting a
+    worker or a script does no schema work.
+    """
     # Define path to database directory and ensure it exists
-    db_dir = os.path.join(base_dir, "rewritten", "database")
+    db_dir = os.path.dirname(DB_PATH)
     if not os.path.exists(db_dir):
         os.makedirs(db_dir, exist_ok=True)
 
     # Configure SQLAlchemy with absolute path
-    db_path = os.path.join(base_dir, "rewritten", "database", "rewritten.db")
-    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_PATH}"
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
     # Initialize SQLAlchemy
@@ -26,6 +54,14 @@ def init_app(app: Flask):
     # Register the close_db function to be called when cleaning up after a request
     app.teardown_appcontext(close_db)
 
+    with app.app_context():
+        instrument_engine(sqlalchemy_db.engine)
+
+    app.cli.add_command(setup_db_command)
+
+
+def setup_database(app: Flask):
+    """Create missing tables and migrate data from the old database if there is one."""
     with app.app_context():
         # Create SQLAlchemy tables
         sqlalchemy_db.create_all()
@@ -40,6 +76,52 @@ def init_app(app: Flask):
             migrate_old_to_new(app)
 
 
+@click.command("setup-db")
+@with_appcontext
+def setup_db_command():
+    """Create the database tables and migrate the old database."""
+    setup_database(current_app)
+    print(f"Database ready at {DB_PATH}")
+
+
+async def run_in_thread(fn, *args, **kwargs):
+    """
+    Run blocking database work from a coroutine, in a worker thread.
+
+    The session is closed afterwards, so its connection goes back to the pool
+    instead of staying checked out while the coroutine waits on a provider.
+    Return plain data rather than model instances, which are detached by then.
+    """
+
+    def run():
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sqlalchemy_db.session.close()
+
+    return await asyncio.to_thread(run)
+
+
+def instrument_engine(engine):
+    """Time write statements and count lock errors of an engine into /metrics."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info["statement_started"] = time.monotonic()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def record_write(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("statement_started", None)
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        if started is not None and verb in WRITE_STATEMENTS:
+            DB_WRITE_SECONDS.observe(time.monotonic() - started, statement=verb.lower())
+
+    @event.listens_for(engine, "handle_error")
+    def count_lock_errors(context):
+        if "database is locked" in str(context.original_exception):
+            DB_LOCKED.inc()
+
+
 def needs_migration():
     """
     Check if we need to migrate data from old database format.
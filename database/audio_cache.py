@@ -0,0 +1,251 @@
+import os
+import json
+import hashlib
+from sqlalchemy.exc import IntegrityError
+from . import cache_touch
+from .models import db, CachedAudio, SceneCache, SCENE_AUDIO_URL
+
+# Disk budget for cached narration; least recently used clips are evicted beyond it
+AUDIO_CACHE_MAX_BYTES = int(os.environ.get("AUDIO_CACHE_MAX_BYTES", str(512 * 1024**2)))
+
+
+class AudioCache:
+    """
+    A class to manage the cache of generated narration.
+    Clips are looked up by text, voice, model and voice settings; clips with
+    identical audio share a single file on disk.
+    """
+
+    @staticmethod
+    def make_key(text, voice_id, model_id, voice_settings=None):
+        """
+        Build the cache key for a text-to-speech request.
+
+        Args:
+            text: The text to convert to speech
+            voice_id: The voice ID
+            model_id: The TTS model ID
+            voice_settings: The voice settings dictionary
+
+        Returns:
+            Hex SHA-256 digest identifying the request
+        """
+        payload = json.dumps(
+            {
+                "text": text,
+                "voice_id": voice_id,
+                "model_id": model_id,
+                "voice_settings": voice_settings or {},
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_static_audio_dir():
+        """
+        Get the absolute path to the audio cache directory.
+        Creates the directory if it doesn't exist.
+
+        Returns:
+            Absolute path to the audio cache directory
+        """
+        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        audio_dir = os.path.join(root_dir, "static", "audio", "cache")
+
+        if not os.path.exists(audio_dir):
+            os.makedirs(audio_dir, exist_ok=True)
+
+        return audio_dir
+
+    @staticmethod
+    def get_audio(cache_key):
+        """
+        Find cached narration by its cache key.
+
+        Args:
+            cache_key: Key from make_key()
+
+        Returns:
+            The CachedAudio object if found and still on disk, None otherwise
+        """
+        audio = CachedAudio.query.filter_by(cache_key=cache_key).first()
+        if not audio:
+            return None
+
+        # The file may have been removed by hand; forget the entry then
+        audio_path = os.path.join(AudioCache.get_static_audio_dir(), audio.filename)
+        if not os.path.exists(audio_path):
+            db.session.delete(audio)
+            db.session.commit()
+            return None
+
+        # A hit stays a read; its last-used time is written in a batch
+        cache_touch.touch(CachedAudio, audio.id)
+        return audio
+
+    @staticmethod
+    def save_audio(cache_key, data, text, voice_id, model_id, voice_settings=None, extension=".mp3"):
+        """
+        Store generated narration and register it in the cache.
+
+        The file is named after the digest of its contents, so identical audio
+        is only written once.
+
+        Args:
+            cache_key: Key from make_key()
+            data: The audio bytes
+            text: The narrated text
+            voice_id: The voice ID used
+            model_id: The TTS model ID used
+            voice_settings: The voice settings used
+            extension: The file extension (default: .mp3)
+
+        Returns:
+            The database CachedAudio object
+        """
+        content_hash = hashlib.sha256(data).hexdigest()
+        filename = f"{content_hash}{extension}"
+        audio_path = os.path.join(AudioCache.get_static_audio_dir(), filename)
+        if not os.path.exists(audio_path):
+            with open(audio_path, "wb") as file:
+                file.write(data)
+
+        return AudioCache._register(
+            cache_key, content_hash, filename, len(data), text, voice_id, model_id, voice_settings
+        )
+
+    @staticmethod
+    def save_audio_file(cache_key, temp_path, text, voice_id, model_id, voice_settings=None, extension=".mp3"):
+        """
+        Move a fully written audio file (e.g. the tee of a stream) into the cache.
+
+        Args:
+            cache_key: Key from make_key()
+            temp_path: Path of the finished audio file; it is moved or removed
+            text, voice_id, model_id, voice_settings: As for save_audio()
+            extension: The file extension (default: .mp3)
+
+        Returns:
+            The database CachedAudio object
+        """
+        digest = hashlib.sha256()
+        with open(temp_path, "rb") as file:
+            for block in iter(lambda: file.read(65536), b""):
+                digest.update(block)
+        content_hash = digest.hexdigest()
+        size_bytes = os.path.getsize(temp_path)
+
+        filename = f"{content_hash}{extension}"
+        audio_path = os.path.join(AudioCache.get_static_audio_dir(), filename)
+        if os.path.exists(audio_path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, audio_path)
+
+        return AudioCache._register(
+            cache_key, content_hash, filename, size_bytes, text, voice_id, model_id, voice_settings
+        )
+
+    @staticmethod
+    def _register(cache_key, content_hash, filename, size_bytes, text, voice_id, model_id, voice_settings):
+        audio = CachedAudio(
+            cache_key=cache_key,
+            content_hash=content_hash,
+            filename=filename,
+            url_path=f"/static/audio/cache/{filename}",
+            text=text,
+            voice_id=voice_id,
+            model_id=model_id,
+            voice_settings=json.dumps(voice_settings or {}, sort_keys=True),
+            size_bytes=size_bytes,
+        )
+        db.session.add(audio)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Generated concurrently by another request
+            db.session.rollback()
+            return AudioCache.get_audio(cache_key) or audio
+
+        AudioCache.evict(keep=cache_key)
+        return audio
+
+    @staticmethod
+    def total_size():
+        """Bytes on disk used by the cache (shared files are counted once)."""
+        files = (
+            db.session.query(CachedAudio.content_hash, db.func.max(CachedAudio.size_bytes))
+            .group_by(CachedAudio.content_hash)
+            .all()
+        )
+        return sum(size or 0 for _, size in files)
+
+    @staticmethod
+    def is_referenced(audio):
+        """Whether a cached scene still plays this clip (an index lookup)."""
+        return (
+            db.session.query(SceneCache.id)
+            .filter(SCENE_AUDIO_URL == audio.url_path)
+            .first()
+            is not None
+        )
+
+    @staticmethod
+    def evict(max_bytes=None, keep=None):
+        """
+        Remove least recently used clips until the cache fits its budget.
+
+        Clips played by a cached scene are kept: the scene cache hands their
+        URLs to every student who reaches that scene.
+
+        Args:
+            max_bytes: Disk budget in bytes (default: AUDIO_CACHE_MAX_BYTES)
+            keep: Cache key that must not be evicted (e.g. the clip just saved)
+
+        Returns:
+            Number of clips removed
+        """
+        max_bytes = AUDIO_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        total = AudioCache.total_size()
+        if total <= max_bytes:
+            return 0
+        # Rank by the hits of this process too
+        cache_touch.flush()
+
+        candidates = (
+            CachedAudio.query.filter(CachedAudio.cache_key != keep)
+            .order_by(CachedAudio.last_used_at.asc())
+            .all()
+        )
+
+        removed = 0
+        for audio in candidates:
+            if total <= max_bytes:
+                break
+            if AudioCache.is_referenced(audio):
+                continue
+
+            content_hash, filename, size_bytes = (
+                audio.content_hash,
+                audio.filename,
+                audio.size_bytes,
+            )
+            db.session.delete(audio)
+            db.session.commit()
+            removed += 1
+
+            # Only remove the file once no other clip shares it
+            if CachedAudio.query.filter_by(content_hash=content_hash).first():
+                continue
+            try:
+                audio_path = os.path.join(AudioCache.get_static_audio_dir(), filename)
+                if os.path.exists(audio_path):
+                    os.remove(audio_path)
+            except OSError as e:
+                print(f"Error deleting cached audio {filename}: {e}")
+            total -= size_bytes or 0
+
+        if removed:
+            print(f"Evicted {removed} cached audio clips")
+        return removed
@@ -0,0 +1,62 @@
+"""
+Batched last-used times for the file caches.
+
+A cache hit should stay a read. Instead of committing a last_used_at update on
+every hit, which takes SQLite's write lock and commits whatever else the
+caller's session holds, ImageCache and AudioCache queue the hit here. A
+background thread writes the queued times every CACHE_TOUCH_SECONDS, one
+executemany per table over a connection of its own, so eviction order lags
+hits by at most that long.
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from . import DB_PATH
+
+# Seconds between writes of queued last-used times
+CACHE_TOUCH_SECONDS = float(os.environ.get("CACHE_TOUCH_SECONDS", "30"))
+
+# Table -> {row id: last used at} of hits not written yet
+_pending = {}
+_lock = threading.Lock()
+_timer = None
+
+
+def touch(model, row_id):
+    """Queue a hit on a cache row; its last_used_at is written with the next batch."""
+    global _timer
+    with _lock:
+        _pending.setdefault(model.__tablename__, {})[row_id] = datetime.utcnow()
+        if _timer is None:
+            _timer = threading.Timer(CACHE_TOUCH_SECONDS, flush)
+            _timer.daemon = True
+            _timer.start()
+
+
+def flush():
+    """Write the queued last-used times now (e.g. before choosing what to evict)."""
+    global _pending, _timer
+    with _lock:
+        pending, _pending = _pending, {}
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+    if not pending:
+        return
+
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        with conn:
+            for table, rows in pending.items():
+                conn.executemany(
+                    f"UPDATE {table} SET last_used_at = ? WHERE id = ?",
+                    [
+                        (used_at.strftime("%Y-%m-%d %H:%M:%S.%f"), row_id)
+                        for row_id, used_at in rows.items()
+                    ],
+                )
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Error writing cache last-used times: {e}")
@@ -5,13 +5,13 @@ from flask import g
 
 def get_db():
     """Connect to the database."""
+    from database import DB_PATH
+
     if "db" not in g:
-        if not os.path.exists("rewritten/database"):
-            os.makedirs("rewritten/database")
+        if not os.path.exists(os.path.dirname(DB_PATH)):
+            os.makedirs(os.path.dirname(DB_PATH))
 
-        g.db = sqlite3.connect(
-            "rewritten/database/rewritten.db", detect_types=sqlite3.PARSE_DECLTYPES
-        )
+        g.db = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
         g.db.row_factory = sqlite3.Row
 
     return g.db
@@ -0,0 +1,221 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from . import cache_touch
+from .models import db, CachedImage
+
+# Disk budget for cached images; least recently used images are evicted beyond it
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(1024**3)))
+
+# Pins not refreshed for this long are assumed to belong to a crashed job
+IMAGE_PIN_TTL_SECONDS = int(os.environ.get("IMAGE_PIN_TTL_SECONDS", "3600"))
+
+
+class ImageCache:
+    """
+    A class to manage the cache of generated images.
+    Images are stored once per (model, prompt, parameters) and evicted
+    least-recently-used first once the cache grows beyond its disk budget.
+    """
+
+    @staticmethod
+    def make_key(model, prompt, params=None):
+        """
+        Build the cache key for an image generation request.
+
+        Args:
+            model: The image model (e.g., 'black-forest-labs/flux-1.1-pro')
+            prompt: The prompt used to generate the image
+            params: Any other generation parameters
+
+        Returns:
+            Hex SHA-256 digest identifying the request
+        """
+        payload = json.dumps(
+            {"model": model, "prompt": prompt, "params": params or {}}, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_static_image_dir():
+        """
+        Get the absolute path to the image cache directory.
+        Creates the directory if it doesn't exist.
+
+        Returns:
+            Absolute path to the image cache directory
+        """
+        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        image_dir = os.path.join(root_dir, "static", "images", "cache")
+
+        if not os.path.exists(image_dir):
+            os.makedirs(image_dir, exist_ok=True)
+
+        return image_dir
+
+    @staticmethod
+    def get_image_path(image):
+        """Get the full filesystem path to a cached image."""
+        return os.path.join(ImageCache.get_static_image_dir(), image.filename)
+
+    @staticmethod
+    def get_image(cache_key, pin=False):
+        """
+        Find a cached image by its cache key.
+
+        A plain hit only queues its last-used time (see cache_touch); pinning
+        is a write and is committed.
+
+        Args:
+            cache_key: Key from make_key()
+            pin: Also pin the image (see acquire())
+
+        Returns:
+            The CachedImage object if found and still on disk, None otherwise
+        """
+        image = CachedImage.query.filter_by(cache_key=cache_key).first()
+        if not image:
+            return None
+
+        # The file may have been removed by hand; forget the entry then
+        if not os.path.exists(ImageCache.get_image_path(image)):
+            db.session.delete(image)
+            db.session.commit()
+            return None
+
+        if pin:
+            ImageCache.acquire(image.url_path)
+        else:
+            cache_touch.touch(CachedImage, image.id)
+        return image
+
+    @staticmethod
+    def save_image(cache_key, data, model, prompt, params=None, extension=".webp", pin=False):
+        """
+        Store a generated image and register it in the cache.
+
+        Args:
+            cache_key: Key from make_key()
+            data: The image bytes
+            model: The image model used
+            prompt: The prompt used to generate the image
+            params: Any other generation parameters
+            extension: The file extension (default: .webp)
+            pin: Also pin the image (see acquire())
+
+        Returns:
+            The database CachedImage object
+        """
+        filename = f"{cache_key}{extension}"
+        image_path = os.path.join(ImageCache.get_static_image_dir(), filename)
+        with open(image_path, "wb") as file:
+            file.write(data)
+
+        image = CachedImage(
+            cache_key=cache_key,
+            filename=filename,
+            url_path=f"/static/images/cache/{filename}",
+            model=model,
+            prompt=prompt,
+            params=json.dumps(params or {}, sort_keys=True),
+            size_bytes=len(data),
+            ref_count=1 if pin else 0,
+        )
+        db.session.add(image)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Rendered concurrently by another job; the file contents are equivalent
+            db.session.rollback()
+            image = ImageCache.get_image(cache_key, pin=pin)
+
+        ImageCache.evict(keep=cache_key)
+        return image
+
+    @staticmethod
+    def acquire(url_path):
+        """
+        Pin a cached image so it is not evicted while a video job still needs it.
+        Every acquire() must be matched by a release().
+        """
+        CachedImage.query.filter_by(url_path=url_path).update(
+            {
+                "ref_count": CachedImage.ref_count + 1,
+                "last_used_at": datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+
+    @staticmethod
+    def release(url_path):
+        """Unpin a cached image once a dependent video job has finished."""
+        CachedImage.query.filter(
+            CachedImage.url_path == url_path, CachedImage.ref_count > 0
+        ).update(
+            {"ref_count": CachedImage.ref_count - 1}, synchronize_session=False
+        )
+        db.session.commit()
+
+    @staticmethod
+    def total_size():
+        return db.session.query(db.func.sum(CachedImage.size_bytes)).scalar() or 0
+
+    @staticmethod
+    def evict(max_bytes=None, keep=None):
+        """
+        Remove least recently used, unpinned images until the cache fits its budget.
+
+        Args:
+            max_bytes: Disk budget in bytes (default: IMAGE_CACHE_MAX_BYTES)
+            keep: Cache key that must not be evicted (e.g. the image just saved)
+
+        Returns:
+            Number of images removed
+        """
+        max_bytes = IMAGE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        total = ImageCache.total_size()
+        if total > max_bytes:
+            # Rank by the hits of this process too
+            cache_touch.flush()
+        if total <= max_bytes:
+            return 0
+
+        stale_pins_before = datetime.utcnow() - timedelta(seconds=IMAGE_PIN_TTL_SECONDS)
+        evictable = db.or_(
+            CachedImage.ref_count <= 0,
+            CachedImage.last_used_at < stale_pins_before,
+        )
+        candidates = (
+            CachedImage.query.filter(CachedImage.cache_key != keep, evictable)
+            .order_by(CachedImage.last_used_at.asc())
+            .all()
+        )
+
+        removed = 0
+        for image in candidates:
+            if total <= max_bytes:
+                break
+            image_id, filename, size_bytes = image.id, image.filename, image.size_bytes
+            # Re-check the pin in the DELETE itself: a job may have pinned the
+            # image since it was selected
+            deleted = CachedImage.query.filter(
+                CachedImage.id == image_id, evictable
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            if not deleted:
+                continue
+            try:
+                image_path = os.path.join(ImageCache.get_static_image_dir(), filename)
+                if os.path.exists(image_path):
+                    os.remove(image_path)
+            except OSError as e:
+                print(f"Error deleting cached image {filename}: {e}")
+            total -= size_bytes or 0
+            removed += 1
+
+        if removed:
+            print(f"Evicted {removed} cached images")
+        return removed
@@ -1,24 +1,186 @@
+"""
+Migration of the old SQLite database (backup/rewritten_old.db) to the
+SQLAlchemy models.
+
+Source rows are streamed in rowid order, one batch at a time, so memory stays
+constant however large the old database is. Each batch is written in one
+transaction: rows that already exist are skipped set-based (one IN query per
+batch of sessions, INSERT ... ON CONFLICT DO NOTHING for the scene cache and
+videos), and the batch's last rowid is saved to the migration_checkpoints
+table in the same transaction. An interrupted migration resumes after the last
+committed batch, and running it again only copies rows added since.
+
+Like circuit_breakers, migration_checkpoints is not a model: it is created
+with plain SQL in the target database.
+
+Settings are read from the environment:
+
+    MIGRATION_BATCH_SIZE    source rows per batch and transaction (5000)
+"""
+
 import os
 import sqlite3
-import json
+from datetime import datetime
 from flask import Flask
-from .models import db, Session, NarrativeData, ScenePrompt, MediaUrl, SceneCache, Video
+from .models import db
+
+MIGRATION_BATCH_SIZE = int(os.environ.get("MIGRATION_BATCH_SIZE", "5000"))
+
+BASE_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+OLD_DB_PATH = os.path.join(BASE_DIR, "backup", "rewritten_old.db")
+
+VIDEO_EXTENSIONS = (".mp4", ".webm", ".mov")
+
+# Old sessions columns copied into a table of their own, keyed by session_id
+SESSION_DATA_TABLES = {
+    "narrative_data": "narrative_data",
+    "scene_prompts": "scene_prompts",
+    "media_urls": "media_urls",
+}
+
+
+def ensure_checkpoint_table(conn):
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE IF NOT EXISTS migration_checkpoints (
+            source TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            last_rowid INTEGER NOT NULL,
+            rows_copied INTEGER NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (source, table_name)
+        )
+        """
+    )
+
 
+def load_checkpoint(conn, source, table):
+    """(last rowid, rows copied) of a source table, (0, 0) if never migrated."""
+    row = conn.exec_driver_sql(
+        "SELECT last_rowid, rows_copied FROM migration_checkpoints "
+        "WHERE source = ? AND table_name = ?",
+        (source, table),
+    ).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
 
-def migrate_old_to_new(app):
+
+def save_checkpoint(conn, source, table, last_rowid, rows_copied):
+    conn.exec_driver_sql(
+        "INSERT INTO migration_checkpoints "
+        "(source, table_name, last_rowid, rows_copied, updated_at) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (source, table_name) DO UPDATE SET last_rowid = excluded.last_rowid, "
+        "rows_copied = excluded.rows_copied, updated_at = excluded.updated_at",
+        (source, table, last_rowid, rows_copied, datetime.utcnow().isoformat(" ")),
+    )
+
+
+def stream_rows(old_conn, table, columns, after_rowid, batch_size):
+    """Batches of (rowid, *columns) rows with rowids above after_rowid, in rowid order."""
+    select = ", ".join(["rowid"] + columns)
+    while True:
+        batch = old_conn.execute(
+            f"SELECT {select} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (after_rowid, batch_size),
+        ).fetchall()
+        if not batch:
+            return
+        yield batch
+        after_rowid = batch[-1][0]
+
+
+def table_columns(old_conn, table):
+    return [row[1] for row in old_conn.execute(f"PRAGMA table_info({table})")]
+
+
+def copy_table(engine, old_conn, source, table, columns, write_batch, batch_size):
+    """
+    Copy a source table batch by batch, resuming from its checkpoint.
+
+    write_batch(conn, rows, now) writes the rows of a batch (without their
+    rowids) to the target and returns how many it inserted.
+    """
+    with engine.begin() as conn:
+        last_rowid, copied = load_checkpoint(conn, source, table)
+    if last_rowid:
+        print(f"Resuming {table} after row {last_rowid} ({copied} rows copied)")
+
+    for batch in stream_rows(old_conn, table, columns, last_rowid, batch_size):
+        now = datetime.utcnow().isoformat(" ")
+        with engine.begin() as conn:
+            copied += write_batch(conn, [row[1:] for row in batch], now)
+            save_checkpoint(conn, source, table, batch[-1][0], copied)
+        print(f"Migrated {table} up to row {batch[-1][0]} ({copied} rows copied)")
+    return copied
+
+
+def write_sessions(columns):
+    """Batch writer of old sessions and the data tables split out of them."""
+    data_columns = [column for column in SESSION_DATA_TABLES if column in columns]
+
+    def write_batch(conn, rows, now):
+        rows = [dict(zip(columns, row)) for row in rows]
+        ids = [row["id"] for row in rows]
+        # Skip the sessions (and their data) that are already in the new database
+        existing = {
+            row[0]
+            for row in conn.exec_driver_sql(
+                f"SELECT id FROM sessions WHERE id IN ({', '.join('?' * len(ids))})",
+                tuple(ids),
+            )
+        }
+        rows = [row for row in rows if row["id"] not in existing]
+        if not rows:
+            return 0
+
+        conn.exec_driver_sql(
+            "INSERT INTO sessions (id, scenario, current_scene_id, partial_narrative, "
+            "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    row["id"],
+                    row["scenario"],
+                    row["current_scene_id"],
+                    row["partial_narrative"],
+                    now,
+                    now,
+                )
+                for row in rows
+            ],
+        )
+        for column in data_columns:
+            values = [(row["id"], row[column], now) for row in rows if row[column]]
+            if values:
+                conn.exec_driver_sql(
+                    f"INSERT INTO {SESSION_DATA_TABLES[column]} (session_id, data, created_at) "
+                    "VALUES (?, ?, ?) ON CONFLICT (session_id) DO NOTHING",
+                    values,
+                )
+        return len(rows)
+
+    return write_batch
+
+
+def write_scene_cache(conn, rows, now):
+    before = conn.exec_driver_sql("SELECT total_changes()").scalar()
+    conn.exec_driver_sql(
+        "INSERT INTO scene_cache (scenario, partial_narrative, next_narrative, "
+        "next_scene_prompts, next_media_urls, created_at) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (scenario, partial_narrative) DO NOTHING",
+        [row + (now,) for row in rows],
+    )
+    return conn.exec_driver_sql("SELECT total_changes()").scalar() - before
+
+
+def migrate_old_to_new(app, old_db_path=OLD_DB_PATH, batch_size=MIGRATION_BATCH_SIZE):
     """
     Migrate data from the old SQLite database to the new SQLAlchemy models.
 
     Args:
         app: Flask application instance with SQLAlchemy configured
+        old_db_path: The old database to copy from
+        batch_size: Source rows per batch and transaction
     """
-    # Get the absolute path to the project root directory
-    base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
-
-    # Define paths - use the backup database as source
-    old_db_path = os.path.join(base_dir, "backup", "rewritten_old.db")
     new_db_uri = app.config["SQLALCHEMY_DATABASE_URI"]
-
     print(f"Migrating from {old_db_path} to {new_db_uri}")
 
     # Check if old database exists
@@ -26,128 +188,77 @@ def migrate_old_to_new(app):
         print(f"Old database {old_db_path} not found. Nothing to migrate.")
         return
 
+    source = os.path.abspath(old_db_path)
+    old_conn = sqlite3.connect(f"file:{old_db_path}?mode=ro", uri=True)
     try:
-        # Connect to the old database
-        old_conn = sqlite3.connect(old_db_path)
-        old_conn.row_factory = sqlite3.Row
-        old_cursor = old_conn.cursor()
-
         with app.app_context():
-            # Check table structure
-            try:
-                old_cursor.execute("PRAGMA table_info(sessions)")
-                columns = {col["name"] for col in old_cursor.fetchall()}
-                print(f"Columns in old sessions table: {columns}")
-
-                # We need at least these columns for basic migration
-                required_cols = {
-                    "id",
-                    "scenario",
-                    "current_scene_id",
-                    "partial_narrative",
-                }
-                if not required_cols.issubset(columns):
-                    print(
-                        f"Old database missing required columns: {required_cols - columns}"
-                    )
-                    return
-
-            except sqlite3.Error as e:
-                print(f"Error checking old database structure: {e}")
+            engine = db.engine
+            with engine.begin() as conn:
+                ensure_checkpoint_table(conn)
+
+            # We need at least these columns for basic migration
+            columns = table_columns(old_conn, "sessions")
+            required_cols = {"id", "scenario", "current_scene_id", "partial_narrative"}
+            if not required_cols.issubset(columns):
+                print(f"Old database missing required columns: {required_cols - set(columns)}")
                 return
+            session_columns = sorted(required_cols) + [
+                column for column in SESSION_DATA_TABLES if column in columns
+            ]
+            sessions = copy_table(
+                engine,
+                old_conn,
+                source,
+                "sessions",
+                session_columns,
+                write_sessions(session_columns),
+                batch_size,
+            )
 
-            # Migrate sessions
-            old_cursor.execute("SELECT * FROM sessions")
-            sessions = old_cursor.fetchall()
-            print(f"Found {len(sessions)} sessions to migrate")
-
-            for session_data in sessions:
-                # Check if this session already exists in the new database
-                existing = Session.query.get(session_data["id"])
-                if existing:
-                    # print(f"Session {session_data['id']} already exists in new database. Skipping.")
-                    continue
-
-                # Create new session object
-                session = Session(
-                    id=session_data["id"],
-                    scenario=session_data["scenario"],
-                    current_scene_id=session_data["current_scene_id"],
-                    partial_narrative=session_data["partial_narrative"],
-                )
-                db.session.add(session)
-
-                # Create related objects if data exists
-                if "narrative_data" in session_data and session_data["narrative_data"]:
-                    narrative = NarrativeData(
-                        session_id=session_data["id"],
-                        data=session_data["narrative_data"],
-                    )
-                    db.session.add(narrative)
-
-                if "scene_prompts" in session_data and session_data["scene_prompts"]:
-                    prompts = ScenePrompt(
-                        session_id=session_data["id"],
-                        data=session_data["scene_prompts"],
-                    )
-                    db.session.add(prompts)
-
-                if "media_urls" in session_data and session_data["media_urls"]:
-                    media = MediaUrl(
-                        session_id=session_data["id"], data=session_data["media_urls"]
-                    )
-                    db.session.add(media)
-
-            # Migrate scene cache
             try:
-                old_cursor.execute("SELECT * FROM scene_cache")
-                cache_entries = old_cursor.fetchall()
-                print(f"Found {len(cache_entries)} cache entries to migrate")
-
-                for cache_data in cache_entries:
-                    # Check if this cache entry already exists in the new database
-                    existing = SceneCache.query.filter_by(
-                        scenario=cache_data["scenario"],
-                        partial_narrative=cache_data["partial_narrative"],
-                    ).first()
-
-                    if existing:
-                        print(
-                            f"Cache entry for scenario '{cache_data['scenario']}' with same partial narrative already exists. Skipping."
-                        )
-                        continue
-
-                    # Create new cache entry
-                    cache = SceneCache(
-                        scenario=cache_data["scenario"],
-                        partial_narrative=cache_data["partial_narrative"],
-                        next_narrative=cache_data["next_narrative"],
-                        next_scene_prompts=cache_data["next_scene_prompts"],
-                        next_media_urls=cache_data["next_media_urls"],
-                    )
-                    db.session.add(cache)
+                cache_entries = copy_table(
+                    engine,
+                    old_conn,
+                    source,
+                    "scene_cache",
+                    [
+                        "scenario",
+                        "partial_narrative",
+                        "next_narrative",
+                        "next_scene_prompts",
+                        "next_media_urls",
+                    ],
+                    write_scene_cache,
+                    batch_size,
+                )
             except sqlite3.Error as e:
                 print(f"Error migrating scene cache: {e}")
+                cache_entries = 0
 
             # Scan the videos directory and create Video records
-            migrate_videos(app)
-
-            # Commit all changes
-            db.session.commit()
-            print("Migration completed successfully")
-
+            videos = migrate_videos(app, batch_size)
+            print(
+                f"Migration completed successfully: {sessions} sessions and "
+                f"{cache_entries} cache entries copied in total, {videos} new videos"
+            )
+            if videos:
+                print(
+                    "Run scripts/transcode_renditions.py to transcode the HLS "
+                    "renditions of the migrated scene videos"
+                )
     except Exception as e:
+        # Committed batches stay, and the next run resumes after them
         print(f"Error during migration: {e}")
-        if "db" in locals():
-            db.session.rollback()
     finally:
-        if "old_conn" in locals():
-            old_conn.close()
+        old_conn.close()
 
 
-def migrate_videos(app):
+def migrate_videos(app, batch_size=MIGRATION_BATCH_SIZE):
     """
     Scan the videos directory and create Video records for all videos.
+
+    Returns:
+        Number of records created
     """
     from .video_cache import VideoCache
 
@@ -155,32 +266,35 @@ def migrate_videos(app):
     videos_dir = VideoCache.get_static_video_dir()
     print(f"Scanning videos in {videos_dir}")
 
-    # Get list of video files
     if not os.path.exists(videos_dir):
         print("Videos directory does not exist")
-        return
-
-    video_files = [
-        f for f in os.listdir(videos_dir) if f.endswith((".mp4", ".webm", ".mov"))
-    ]
-    print(f"Found {len(video_files)} video files")
-
-    # Create Video records
-    for filename in video_files:
-        # Check if video record already exists
-        existing = Video.query.filter_by(filename=filename).first()
-        if existing:
-            print(f"Video record for {filename} already exists. Skipping.")
-            continue
-
-        # Create new video record
-        video = Video(
-            filename=filename,
-            url_path=f"/static/videos/{filename}",
-            is_combined=False,  # Default assumption
-        )
-        db.session.add(video)
-        print(f"Added video record for {filename}")
+        return 0
+
+    def write_batch(filenames):
+        now = datetime.utcnow().isoformat(" ")
+        with db.engine.begin() as conn:
+            before = conn.exec_driver_sql("SELECT total_changes()").scalar()
+            conn.exec_driver_sql(
+                "INSERT INTO videos (filename, url_path, is_combined, has_audio, created_at) "
+                "VALUES (?, ?, 0, 0, ?) ON CONFLICT (filename) DO NOTHING",
+                [(name, f"/static/videos/{name}", now) for name in filenames],
+            )
+            return conn.exec_driver_sql("SELECT total_changes()").scalar() - before
+
+    # Stream the directory listing, registering the videos in batches
+    added, found, filenames = 0, 0, []
+    with app.app_context(), os.scandir(videos_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(VIDEO_EXTENSIONS):
+                found += 1
+                filenames.append(entry.name)
+                if len(filenames) >= batch_size:
+                    added += write_batch(filenames)
+                    filenames = []
+        if filenames:
+            added += write_batch(filenames)
+    print(f"Found {found} video files, added {added} video records")
+    return added
 
 
 def run_migration():
@@ -188,14 +302,10 @@ def run_migration():
     Create a Flask app and run the migration.
     This function can be called from a command-line script.
     """
-    app = Flask(__name__)
-
-    # Get the absolute path to the project root directory
-    base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+    from database import DB_PATH
 
-    # Set database URI with absolute path
-    db_path = os.path.join(base_dir, "rewritten", "database", "rewritten.db")
-    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_PATH}"
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
     db.init_app(app)
@@ -146,6 +146,13 @@ class SceneCache(db.Model):
     next_narrative = db.Column(db.Text, nullable=False)
     next_scene_prompts = db.Column(db.Text, nullable=False)
     next_media_urls = db.Column(db.Text, nullable=False)
+    # Quality profile the media was rendered with ("draft" or "premium");
+    # scenes cached before profiles existed are premium
+    quality_profile = db.Column(db.String(20), nullable=True)
+    # Trace of the request or job that generated the scene, if it was sampled
+    trace_id = db.Column(db.String(32), nullable=True)
+    # Generation the scene's provider calls are recorded under in generation_costs
+    generation_id = db.Column(db.String(32), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     __table_args__ = (
@@ -185,26 +192,122 @@ class SceneCache(db.Model):
         self.next_media_urls = json.dumps(value)
 
 
+# Narration URL a cached scene plays, indexed so the audio cache can tell
+# whether a clip is still in use without scanning the scene cache
+SCENE_AUDIO_URL = db.func.json_extract(
+    SceneCache.next_media_urls, db.literal_column("'$.audio'")
+)
+db.Index("ix_scene_cache_audio_url", SCENE_AUDIO_URL)
+
+
 class Video(db.Model):
     __tablename__ = "videos"
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     filename = db.Column(db.String(255), nullable=False, unique=True)
-    url_path = db.Column(db.String(255), nullable=False)
+    # Scene responses look their video up by URL (has_audio, renditions)
+    url_path = db.Column(db.String(255), nullable=False, index=True)
     scene_id = db.Column(db.Integer, nullable=True)
     is_combined = db.Column(db.Boolean, default=False)
-    original_prompt = db.Column(db.Text, nullable=True)
+    # Whether the narration is muxed into the file
+    has_audio = db.Column(db.Boolean, default=False)
+    original_prompt = db.Column(db.Text, nullable=True, index=True)
+    # HLS master playlist of the video's renditions, once they are transcoded
+    hls_url = db.Column(db.String(255), nullable=True)
+    # Set on renditions: the video they were transcoded from and their format
+    source_video_id = db.Column(
+        db.Integer,
+        db.ForeignKey("videos.id", name="fk_videos_source_video_id", ondelete="CASCADE"),
+        nullable=True,
+    )
+    height = db.Column(db.Integer, nullable=True)
+    bitrate_kbps = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    renditions = relationship("Video", cascade="all, delete-orphan")
+
     def __repr__(self):
         return f"<Video {self.id}: {self.url_path}>"
 
 
+class CachedImage(db.Model):
+    __tablename__ = "images"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # SHA-256 of the model, prompt and generation parameters
+    cache_key = db.Column(db.String(64), nullable=False, unique=True)
+    filename = db.Column(db.String(255), nullable=False, unique=True)
+    url_path = db.Column(db.String(255), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    prompt = db.Column(db.Text, nullable=False)
+    params = db.Column(db.Text, nullable=True)
+    size_bytes = db.Column(db.Integer, default=0)
+    # Video jobs still using the image; pinned images are never evicted
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<CachedImage {self.id}: {self.url_path}>"
+
+
+class CachedAudio(db.Model):
+    __tablename__ = "audio_clips"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # SHA-256 of the text, voice, model and voice settings
+    cache_key = db.Column(db.String(64), nullable=False, unique=True)
+    # SHA-256 of the audio bytes; clips with identical audio share one file
+    content_hash = db.Column(db.String(64), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    url_path = db.Column(db.String(255), nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    voice_id = db.Column(db.String(100), nullable=False)
+    model_id = db.Column(db.String(100), nullable=False)
+    voice_settings = db.Column(db.Text, nullable=True)
+    size_bytes = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<CachedAudio {self.id}: {self.url_path}>"
+
+
+class GenerationCost(db.Model):
+    __tablename__ = "generation_costs"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # Scene generation the call was made for (SceneCache.generation_id), if any
+    generation_id = db.Column(db.String(32), nullable=True, index=True)
+    # No foreign key: the ledger outlives deleted assignments
+    assignment_id = db.Column(db.Integer, nullable=True, index=True)
+    scenario = db.Column(db.String(100), nullable=True)
+    stage = db.Column(db.String(50), nullable=False)
+    provider = db.Column(db.String(50), nullable=False)
+    model = db.Column(db.String(100), nullable=True)
+    # Billed quantity in `unit`, e.g. 1200 tokens, 1 image, 5 seconds
+    units = db.Column(db.Float, default=0)
+    unit = db.Column(db.String(20), nullable=True)
+    cost_usd = db.Column(db.Float, default=0)
+    wall_seconds = db.Column(db.Float, default=0)
+    retries = db.Column(db.Integer, default=0)
+    # Whether the stage's output came from a fallback instead of the provider
+    fallback = db.Column(db.Boolean, default=False)
+    succeeded = db.Column(db.Boolean, default=True)
+    # Rate limiter priority of the work (0 = a student was waiting)
+    priority = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<GenerationCost {self.id}: {self.provider} {self.stage}>"
+
+
 # Association table for tracking student progress on assignments
 student_assignment_progress = db.Table(
     "student_assignment_progress",
     db.Column("student_id", db.Integer, db.ForeignKey("students.id", name="fk_progress_student_id"), primary_key=True),
-    db.Column("assignment_id", db.Integer, db.ForeignKey("assignments.id", name="fk_progress_assignment_id"), primary_key=True),
+    # Indexed on its own for the dashboards; the primary key leads with student_id
+    db.Column("assignment_id", db.Integer, db.ForeignKey("assignments.id", name="fk_progress_assignment_id"), primary_key=True, index=True),
     db.Column("current_session_id", db.String(36), db.ForeignKey("sessions.id", name="fk_progress_session_id"), nullable=True),
     db.Column("completed", db.Boolean, default=False),
     db.Column("score", db.Integer, nullable=True),
@@ -249,7 +352,7 @@ class Assignment(db.Model):
     title = db.Column(db.String(200), nullable=False)
     scenario = db.Column(db.String(100), nullable=False)
     access_code = db.Column(db.String(10), unique=True, nullable=False)
-    teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), nullable=False)
+    teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     due_date = db.Column(db.DateTime, nullable=True)
     is_active = db.Column(db.Boolean, default=True)
@@ -266,12 +369,51 @@ class Assignment(db.Model):
         return f"<Assignment {self.id}: {self.title}>"
 
 
+class WarmupJob(db.Model):
+    __tablename__ = "warmup_jobs"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    assignment_id = db.Column(
+        db.Integer,
+        db.ForeignKey("assignments.id", name="fk_warmup_assignment_id"),
+        nullable=False,
+    )
+    scenario = db.Column(db.String(100), nullable=False)
+    depth = db.Column(db.Integer, default=0)
+    # queued, running, completed or failed
+    status = db.Column(db.String(20), default="queued", nullable=False)
+    scenes_total = db.Column(db.Integer, default=1)
+    scenes_done = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    # Relationships
+    assignment = relationship("Assignment", backref="warmup_jobs")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "depth": self.depth,
+            "scenes_total": self.scenes_total,
+            "scenes_done": self.scenes_done,
+            "error": self.error,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    def __repr__(self):
+        return f"<WarmupJob {self.id}: Assignment {self.assignment_id} {self.status}>"
+
+
 class QuestionResponse(db.Model):
     __tablename__ = "question_responses"
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    student_id = db.Column(db.Integer, db.ForeignKey("students.id", name="fk_question_student_id"), nullable=False)
-    assignment_id = db.Column(db.Integer, db.ForeignKey("assignments.id", name="fk_question_assignment_id"), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id", name="fk_question_student_id"), nullable=False, index=True)
+    assignment_id = db.Column(db.Integer, db.ForeignKey("assignments.id", name="fk_question_assignment_id"), nullable=False, index=True)
     session_id = db.Column(db.String(36), db.ForeignKey("sessions.id", name="fk_question_session_id"), nullable=False)
     scene_id = db.Column(db.Integer, nullable=False)
     question_text = db.Column(db.Text, nullable=False)
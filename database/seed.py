@@ -0,0 +1,504 @@
+"""
+Synthetic data for benchmarks, load tests and demos.
+
+seed_database() fills the app's tables with a district: teachers, their
+students, assignments, enrollments (student_assignment_progress) with a game
+session each, quiz responses, and optionally anonymous sessions, scene cache
+rows and videos. write_grades() adds progress and quiz responses to given
+student/assignment pairs (see scripts/populate_grades.py).
+
+Rows are generated lazily and inserted with executemany in transactions of
+SEED_BATCH_SIZE rows over a plain sqlite3 connection, so a million rows take
+seconds. The same seed always produces the same data, and new rows are
+numbered after the existing ones, so a database can be seeded more than once.
+"""
+
+import json
+import uuid
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from itertools import islice
+
+# Rows inserted per executemany and transaction
+SEED_BATCH_SIZE = 50000
+
+# Size of the district seeded by default
+DEFAULT_SIZES = {
+    "teachers": 10,
+    "students_per_teacher": 120,
+    "assignments_per_teacher": 8,
+    "assignments_per_student": 4,
+    # Sessions not tied to an assignment (games started from the home page)
+    "anonymous_sessions": 0,
+    "scene_cache": 0,
+    "videos": 0,
+}
+
+SCENARIOS = [
+    "Cuban Missile Crisis",
+    "American Revolution",
+    "World War II",
+    "Apollo 11",
+    "French Revolution",
+    "Fall of Rome",
+    "Civil Rights Movement",
+    "Industrial Revolution",
+]
+
+# Sample quiz questions by scenario
+QUIZ_QUESTIONS = {
+    "Cuban Missile Crisis": [
+        {"question": "Who was the US President during the Cuban Missile Crisis?", "correct_answer": "John F. Kennedy"},
+        {"question": "In what year did the Cuban Missile Crisis occur?", "correct_answer": "1962"},
+        {"question": "How many days did the Cuban Missile Crisis last?", "correct_answer": "13"},
+        {"question": "What Soviet leader ordered missiles to be placed in Cuba?", "correct_answer": "Nikita Khrushchev"},
+        {"question": "What was the name of the US naval blockade of Cuba?", "correct_answer": "Quarantine"}
+    ],
+    "Apollo 11": [
+        {"question": "Who was the first person to walk on the moon?", "correct_answer": "Neil Armstrong"},
+        {"question": "What was the name of the lunar module that landed on the moon?", "correct_answer": "Eagle"},
+        {"question": "In what year did the Apollo 11 mission take place?", "correct_answer": "1969"},
+        {"question": "What were the first words spoken from the moon?", "correct_answer": "Houston, Tranquility Base here. The Eagle has landed."},
+        {"question": "Who was the command module pilot who orbited the moon?", "correct_answer": "Michael Collins"}
+    ],
+    "World War II": [
+        {"question": "When did World War II begin?", "correct_answer": "1939"},
+        {"question": "Who was the leader of Nazi Germany during World War II?", "correct_answer": "Adolf Hitler"},
+        {"question": "What was the codename for the Allied invasion of Normandy?", "correct_answer": "Operation Overlord"},
+        {"question": "What event directly led the United States to enter World War II?", "correct_answer": "The attack on Pearl Harbor"},
+        {"question": "When did World War II end in Europe?", "correct_answer": "May 8, 1945"}
+    ]
+}
+
+# Generic questions for any scenario
+GENERIC_QUESTIONS = [
+    {"question": "What were the main causes of this historical event?", "correct_answer": "Multiple complex factors"},
+    {"question": "Who were the key leaders involved?", "correct_answer": "Various political and military figures"},
+    {"question": "What was the global significance of this event?", "correct_answer": "It changed international relations"},
+    {"question": "How did this event affect ordinary citizens?", "correct_answer": "It had profound social impacts"},
+    {"question": "What long-term consequences resulted from this event?", "correct_answer": "It shaped future policies and events"}
+]
+
+WRONG_ANSWERS = {
+    "John F. Kennedy": ["Lyndon B. Johnson", "Richard Nixon", "Dwight Eisenhower"],
+    "1962": ["1961", "1963", "1960"],
+    "13": ["7", "21", "30"],
+    "Nikita Khrushchev": ["Leonid Brezhnev", "Joseph Stalin", "Fidel Castro"],
+    "Quarantine": ["Blockade", "Containment", "Embargo"],
+    "Neil Armstrong": ["Buzz Aldrin", "Michael Collins", "John Glenn"],
+    "Eagle": ["Columbia", "Apollo", "Challenger"],
+    "1969": ["1968", "1970", "1971"],
+    "Houston, Tranquility Base here. The Eagle has landed.": ["One small step for man, one giant leap for mankind", "We came in peace for all mankind", "The Eagle has landed"],
+    "Michael Collins": ["Buzz Aldrin", "Alan Shepard", "Jim Lovell"],
+    "1939": ["1938", "1940", "1941"],
+    "Adolf Hitler": ["Benito Mussolini", "Joseph Stalin", "Winston Churchill"],
+    "Operation Overlord": ["Operation Barbarossa", "D-Day", "Operation Market Garden"],
+    "The attack on Pearl Harbor": ["The sinking of the Lusitania", "Germany's invasion of Poland", "The Battle of Britain"],
+    "May 8, 1945": ["September 2, 1945", "April 30, 1945", "June 6, 1944"]
+}
+
+# Wrong answers for generic questions or answers without specific ones
+DEFAULT_WRONG_ANSWERS = [
+    "This is incorrect",
+    "Wrong historical interpretation",
+    "Inaccurate historical analysis",
+    "Misunderstanding of the events",
+    "Historical misconception"
+]
+
+PROGRESS_COLUMNS = (
+    "student_id",
+    "assignment_id",
+    "current_session_id",
+    "completed",
+    "score",
+    "last_scene_id",
+    "created_at",
+    "updated_at",
+)
+SESSION_COLUMNS = (
+    "id",
+    "scenario",
+    "current_scene_id",
+    "student_id",
+    "assignment_id",
+    "created_at",
+    "updated_at",
+    "partial_narrative",
+)
+RESPONSE_COLUMNS = (
+    "student_id",
+    "assignment_id",
+    "session_id",
+    "scene_id",
+    "question_text",
+    "student_answer",
+    "is_correct",
+    "score",
+    "created_at",
+)
+
+
+def get_questions_for_scenario(scenario):
+    """Get quiz questions for a specific scenario, falling back to generic ones if needed"""
+    return QUIZ_QUESTIONS.get(scenario, GENERIC_QUESTIONS)
+
+
+def generate_student_answer(rng, correct_answer, is_correct):
+    """Generate a student answer that is either correct or a plausible wrong answer"""
+    if is_correct:
+        return correct_answer
+    return rng.choice(WRONG_ANSWERS.get(correct_answer, DEFAULT_WRONG_ANSWERS))
+
+
+def connect(path):
+    """A connection for seeding: no fsync per transaction."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous = OFF")
+    return conn
+
+
+def create_schema(path):
+    """Create the app's tables in a new database, without starting the app."""
+    from sqlalchemy import create_engine
+    from database.models import db
+
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+
+def insert_rows(conn, table, columns, rows, verb="INSERT"):
+    """Insert rows (any iterable of tuples) in batches; returns how many."""
+    sql = (
+        f"{verb} INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})"
+    )
+    rows = iter(rows)
+    count = 0
+    while True:
+        batch = list(islice(rows, SEED_BATCH_SIZE))
+        if not batch:
+            return count
+        with conn:
+            conn.executemany(sql, batch)
+        count += len(batch)
+
+
+def next_id(conn, table, column="id"):
+    (highest,) = conn.execute(f"SELECT MAX({column}) FROM {table}").fetchone()
+    return (highest or 0) + 1
+
+
+def pick(rng, low, high):
+    """rng.randint(low, high), without its overhead (which dominates seeding)."""
+    return low + int(rng.random() * (high - low + 1))
+
+
+def timestamp(rng, now, days=180):
+    """A time within the last few days, in SQLAlchemy's SQLite format."""
+    return (now - timedelta(seconds=int(rng.random() * days * 86400))).isoformat(" ")
+
+
+class SessionIds:
+    """
+    Session IDs that are UUIDs sorting in the order they are made, so the
+    sessions' primary key index is appended to instead of split at random.
+    """
+
+    def __init__(self, rng):
+        self.prefix = rng.getrandbits(64) << 64
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        return str(uuid.UUID(int=self.prefix | self.count))
+
+
+def partial_narrative(scenario, row):
+    """A scene cache key shaped like the app's: scenario, last scene and decision history."""
+    depth = 1 + row % 5
+    history = [
+        {"scene_id": scene, "decision": str(row % 3 + 1), "decision_text": f"Option {row}-{scene}"}
+        for scene in range(depth)
+    ]
+    last = {
+        "scene_id": depth,
+        "narrative": f"Scene {row} of {scenario}. " * 20,
+        "options": [{"id": str(i), "option": f"Choice {i} of scene {row}"} for i in (1, 2, 3)],
+    }
+    return json.dumps(
+        {"scenario": scenario, "last_narrative": last, "decision_history": history}
+    )
+
+
+def grade_rows(rng, now, student_id, assignment_id, scenario, session):
+    """
+    Progress of a student on an assignment, with its session and quiz responses.
+
+    Returns:
+        (progress row, session row, list of response rows)
+    """
+    # 80% of the assignments are completed, with a score of 60-100
+    completed = rng.random() < 0.8
+    score = pick(rng, 60, 100) if completed else None
+    last_scene_id = pick(rng, 7, 10) if completed else pick(rng, 1, 7)
+    started = timestamp(rng, now, days=14)
+
+    questions = get_questions_for_scenario(scenario)
+    responses = []
+    for i in range(pick(rng, 3, 5) if completed else pick(rng, 1, 3)):
+        question = questions[i % len(questions)]
+        is_correct = rng.random() < (0.7 if completed else 0.4)
+        responses.append(
+            (
+                student_id,
+                assignment_id,
+                session,
+                pick(rng, 1, last_scene_id),
+                question["question"],
+                generate_student_answer(rng, question["correct_answer"], is_correct),
+                is_correct,
+                pick(rng, 5, 10) if is_correct else pick(rng, 0, 5),
+                timestamp(rng, now, days=14),
+            )
+        )
+    progress = (
+        student_id,
+        assignment_id,
+        session,
+        completed,
+        score,
+        last_scene_id,
+        started,
+        started,
+    )
+    game_session = (
+        session,
+        scenario,
+        last_scene_id,
+        student_id,
+        assignment_id,
+        started,
+        started,
+        None,
+    )
+    return progress, game_session, responses
+
+
+def write_grades(conn, pairs, rng, existing=()):
+    """
+    Add progress, a session and quiz responses for (student_id, assignment_id,
+    scenario) pairs. Pairs in `existing` already have a progress row: it is
+    updated, and their old quiz responses are replaced.
+
+    Returns:
+        Number of quiz responses written
+    """
+    now = datetime.utcnow()
+    existing = set(existing)
+    new_session = SessionIds(rng)
+    inserts, updates, replaced, sessions, responses = [], [], [], [], []
+    for student_id, assignment_id, scenario in pairs:
+        progress, game_session, pair_responses = grade_rows(
+            rng, now, student_id, assignment_id, scenario, new_session()
+        )
+        sessions.append(game_session)
+        responses.extend(pair_responses)
+        if (student_id, assignment_id) in existing:
+            replaced.append((student_id, assignment_id))
+            updates.append(progress[2:6] + (progress[7], student_id, assignment_id))
+        else:
+            inserts.append(progress)
+
+    insert_rows(conn, "sessions", SESSION_COLUMNS, sessions)
+    insert_rows(conn, "student_assignment_progress", PROGRESS_COLUMNS, inserts)
+    with conn:
+        conn.executemany(
+            "UPDATE student_assignment_progress SET current_session_id = ?, completed = ?, "
+            "score = ?, last_scene_id = ?, updated_at = ? "
+            "WHERE student_id = ? AND assignment_id = ?",
+            updates,
+        )
+        conn.executemany(
+            "DELETE FROM question_responses WHERE student_id = ? AND assignment_id = ?",
+            replaced,
+        )
+    return insert_rows(conn, "question_responses", RESPONSE_COLUMNS, responses)
+
+
+def seed_database(path, sizes=None, seed=0):
+    """
+    Fill a database that has the app's schema with a synthetic district.
+
+    Args:
+        path: SQLite database to add rows to
+        sizes: Overrides of DEFAULT_SIZES
+        seed: Seed of the generated data
+
+    Returns:
+        Dictionary of rows inserted per table
+    """
+    sizes = dict(DEFAULT_SIZES, **(sizes or {}))
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    conn = connect(path)
+    counts = {}
+    try:
+        first_teacher = next_id(conn, "teachers")
+        first_student = next_id(conn, "students")
+        first_assignment = next_id(conn, "assignments")
+        teachers = range(first_teacher, first_teacher + sizes["teachers"])
+
+        counts["teachers"] = insert_rows(
+            conn,
+            "teachers",
+            ("id", "name", "email", "password", "created_at"),
+            (
+                (t, f"Teacher {t}", f"teacher{t}@seed.example.com", "", timestamp(rng, now))
+                for t in teachers
+            ),
+        )
+
+        def students():
+            for index, teacher in enumerate(teachers):
+                first = first_student + index * sizes["students_per_teacher"]
+                for s in range(first, first + sizes["students_per_teacher"]):
+                    yield (
+                        s,
+                        f"Student {s}",
+                        f"student{s}@seed.example.com",
+                        6 + s % 7,
+                        timestamp(rng, now),
+                    )
+
+        counts["students"] = insert_rows(
+            conn,
+            "students",
+            ("id", "name", "email", "grade_level", "created_at"),
+            students(),
+        )
+
+        per_teacher = sizes["assignments_per_teacher"]
+        assignments = []
+        for index, teacher in enumerate(teachers):
+            for a in range(per_teacher):
+                assignment_id = first_assignment + index * per_teacher + a
+                assignments.append(
+                    (
+                        assignment_id,
+                        f"Assignment {assignment_id}",
+                        SCENARIOS[assignment_id % len(SCENARIOS)],
+                        f"S{assignment_id:08X}",
+                        teacher,
+                        timestamp(rng, now),
+                        True,
+                    )
+                )
+        counts["assignments"] = insert_rows(
+            conn,
+            "assignments",
+            ("id", "title", "scenario", "access_code", "teacher_id", "created_at", "is_active"),
+            assignments,
+        )
+
+        # Students take some of their own teacher's assignments
+        def enrollments():
+            taken = min(sizes["assignments_per_student"], per_teacher)
+            for index in range(len(teachers)):
+                offered = assignments[index * per_teacher : (index + 1) * per_teacher]
+                first = first_student + index * sizes["students_per_teacher"]
+                for s in range(first, first + sizes["students_per_teacher"]):
+                    for assignment in rng.sample(offered, taken):
+                        yield s, assignment[0], assignment[2]
+
+        # Grades are written in slices so their rows never all sit in memory
+        enrolled = enrollments()
+        counts["student_assignment_progress"] = counts["question_responses"] = 0
+        while True:
+            pairs = list(islice(enrolled, SEED_BATCH_SIZE))
+            if not pairs:
+                break
+            counts["student_assignment_progress"] += len(pairs)
+            counts["question_responses"] += write_grades(conn, pairs, rng)
+        counts["sessions"] = counts["student_assignment_progress"]
+
+        new_session = SessionIds(rng)
+        counts["sessions"] += insert_rows(
+            conn,
+            "sessions",
+            SESSION_COLUMNS,
+            (
+                (
+                    new_session(),
+                    SCENARIOS[row % len(SCENARIOS)],
+                    1 + row % 5,
+                    None,
+                    None,
+                    timestamp(rng, now),
+                    timestamp(rng, now),
+                    partial_narrative(SCENARIOS[row % len(SCENARIOS)], row),
+                )
+                for row in range(sizes["anonymous_sessions"])
+            ),
+        )
+
+        first_scene = next_id(conn, "scene_cache")
+        counts["scene_cache"] = insert_rows(
+            conn,
+            "scene_cache",
+            (
+                "scenario",
+                "partial_narrative",
+                "next_narrative",
+                "next_scene_prompts",
+                "next_media_urls",
+                "quality_profile",
+                "generation_id",
+                "created_at",
+            ),
+            (
+                (
+                    SCENARIOS[row % len(SCENARIOS)],
+                    partial_narrative(SCENARIOS[row % len(SCENARIOS)], row),
+                    json.dumps({"scene_id": row, "narrative": f"Next scene {row}. " * 30}),
+                    json.dumps({"scenes": [{"scene_id": 1, "video_prompt": f"Prompt {row}"}]}),
+                    json.dumps({"video": f"/static/videos/scene_{row}.mp4"}),
+                    "premium",
+                    uuid.UUID(int=rng.getrandbits(128)).hex,
+                    timestamp(rng, now),
+                )
+                for row in range(first_scene, first_scene + sizes["scene_cache"])
+            ),
+        )
+
+        first_video = next_id(conn, "videos")
+        counts["videos"] = insert_rows(
+            conn,
+            "videos",
+            (
+                "filename",
+                "url_path",
+                "scene_id",
+                "is_combined",
+                "has_audio",
+                "original_prompt",
+                "created_at",
+            ),
+            (
+                (
+                    f"seed_video_{row}.mp4",
+                    f"/static/videos/seed_video_{row}.mp4",
+                    row % 6,
+                    row % 4 == 0,
+                    row % 4 == 0,
+                    f"gen4_turbo|A candlelit war room, shot {row}|{rng.getrandbits(64):016x}",
+                    timestamp(rng, now),
+                )
+                for row in range(first_video, first_video + sizes["videos"])
+            ),
+        )
+    finally:
+        conn.close()
+    return counts
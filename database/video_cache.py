@@ -11,7 +11,7 @@ class VideoCache:
     """
 
     @staticmethod
-    def save_video(file_path, scene_id=None, is_combined=False, original_prompt=None):
+    def save_video(file_path, scene_id=None, is_combined=False, original_prompt=None, has_audio=False):
         """
         Register a video file in the database for caching.
 
@@ -20,6 +20,7 @@ class VideoCache:
             scene_id: Optional scene ID associated with the video
             is_combined: Whether this is a combined video (multiple scenes)
             original_prompt: The prompt used to generate the video
+            has_audio: Whether the narration is muxed into the video
 
         Returns:
             The database Video object
@@ -46,6 +47,7 @@ class VideoCache:
             scene_id=scene_id,
             is_combined=is_combined,
             original_prompt=original_prompt,
+            has_audio=has_audio,
         )
 
         db.session.add(video)
@@ -66,6 +68,62 @@ class VideoCache:
         """
         return Video.query.filter_by(original_prompt=prompt).first()
 
+    @staticmethod
+    def get_video_by_url(url_path):
+        """
+        Find a video by its URL path.
+
+        Args:
+            url_path: The URL path of the video (e.g., '/static/videos/xyz.mp4')
+
+        Returns:
+            The Video object if found, None otherwise
+        """
+        return Video.query.filter_by(url_path=url_path).first()
+
+    @staticmethod
+    def get_hls_url(url_path):
+        """
+        Get the HLS master playlist of a video, if its renditions are ready.
+
+        Args:
+            url_path: The URL path of the source video
+
+        Returns:
+            URL of the master playlist, or None
+        """
+        video = VideoCache.get_video_by_url(url_path)
+        return video.hls_url if video else None
+
+    @staticmethod
+    def save_renditions(source_video, hls_url, renditions):
+        """
+        Register the HLS renditions transcoded from a video.
+
+        Args:
+            source_video: The Video the renditions were made from
+            hls_url: URL of the HLS master playlist
+            renditions: List of (url_path, height, bitrate_kbps) tuples, one
+                per variant playlist
+
+        Returns:
+            The source Video object
+        """
+        for url_path, height, bitrate_kbps in renditions:
+            source_video.renditions.append(
+                Video(
+                    # Variant playlists share names across videos, so keep their directory
+                    filename=url_path.split("/static/videos/", 1)[-1],
+                    url_path=url_path,
+                    has_audio=source_video.has_audio,
+                    height=height,
+                    bitrate_kbps=bitrate_kbps,
+                )
+            )
+        source_video.hls_url = hls_url
+        db.session.commit()
+        return source_video
+
     @staticmethod
     def get_video_path(video_id):
         """
@@ -0,0 +1,37 @@
+"""Add warmup_jobs table for assignment pre-rendering
+
+Revision ID: a3c1d9e5f7b2
+Revises: 89826fb69246
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c1d9e5f7b2'
+down_revision = '89826fb69246'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('warmup_jobs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('assignment_id', sa.Integer(), nullable=False),
+    sa.Column('scenario', sa.String(length=100), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('scenes_total', sa.Integer(), nullable=True),
+    sa.Column('scenes_done', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['assignment_id'], ['assignments.id'], name='fk_warmup_assignment_id'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('warmup_jobs')
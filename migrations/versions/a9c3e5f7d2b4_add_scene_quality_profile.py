@@ -0,0 +1,26 @@
+"""Add quality_profile to the scene cache
+
+Revision ID: a9c3e5f7d2b4
+Revises: f1d4b7a2c8e6
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c3e5f7d2b4'
+down_revision = 'f1d4b7a2c8e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('scene_cache', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('quality_profile', sa.String(length=20), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('scene_cache', schema=None) as batch_op:
+        batch_op.drop_column('quality_profile')
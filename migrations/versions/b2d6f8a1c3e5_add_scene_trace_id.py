@@ -0,0 +1,26 @@
+"""Add trace_id to the scene cache
+
+Revision ID: b2d6f8a1c3e5
+Revises: a9c3e5f7d2b4
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d6f8a1c3e5'
+down_revision = 'a9c3e5f7d2b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('scene_cache', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('trace_id', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('scene_cache', schema=None) as batch_op:
+        batch_op.drop_column('trace_id')
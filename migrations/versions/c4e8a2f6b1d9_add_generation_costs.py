@@ -0,0 +1,59 @@
+"""Add generation_costs ledger and scene generation IDs
+
+Revision ID: c4e8a2f6b1d9
+Revises: b2d6f8a1c3e5
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a2f6b1d9'
+down_revision = 'b2d6f8a1c3e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('generation_costs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('generation_id', sa.String(length=32), nullable=True),
+    sa.Column('assignment_id', sa.Integer(), nullable=True),
+    sa.Column('scenario', sa.String(length=100), nullable=True),
+    sa.Column('stage', sa.String(length=50), nullable=False),
+    sa.Column('provider', sa.String(length=50), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=True),
+    sa.Column('units', sa.Float(), nullable=True),
+    sa.Column('unit', sa.String(length=20), nullable=True),
+    sa.Column('cost_usd', sa.Float(), nullable=True),
+    sa.Column('wall_seconds', sa.Float(), nullable=True),
+    sa.Column('retries', sa.Integer(), nullable=True),
+    sa.Column('fallback', sa.Boolean(), nullable=True),
+    sa.Column('succeeded', sa.Boolean(), nullable=True),
+    sa.Column('priority', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('generation_costs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_generation_costs_generation_id'), ['generation_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_generation_costs_assignment_id'), ['assignment_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_generation_costs_created_at'), ['created_at'], unique=False)
+
+    with op.batch_alter_table('scene_cache', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('generation_id', sa.String(length=32), nullable=True))
+        batch_op.create_index(batch_op.f('ix_scene_cache_generation_id'), ['generation_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('scene_cache', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_scene_cache_generation_id'))
+        batch_op.drop_column('generation_id')
+
+    with op.batch_alter_table('generation_costs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_generation_costs_created_at'))
+        batch_op.drop_index(batch_op.f('ix_generation_costs_assignment_id'))
+        batch_op.drop_index(batch_op.f('ix_generation_costs_generation_id'))
+
+    op.drop_table('generation_costs')
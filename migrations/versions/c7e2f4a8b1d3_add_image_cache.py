@@ -0,0 +1,39 @@
+"""Add images table for the first-frame image cache
+
+Revision ID: c7e2f4a8b1d3
+Revises: a3c1d9e5f7b2
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2f4a8b1d3'
+down_revision = 'a3c1d9e5f7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('images',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('cache_key', sa.String(length=64), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('url_path', sa.String(length=255), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=False),
+    sa.Column('prompt', sa.Text(), nullable=False),
+    sa.Column('params', sa.Text(), nullable=True),
+    sa.Column('size_bytes', sa.Integer(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('cache_key'),
+    sa.UniqueConstraint('filename')
+    )
+
+
+def downgrade():
+    op.drop_table('images')
@@ -0,0 +1,44 @@
+"""Add audio_clips table for the narration cache
+
+Revision ID: d5b8e1c9f2a4
+Revises: c7e2f4a8b1d3
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b8e1c9f2a4'
+down_revision = 'c7e2f4a8b1d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('audio_clips',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('cache_key', sa.String(length=64), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('url_path', sa.String(length=255), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('voice_id', sa.String(length=100), nullable=False),
+    sa.Column('model_id', sa.String(length=100), nullable=False),
+    sa.Column('voice_settings', sa.Text(), nullable=True),
+    sa.Column('size_bytes', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('cache_key')
+    )
+    with op.batch_alter_table('audio_clips', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_audio_clips_content_hash'), ['content_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('audio_clips', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_audio_clips_content_hash'))
+
+    op.drop_table('audio_clips')
@@ -0,0 +1,45 @@
+"""Index the columns of the scene, video and progress hot paths
+
+Revision ID: d7f1b3e9a5c2
+Revises: c4e8a2f6b1d9
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7f1b3e9a5c2'
+down_revision = 'c4e8a2f6b1d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('videos', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_videos_original_prompt'), ['original_prompt'], unique=False)
+
+    with op.batch_alter_table('assignments', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_assignments_teacher_id'), ['teacher_id'], unique=False)
+
+    with op.batch_alter_table('student_assignment_progress', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_student_assignment_progress_assignment_id'), ['assignment_id'], unique=False)
+
+    with op.batch_alter_table('question_responses', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_question_responses_student_id'), ['student_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_question_responses_assignment_id'), ['assignment_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('question_responses', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_question_responses_assignment_id'))
+        batch_op.drop_index(batch_op.f('ix_question_responses_student_id'))
+
+    with op.batch_alter_table('student_assignment_progress', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_student_assignment_progress_assignment_id'))
+
+    with op.batch_alter_table('assignments', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_assignments_teacher_id'))
+
+    with op.batch_alter_table('videos', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_videos_original_prompt'))
@@ -0,0 +1,26 @@
+"""Add has_audio flag to videos for muxed narration
+
+Revision ID: e3a7c2d6b9f1
+Revises: d5b8e1c9f2a4
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a7c2d6b9f1'
+down_revision = 'd5b8e1c9f2a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('videos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('has_audio', sa.Boolean(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('videos', schema=None) as batch_op:
+        batch_op.drop_column('has_audio')
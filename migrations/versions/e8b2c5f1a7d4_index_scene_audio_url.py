@@ -0,0 +1,29 @@
+"""Index the narration URL of cached scenes
+
+Revision ID: e8b2c5f1a7d4
+Revises: d7f1b3e9a5c2
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b2c5f1a7d4'
+down_revision = 'd7f1b3e9a5c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_scene_cache_audio_url',
+        'scene_cache',
+        [sa.text("json_extract(next_media_urls, '$.audio')")],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index('ix_scene_cache_audio_url', table_name='scene_cache')
@@ -0,0 +1,34 @@
+"""Add HLS rendition columns to videos
+
+Revision ID: f1d4b7a2c8e6
+Revises: e3a7c2d6b9f1
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1d4b7a2c8e6'
+down_revision = 'e3a7c2d6b9f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('videos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('hls_url', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('source_video_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('height', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('bitrate_kbps', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_videos_source_video_id', 'videos', ['source_video_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    with op.batch_alter_table('videos', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_videos_source_video_id', type_='foreignkey')
+        batch_op.drop_column('bitrate_kbps')
+        batch_op.drop_column('height')
+        batch_op.drop_column('source_video_id')
+        batch_op.drop_column('hls_url')
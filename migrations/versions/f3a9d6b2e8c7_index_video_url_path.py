@@ -0,0 +1,25 @@
+"""Index the URL path of videos
+
+Revision ID: f3a9d6b2e8c7
+Revises: e8b2c5f1a7d4
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9d6b2e8c7'
+down_revision = 'e8b2c5f1a7d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('videos', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_videos_url_path'), ['url_path'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('videos', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_videos_url_path'))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Cost Report Script
+
+Aggregates the cost ledger written by api/ledger.py (the generation_costs
+table): estimated spend per assignment, scenario, provider or stage, and
+latency percentiles of the provider calls of each stage.
+
+Usage:
+    python scripts/cost_report.py                      # cost per assignment
+    python scripts/cost_report.py --by scenario --since-days 7
+    python scripts/cost_report.py --latency [--scenario "Cuban Missile Crisis"]
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path so we can import from the project
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DB_PATH
+
+GROUPS = ("assignment", "scenario", "provider", "stage")
+
+PERCENTILES = (50, 95, 99)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Summarize the generation cost ledger")
+    parser.add_argument(
+        "--by", choices=GROUPS, default="assignment", help="Group spend by this column"
+    )
+    parser.add_argument(
+        "--latency",
+        action="store_true",
+        help="Show latency percentiles per stage instead of spend",
+    )
+    parser.add_argument("--scenario", help="Only include this scenario")
+    parser.add_argument("--since-days", type=float, help="Only include recent rows")
+    parser.add_argument("--db", default=DB_PATH, help="Database to read")
+    return parser.parse_args()
+
+
+def filters(args):
+    clauses, params = [], []
+    if args.scenario:
+        clauses.append("scenario = ?")
+        params.append(args.scenario)
+    if args.since_days:
+        since = datetime.utcnow() - timedelta(days=args.since_days)
+        clauses.append("created_at >= ?")
+        params.append(since.isoformat(" "))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an ascending list."""
+    index = max(0, int(round(percent / 100 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def print_spend(conn, args):
+    column = "assignment_id" if args.by == "assignment" else args.by
+    where, params = filters(args)
+    rows = conn.execute(
+        f"""
+        SELECT {column}, COUNT(DISTINCT generation_id), COUNT(*),
+               SUM(cost_usd), SUM(retries), SUM(fallback)
+        FROM generation_costs {where}
+        GROUP BY {column}
+        ORDER BY SUM(cost_usd) DESC
+        """,
+        params,
+    ).fetchall()
+    if not rows:
+        print("No ledger rows recorded")
+        return
+
+    print(
+        f"{args.by:<32} {'scenes':>7} {'calls':>7} {'cost USD':>10} "
+        f"{'per scene':>10} {'retries':>8} {'fallbacks':>9}"
+    )
+    for key, scenes, calls, cost, retries, fallbacks in rows:
+        label = "(none)" if key is None else str(key)
+        per_scene = f"{cost / scenes:10.4f}" if scenes else f"{'-':>10}"
+        print(
+            f"{label[:32]:<32} {scenes:>7} {calls:>7} {cost:>10.4f} "
+            f"{per_scene} {retries:>8} {fallbacks:>9}"
+        )
+    total = sum(row[3] for row in rows)
+    print(f"{'total':<32} {'':>7} {'':>7} {total:>10.4f}")
+
+
+def print_latency(conn, args):
+    where, params = filters(args)
+    where += " AND succeeded = 1" if where else "WHERE succeeded = 1"
+    latencies = defaultdict(list)
+    for stage, provider, seconds in conn.execute(
+        f"SELECT stage, provider, wall_seconds FROM generation_costs {where} "
+        "ORDER BY wall_seconds",
+        params,
+    ):
+        latencies[(stage, provider)].append(seconds)
+    if not latencies:
+        print("No successful calls recorded")
+        return
+
+    header = " ".join(f"{f'p{p}':>8}" for p in PERCENTILES)
+    print(f"{'stage':<20} {'provider':<12} {'calls':>7} {header} {'max':>8}")
+    for (stage, provider), values in sorted(latencies.items()):
+        cells = " ".join(f"{percentile(values, p):8.2f}" for p in PERCENTILES)
+        print(f"{stage:<20} {provider:<12} {len(values):>7} {cells} {values[-1]:8.2f}")
+
+
+def main(args):
+    if not os.path.exists(args.db):
+        sys.exit(f"No database at {args.db}")
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.latency:
+            print_latency(conn, args)
+        else:
+            print_spend(conn, args)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Trace Report Script
+
+Prints the span tree of a recorded trace from the trace file written by
+api/tracing.py, with the critical path (the chain of spans that finished
+last, i.e. the ones the request was actually waiting on) marked with '*'.
+
+Usage:
+    python scripts/trace_report.py --trace-id 4bf92f3577b34da6a3ce929d0e0e4736
+    python scripts/trace_report.py --scene-cache-id 42
+    python scripts/trace_report.py --slowest 5
+"""
+
+import os
+import sys
+import json
+import argparse
+from collections import defaultdict
+
+# Add the parent directory to the path so we can import from the project
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.tracing import TRACE_FILE
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Show the spans of a recorded trace")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--trace-id", help="Trace to show")
+    target.add_argument(
+        "--scene-cache-id", type=int, help="Show the trace that generated a cached scene"
+    )
+    target.add_argument(
+        "--slowest", type=int, help="List the N slowest recorded root spans"
+    )
+    parser.add_argument("--file", default=TRACE_FILE, help="Trace file to read")
+    return parser.parse_args()
+
+
+def load_spans(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def scene_trace_id(scene_cache_id):
+    from app import create_app
+    from database.models import SceneCache
+
+    with create_app().app_context():
+        scene = SceneCache.query.get(scene_cache_id)
+        if not scene:
+            sys.exit(f"Cached scene {scene_cache_id} not found")
+        if not scene.trace_id:
+            sys.exit(f"Cached scene {scene_cache_id} was generated by an unsampled trace")
+        return scene.trace_id
+
+
+def end_of(span):
+    return span["timestamp"] + span["duration"]
+
+
+def critical_path(span, children):
+    """IDs of the spans on the chain that finished last below (and including) span."""
+    path = {span["id"]}
+    if children[span["id"]]:
+        last = max(children[span["id"]], key=end_of)
+        path |= critical_path(last, children)
+    return path
+
+
+def print_trace(spans):
+    children = defaultdict(list)
+    ids = {span["id"] for span in spans}
+    roots = []
+    for span in spans:
+        if span.get("parentId") in ids:
+            children[span["parentId"]].append(span)
+        else:
+            roots.append(span)
+
+    start = min(span["timestamp"] for span in spans)
+
+    def show(span, depth, path):
+        offset = (span["timestamp"] - start) / 1_000_000
+        duration = span["duration"] / 1_000_000
+        marker = "*" if span["id"] in path else " "
+        tags = " ".join(
+            f"{key}={value}" for key, value in sorted(span.get("tags", {}).items())
+        )
+        print(f"{marker} +{offset:8.3f}s {duration:8.3f}s  {'  ' * depth}{span['name']}  {tags}")
+        for child in sorted(children[span["id"]], key=lambda s: s["timestamp"]):
+            show(child, depth + 1, path)
+
+    for root in sorted(roots, key=lambda s: s["timestamp"]):
+        show(root, 0, critical_path(root, children))
+
+
+def main(args):
+    if not os.path.exists(args.file):
+        sys.exit(f"No trace file at {args.file}")
+    spans = load_spans(args.file)
+
+    if args.slowest:
+        roots = [span for span in spans if "parentId" not in span]
+        for span in sorted(roots, key=lambda s: s["duration"], reverse=True)[: args.slowest]:
+            print(f"{span['duration'] / 1_000_000:8.3f}s  {span['traceId']}  {span['name']}")
+        return
+
+    trace_id = args.trace_id or scene_trace_id(args.scene_cache_id)
+    trace_spans = [span for span in spans if span["traceId"] == trace_id]
+    if not trace_spans:
+        sys.exit(f"No spans recorded for trace {trace_id}")
+    print_trace(trace_spans)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Transcode Renditions Script
+
+Transcodes the HLS renditions of cached scene videos that have none, e.g.
+videos cached before renditions existed or brought over by the migration of
+the old database. New scene videos get theirs from the media pipeline.
+
+Jobs run on the FFmpeg pool's background lane; FFMPEG_BACKGROUND_WORKERS sets
+how many run at once.
+
+Usage:
+    python scripts/transcode_renditions.py [--limit N]
+    FFMPEG_BACKGROUND_WORKERS=4 python scripts/transcode_renditions.py
+"""
+
+import os
+import sys
+import argparse
+from concurrent.futures import wait
+
+# Add the parent directory to the path so we can import from the project
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from api.ffmpeg_pool import FFMPEG_MAX_QUEUE
+from api.renditions import schedule_renditions, scene_videos_without_renditions
+
+
+app = create_app()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Transcode missing video renditions")
+    parser.add_argument("--limit", type=int, help="Transcode at most N videos")
+    return parser.parse_args()
+
+
+def main(args):
+    with app.app_context():
+        video_urls = scene_videos_without_renditions(args.limit)
+        print(f"{len(video_urls)} scene videos without renditions")
+
+        transcoded = failed = 0
+        # Queue no more than the lane accepts, then wait for the chunk
+        for start in range(0, len(video_urls), FFMPEG_MAX_QUEUE):
+            futures = [
+                future
+                for future in map(
+                    schedule_renditions, video_urls[start : start + FFMPEG_MAX_QUEUE]
+                )
+                if future
+            ]
+            wait(futures)
+            for future in futures:
+                if future.exception() is None and future.result().ok:
+                    transcoded += 1
+                else:
+                    failed += 1
+            print(f"{start + len(futures)} of {len(video_urls)} videos processed")
+
+    print(f"Transcoded {transcoded} videos, {failed} failed")
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Warm Assignments Script
+
+Pre-renders the scene tree of existing assignments so that students joining them
+get cached scenes instead of waiting on the generation pipeline. Jobs are
+recorded in the warmup_jobs table, so an interrupted run can be resumed by
+running the script again.
+
+Usage:
+    python scripts/warm_assignments.py --all [--depth N]
+    python scripts/warm_assignments.py --assignment-id 3 [--depth N]
+    python scripts/warm_assignments.py --resume
+"""
+
+import os
+import sys
+import argparse
+
+# Add the parent directory to the path so we can import from the project
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from api.warmup import latest_warmup, parse_depth, queue_warmup, run_warmup
+from database.models import Assignment, WarmupJob
+
+
+app = create_app()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-render assignment scenes")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--assignment-id", type=int, help="Warm up a single assignment")
+    target.add_argument(
+        "--all",
+        action="store_true",
+        help="Warm up every active assignment without a completed warm-up",
+    )
+    target.add_argument(
+        "--resume",
+        action="store_true",
+        help="Run queued and interrupted jobs (use only when no web worker is running them)",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=None,
+        help="Decision levels to pre-generate below the first scene (at most WARMUP_MAX_DEPTH)",
+    )
+    return parser.parse_args()
+
+
+def warm_assignments(args):
+    """Queue and run warm-up jobs one after another in this process"""
+    # Compare completed jobs against the depth a new job would actually get
+    if args.depth is not None:
+        args.depth = parse_depth(args.depth)
+
+    with app.app_context():
+        if args.resume:
+            job_ids = [
+                job.id
+                for job in WarmupJob.query.filter(
+                    WarmupJob.status.in_(["queued", "running"])
+                ).all()
+            ]
+        else:
+            if args.assignment_id:
+                assignments = Assignment.query.filter_by(id=args.assignment_id).all()
+                if not assignments:
+                    print(f"Assignment {args.assignment_id} not found")
+                    return
+            else:
+                assignments = []
+                for assignment in Assignment.query.filter_by(is_active=True).all():
+                    job = latest_warmup(assignment.id)
+                    if job and job.status == "completed" and (
+                        args.depth is None or job.depth >= args.depth
+                    ):
+                        continue
+                    assignments.append(assignment)
+
+            job_ids = [queue_warmup(a, args.depth).id for a in assignments]
+
+        print(f"Running {len(job_ids)} warm-up jobs")
+        for job_id in job_ids:
+            run_warmup(job_id, force=args.resume)
+            job = WarmupJob.query.get(job_id)
+            print(
+                f"  Job {job.id} (assignment {job.assignment_id}): {job.status}, "
+                f"{job.scenes_done}/{job.scenes_total} scenes"
+            )
+
+
+if __name__ == "__main__":
+    warm_assignments(parse_args())
@@ -21,6 +21,7 @@ const GameComponent = {
   isMuted: false,
   pendingDecision: null, // Store decision while quiz is shown
   preloadedQuiz: null, // Store preloaded quiz question
+  hls: null, // hls.js player of the current scene's renditions
 
   /**
    * Initialize the game component
@@ -91,6 +92,11 @@ const GameComponent = {
       this.narrativeAudio.muted = this.isMuted;
     }
 
+    // Scenes with the narration muxed into the video play it from the video
+    if (this.gameVideo && this.narrationInMedia) {
+      this.gameVideo.muted = this.isMuted;
+    }
+
     this.updateTtsButtonState();
   },
 
@@ -167,10 +173,6 @@ const GameComponent = {
         this.currentScene = data.narrative;
         this.audioUrl = data.audio;
 
-        // Set video source
-        this.gameVideo.src = data.media;
-        this.gameVideo.load();
-
         // Hide loading screen and show game container
         Utils.hideElement(this.loadingScreen);
         Utils.showElement(this.gameContainer);
@@ -178,8 +180,8 @@ const GameComponent = {
         // Update narrative text
         this.updateNarrativeDisplay();
 
-        // Start playing the video
-        this.gameVideo.play();
+        // Start playing the scene
+        this.showSceneMedia(data);
       })
       .catch(() => {
         alert("An error occurred while starting the game. Please try again.");
@@ -190,6 +192,68 @@ const GameComponent = {
       });
   },
 
+  /**
+   * Show the media of a scene. When the server could not finish a video in
+   * time it sends a cheaper tier: an image shown with the narration, or the
+   * narration alone. Those have no video to wait for, so decisions are
+   * enabled right away.
+   * @param {Object} data - Scene response from the server
+   */
+  showSceneMedia: function (data) {
+    // Videos are silent unless the narration is muxed into them
+    this.narrationInMedia = Boolean(data.media && data.narration_in_media);
+    this.gameVideo.muted = !this.narrationInMedia || this.isMuted;
+
+    if (this.hls) {
+      this.hls.destroy();
+      this.hls = null;
+    }
+
+    if (data.media) {
+      Utils.showElement(this.gameVideo);
+      this.gameVideo.removeAttribute("poster");
+      this.loadVideoSource(data);
+      this.gameVideo.play();
+      return;
+    }
+
+    this.gameVideo.pause();
+    this.gameVideo.removeAttribute("src");
+    if (data.image) {
+      Utils.showElement(this.gameVideo);
+      this.gameVideo.poster = data.image;
+    } else {
+      Utils.hideElement(this.gameVideo);
+    }
+    this.playNarrativeAudio();
+    this.enableDecisions();
+  },
+
+  /**
+   * Load a scene's video, preferring its adaptive bitrate renditions. Playback
+   * starts on the lowest rendition and steps up as bandwidth allows.
+   * @param {Object} data - Scene response from the server
+   */
+  loadVideoSource: function (data) {
+    if (data.media_hls && window.Hls && Hls.isSupported()) {
+      this.hls = new Hls({ startLevel: 0, capLevelToPlayerSize: true });
+      this.hls.loadSource(data.media_hls);
+      this.hls.attachMedia(this.gameVideo);
+      return;
+    }
+
+    // Safari plays HLS natively, starting on the first (lowest) variant
+    if (
+      data.media_hls &&
+      this.gameVideo.canPlayType("application/vnd.apple.mpegurl")
+    ) {
+      this.gameVideo.src = data.media_hls;
+    } else {
+      this.gameVideo.src = data.media;
+    }
+    this.gameVideo.load();
+  },
+
   /**
    * Update the narrative display
    */
@@ -350,10 +414,6 @@ const GameComponent = {
         this.currentScene = data.narrative;
         this.audioUrl = data.audio;
 
-        // Update video
-        this.gameVideo.src = data.media;
-        this.gameVideo.load();
-
         // Hide loading screen, show game container
         Utils.hideElement(this.loadingScreen);
         Utils.showElement(this.gameContainer);
@@ -361,8 +421,8 @@ const GameComponent = {
         // Update narrative
         this.updateNarrativeDisplay();
 
-        // Start playing the video
-        this.gameVideo.play();
+        // Start playing the scene
+        this.showSceneMedia(data);
 
         // Clear the pending decision
         this.pendingDecision = null;
@@ -3,6 +3,33 @@
  */
 
 const ApiService = {
+  /**
+   * POST JSON to a generation endpoint, waiting and retrying while the server
+   * answers 429 (generation providers saturated) with a Retry-After header
+   * @param {string} url - The endpoint URL
+   * @param {Object} body - The JSON body to send
+   * @param {number} attempts - Maximum number of attempts
+   * @returns {Promise} Promise resolving to the response data
+   */
+  postWithRetry: function (url, body, attempts = 5) {
+    return fetch(url, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify(body),
+    }).then((response) => {
+      if (response.status === 429 && attempts > 1) {
+        const retryAfter = parseInt(response.headers.get("Retry-After"), 10) || 5;
+        console.log(`Server busy, retrying in ${retryAfter}s`);
+        return new Promise((resolve) => setTimeout(resolve, retryAfter * 1000)).then(
+          () => this.postWithRetry(url, body, attempts - 1),
+        );
+      }
+      return response.json();
+    });
+  },
+
   /**
    * Fetch all scenarios from the server
    * @returns {Promise} Promise resolving to scenarios data
@@ -80,14 +107,7 @@ const ApiService = {
    * @returns {Promise} Promise resolving to initial game data
    */
   startGame: function (scenario) {
-    return fetch("/api/start", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-      body: JSON.stringify({ scenario: scenario }),
-    })
-      .then((response) => response.json())
+    return this.postWithRetry("/api/start", { scenario: scenario })
       .catch((error) => {
         console.error("Error starting game:", error);
         throw error;
@@ -101,17 +121,10 @@ const ApiService = {
    * @returns {Promise} Promise resolving to next scene data
    */
   makeDecision: function (sceneId, decisionId) {
-    return fetch("/api/decision", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-      body: JSON.stringify({
-        scene_id: sceneId,
-        decision: decisionId,
-      }),
+    return this.postWithRetry("/api/decision", {
+      scene_id: sceneId,
+      decision: decisionId,
     })
-      .then((response) => response.json())
       .catch((error) => {
         console.error("Error making decision:", error);
         throw error;